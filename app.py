@@ -1,18 +1,95 @@
 import streamlit as st
-from huggingface_hub import InferenceClient
-from dotenv import load_dotenv
 import os
-from PIL import Image, ImageDraw, ImageFont
 from datetime import datetime
 import random
-
-# Load environment variables
-load_dotenv()
+import threading
+import time
+import uuid
+
+from imagegen.admission import HEAVY, LIGHT, AdmissionController
+from imagegen.archive import GenerationArchive
+from imagegen.batch import DONE as BATCH_DONE, FAILED as BATCH_FAILED, Batch
+from imagegen.generation import (
+    HF_INFERENCE_URL, MODEL_NAME, EndpointClient, LazyClient, RawInferenceClient, build_request, encode_result,
+    raw_client_enabled, run_generation
+)
+from imagegen.encoding import OutputFormat, available_formats, decoded
+from imagegen.export import deferred_zip
+from imagegen.generation_cache import GenerationCache
+from imagegen.history_store import HistoryStore, SpillStore, global_memory_bytes
+from imagegen.jobs import CANCELLED, FAILED, Cancelled, JobExecutor
+from imagegen.layout import CUSTOM_CSS, FOOTER_HTML, SIZE_LABELS, SIZE_OPTIONS, STYLE_NAMES, TOKEN_SETUP_HELP
+from imagegen.metrics import metrics
+from imagegen.models import AUTO_MODEL, DEFAULT_MODELS, MODEL_REGISTRY, resolve_models
+from imagegen.preview import draft_params
+from imagegen.prompts import STYLE_PRESETS
+from imagegen.refinement import REFINING, RefinementFlow, refined_job_info
+from imagegen.router import ModelRouter
+from imagegen.scheduler import RequestScheduler
+from imagegen.singleflight import SingleFlight
+
+# Load environment variables (python-dotenv is only imported when there is a .env file to read)
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 # Configuration
-MODEL_NAME = "stabilityai/stable-diffusion-xl-base-1.0"
 HUGGINGFACE_TOKEN = os.getenv("HUGGINGFACE_TOKEN")
 DEMO_MODE = os.getenv("DEMO_MODE", "false").lower() == "true"  # Disable demo mode by default
+GENERATION_CACHE = os.getenv("GENERATION_CACHE", "true").lower() == "true"
+GENERATION_CACHE_DIR = os.getenv("GENERATION_CACHE_DIR", ".cache/generations")
+GENERATION_CACHE_MB = int(os.getenv("GENERATION_CACHE_MB", "512"))
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "8"))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "3"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "4"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+# Models to route between, preferred first; a single model turns routing off
+ACTIVE_MODELS = resolve_models(os.getenv("MODELS", DEFAULT_MODELS)) or resolve_models(MODEL_NAME)
+REQUEST_MODEL = AUTO_MODEL if len(ACTIVE_MODELS) > 1 else ACTIVE_MODELS[0].name
+MODEL_LABELS = ", ".join(spec.label for spec in ACTIVE_MODELS)
+INFERENCE_ENDPOINT = os.getenv("INFERENCE_ENDPOINT", "")
+# Keep responses as the bytes the server sent (pooled keep-alive HTTP, no decode/re-encode)
+RAW_CLIENT = raw_client_enabled(os.getenv("RAW_CLIENT", "auto"), INFERENCE_ENDPOINT)
+# Admission control: upstream requests in flight at once, how many of those may be heavy
+# (width x height x steps of at least HEAVY_REQUEST_COST 512x512 4-step images), per session,
+# and how many may wait per cost class before new ones are turned away
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+ADMISSION_HEAVY_SLOTS = int(os.getenv("ADMISSION_HEAVY_SLOTS", "2"))
+ADMISSION_SESSION_LIMIT = int(os.getenv("ADMISSION_SESSION_LIMIT", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "20"))
+HEAVY_REQUEST_COST = float(os.getenv("HEAVY_REQUEST_COST", "6"))
+HISTORY_MAX_ITEMS = int(os.getenv("HISTORY_MAX_ITEMS", "10"))
+HISTORY_MEMORY_MB = float(os.getenv("HISTORY_MEMORY_MB", "16"))
+HISTORY_SPILL_PATH = os.getenv("HISTORY_SPILL_PATH", ".cache/history_spill.sqlite")
+PERSISTENT_HISTORY = os.getenv("PERSISTENT_HISTORY", "true").lower() == "true"
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH", ".cache/archive.sqlite")
+ARCHIVE_IMAGE_DIR = os.getenv("ARCHIVE_IMAGE_DIR", ".cache/archive_images")
+ARCHIVE_PAGE_SIZE = 12
+JOB_POLL_SECONDS = 1.0
+# Full-size images are stored and downloaded in this format; users can convert downloads to another
+OUTPUT_FORMAT = OutputFormat.parse(
+    os.getenv("OUTPUT_FORMAT", "png"),
+    quality=int(os.getenv("OUTPUT_QUALITY", "90")),
+    compression=int(os.getenv("OUTPUT_COMPRESSION", "6"))
+)
+if not OUTPUT_FORMAT.supported:
+    print(f"OUTPUT_FORMAT={OUTPUT_FORMAT.name} is not supported by this Pillow build; using PNG")
+    OUTPUT_FORMAT = OutputFormat("png", compression=OUTPUT_FORMAT.compression)
+DOWNLOAD_FORMAT_LABELS = {"png": "PNG (lossless)", "webp": "WebP", "avif": "AVIF", "jpeg": "JPEG"}
+# Quick low-step draft before the full render (default for the checkbox), and how long the full
+# render waits after the draft is shown, so discarding it right away costs no quota
+PROGRESSIVE_PREVIEW = os.getenv("PROGRESSIVE_PREVIEW", "false").lower() == "true"
+# Largest side of a tiled high-resolution image
+TILED_MAX_SIZE = int(os.getenv("TILED_MAX_SIZE", "4096"))
+TILED_MODE_LABELS = {"upscale": "Upscale one image", "generate": "Generate every tile"}
+METRICS_ENABLED = os.getenv("METRICS", "false").lower() == "true"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# Stage timings are off unless asked for; instrumented code then costs next to nothing
+metrics.enabled = METRICS_ENABLED
 
 # Page configuration
 st.set_page_config(
@@ -22,26 +99,7 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
-    <style>
-    .main {
-        padding: 2rem;
-    }
-    .stButton>button {
-        width: 100%;
-        background-color: #FF6B6B;
-        color: white;
-        font-weight: bold;
-        padding: 0.5rem 1rem;
-        border-radius: 0.5rem;
-        border: none;
-        font-size: 1.1rem;
-    }
-    .stButton>button:hover {
-        background-color: #FF5252;
-    }
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Header
 st.title("🎨 AI Image Generator")
@@ -50,107 +108,250 @@ if DEMO_MODE:
     st.info("🎭 **DEMO MODE ACTIVE** - Generating placeholder images for UI/UX demonstration. All features work!")
 else:
     st.markdown("### Transform your ideas into stunning images using AI!")
-    st.markdown("*Powered by Stable Diffusion XL - High-Quality Image Generation*")
+    st.markdown(f"*Powered by {MODEL_LABELS} - High-Quality Image Generation*")
 
 # Check if API token is configured
 if not HUGGINGFACE_TOKEN or HUGGINGFACE_TOKEN == "your_token_here":
     st.error("⚠️ HuggingFace API token not configured!")
-    st.info("""
-    **Setup Instructions:**
-    1. Go to https://huggingface.co/settings/tokens
-    2. Create a new token with "Write" permissions
-    3. Create a `.env` file in the project directory
-    4. Add: `HUGGINGFACE_TOKEN=your_token_here`
-    5. Restart the application
-
-    **Note:** Read-only tokens will NOT work for the Inference API.
-    """)
+    st.info(TOKEN_SETUP_HELP)
     st.stop()
 
-# Initialize the InferenceClient
+def make_inference_client():
+    if RAW_CLIENT:
+        return RawInferenceClient(
+            HUGGINGFACE_TOKEN,
+            INFERENCE_ENDPOINT or HF_INFERENCE_URL,
+            timeout=REQUEST_TIMEOUT,
+            accept=OUTPUT_FORMAT.mime,
+            pool_size=max(GENERATION_WORKERS, ADMISSION_MAX_IN_FLIGHT)
+        )
+    # huggingface_hub is by far the slowest import; pay for it on the first generation, not the first page load
+    from huggingface_hub import InferenceClient
+
+    inference_client = InferenceClient(token=HUGGINGFACE_TOKEN, timeout=REQUEST_TIMEOUT)
+    if INFERENCE_ENDPOINT:
+        return EndpointClient(inference_client, INFERENCE_ENDPOINT)
+    return inference_client
+
+# Initialize the InferenceClient (built on first use; setup errors surface as generation errors)
 @st.cache_resource
 def get_inference_client():
-    return InferenceClient(token=HUGGINGFACE_TOKEN)
+    return LazyClient(make_inference_client)
 
-try:
-    client = get_inference_client()
-except Exception as e:
-    st.error(f"Failed to initialize HuggingFace client: {str(e)}")
-    st.stop()
+client = get_inference_client()
 
-# Initialize session state for image history
-if 'image_history' not in st.session_state:
-    st.session_state.image_history = []
-
-# Style preset definitions (must be defined before sidebar)
-STYLE_PRESETS = {
-    "None": "",
-    "Anime": ", anime style, vibrant colors, Studio Ghibli inspired, detailed illustration, manga art, highly detailed",
-    "Realistic": ", photorealistic, highly detailed, 8K resolution, professional photography, sharp focus, natural lighting, realistic materials",
-    "Digital Art": ", digital painting, artstation trending, concept art, highly detailed, intricate details, professional digital illustration",
-    "Watercolor": ", watercolor painting, soft colors, artistic, flowing brushstrokes, traditional art, delicate details",
-    "Oil Painting": ", oil painting, classical art style, rich colors, textured brushstrokes, traditional painting, masterpiece",
-    "Cyberpunk": ", cyberpunk style, neon lights, futuristic, sci-fi, dystopian city, technology, glowing elements, dark atmosphere",
-    "Fantasy": ", fantasy art, magical, enchanted, epic, mystical atmosphere, dramatic lighting, otherworldly, highly detailed"
-}
-
-# Demo mode function to generate placeholder images
-def generate_demo_image(prompt, style, width=768, height=768):
-    """Generate a colorful placeholder image for demo purposes"""
-    # Style-based color schemes
-    style_colors = {
-        "None": [(100, 150, 200), (150, 200, 250)],
-        "Anime": [(255, 182, 193), (255, 105, 180)],
-        "Realistic": [(139, 69, 19), (210, 180, 140)],
-        "Digital Art": [(138, 43, 226), (75, 0, 130)],
-        "Watercolor": [(173, 216, 230), (135, 206, 250)],
-        "Oil Painting": [(184, 134, 11), (218, 165, 32)],
-        "Cyberpunk": [(0, 255, 255), (255, 0, 255)],
-        "Fantasy": [(148, 0, 211), (75, 0, 130)]
-    }
+# Shared across sessions so repeated prompts don't spend API quota twice
+@st.cache_resource
+def get_generation_cache():
+    if not GENERATION_CACHE:
+        return None
+    return GenerationCache(GENERATION_CACHE_DIR, disk_bytes=GENERATION_CACHE_MB * 1024 * 1024)
 
-    # Get colors for the selected style
-    colors = style_colors.get(style, [(100, 150, 200), (150, 200, 250)])
+generation_cache = get_generation_cache()
 
-    # Create gradient image
-    img = Image.new('RGB', (width, height))
-    draw = ImageDraw.Draw(img)
+# Token-bucket rate limiting with fair queueing and 429/503 retries, shared by all sessions
+@st.cache_resource
+def get_request_scheduler():
+    return RequestScheduler(
+        client,
+        token=HUGGINGFACE_TOKEN,
+        requests_per_minute=RATE_LIMIT_PER_MINUTE,
+        burst=RATE_LIMIT_BURST,
+        max_retries=MAX_RETRIES
+    )
+
+request_scheduler = get_request_scheduler()
+
+# Sends each request to the fastest healthy model and fails over when one is down
+@st.cache_resource
+def get_model_router():
+    if len(ACTIVE_MODELS) < 2:
+        return None
+    return ModelRouter(request_scheduler.text_to_image, ACTIVE_MODELS, failover_retries=1)
+
+model_router = get_model_router()
+
+# Light requests go ahead of heavy ones, with per-session caps and a bounded queue per cost class
+@st.cache_resource
+def get_admission_controller():
+    return AdmissionController(
+        model_router.text_to_image if model_router is not None else request_scheduler.text_to_image,
+        max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+        heavy_slots=min(ADMISSION_HEAVY_SLOTS, ADMISSION_MAX_IN_FLIGHT),
+        per_session=ADMISSION_SESSION_LIMIT,
+        max_queue=ADMISSION_MAX_QUEUE,
+        heavy_cost=HEAVY_REQUEST_COST
+    )
 
-    # Draw gradient background
-    for i in range(height):
-        r = int(colors[0][0] + (colors[1][0] - colors[0][0]) * i / height)
-        g = int(colors[0][1] + (colors[1][1] - colors[0][1]) * i / height)
-        b = int(colors[0][2] + (colors[1][2] - colors[0][2]) * i / height)
-        draw.rectangle([(0, i), (width, i + 1)], fill=(r, g, b))
+admission_controller = get_admission_controller()
+
+# Identical requests already in flight (double clicks, popular preset demos) share one API call
+@st.cache_resource
+def get_request_coalescer():
+    return SingleFlight()
+
+request_coalescer = get_request_coalescer()
+
+# Background workers shared by all sessions, so a rerun never loses a generation
+@st.cache_resource
+def get_job_executor():
+    return JobExecutor(max_workers=GENERATION_WORKERS)
 
-    # Add text overlay
+job_executor = get_job_executor()
+
+# Prometheus text on /metrics and a JSON snapshot on /metrics.json, once per process
+@st.cache_resource
+def get_metrics_endpoint():
+    if not METRICS_ENABLED:
+        return None
+    if generation_cache is not None:
+        metrics.add_collector(lambda: {
+            "cache_memory_hits_total": generation_cache.stats['memory_hits'],
+            "cache_disk_hits_total": generation_cache.stats['disk_hits'],
+            "cache_misses_total": generation_cache.stats['misses'],
+            "cache_disk_bytes": generation_cache.disk_usage
+        })
+    metrics.add_collector(lambda: {
+        "upstream_requests_total": request_scheduler.stats['requests'],
+        "upstream_retries_total": request_scheduler.stats['retries'],
+        "upstream_failures_total": request_scheduler.stats['failures'],
+        "queue_depth": request_scheduler.queue_depth,
+        "admission_queue_depth_light": admission_controller.queue_depth(LIGHT),
+        "admission_queue_depth_heavy": admission_controller.queue_depth(HEAVY),
+        "admission_in_flight": admission_controller.in_flight,
+        "coalesced_calls_total": request_coalescer.stats['coalesced'],
+        "jobs_active": job_executor.active_count,
+        "history_memory_bytes": global_memory_bytes()
+    })
+    if not METRICS_PORT:
+        return None
     try:
-        # Try to use default font, if not available use basic
-        font_size = 40
-        # Draw text with background
-        text = f"DEMO: {style} Style"
-        prompt_text = prompt[:50] + "..." if len(prompt) > 50 else prompt
-
-        # Calculate text position
-        text_bbox = draw.textbbox((0, 0), text)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-
-        # Draw semi-transparent background for text
-        padding = 20
-        draw.rectangle(
-            [(width//2 - text_width//2 - padding, height//2 - 60),
-             (width//2 + text_width//2 + padding, height//2 + 60)],
-            fill=(0, 0, 0, 180)
-        )
+        return metrics.serve(METRICS_PORT)
+    except OSError as e:
+        print(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+        return None
+
+get_metrics_endpoint()
+
+def generate_single(generation_params, use_cache=True, demo_prompt="", demo_style="None", session_id=None,
+                    cancel=None, tag=None):
+    """One request's image (placeholder, cached or from the API). Returns (image, from_cache).
+
+    `tag` identifies the request while it waits for admission (see queue_status).
+    """
+    if DEMO_MODE:
+        return run_generation(generation_params, demo=True, demo_prompt=demo_prompt, demo_style=demo_style)
+    call_kwargs = {} if cancel is None else {'cancel': cancel}
+    return run_generation(
+        generation_params,
+        admission_controller.text_to_image,
+        cache=generation_cache,
+        use_cache=use_cache,
+        coalescer=request_coalescer,
+        timeout=REQUEST_TIMEOUT,
+        output_format=OUTPUT_FORMAT,
+        session_id=session_id,
+        tag=tag,
+        **call_kwargs
+    )
+
+def generate_tiled_image(generation_params, tiled, use_cache=True, demo_prompt="", demo_style="None", session_id=None,
+                         cancel=None, tag=None):
+    """Image larger than one request allows, per `tiled` ({'mode', 'width', 'height'}).
+
+    'upscale' generates `generation_params` once and upscales it; 'generate'
+    makes every tile its own request, BATCH_PARALLELISM at a time, and
+    blends them.
+    """
+    # numpy and the tiling code are only loaded once someone asks for a tiled image
+    from imagegen.tiling import GENERATE, generate_tiled, upscale
+
+    if tiled['mode'] == GENERATE:
+        def generate_tile(params, tile):
+            return decoded(generate_single(params, use_cache, f"{demo_prompt} (tile {tile.index + 1})", demo_style,
+                                           session_id, cancel, tag)[0])
+
+        # Tile seeds follow the request's seed; a fresh sample gets a new set
+        base_seed = 0 if use_cache else random.randint(0, 2**31 - 1)
+        return generate_tiled(generation_params, tiled['width'], tiled['height'], generate_tile,
+                              base_seed=base_seed, max_parallel=BATCH_PARALLELISM)
+
+    base, _ = generate_single(generation_params, use_cache, demo_prompt, demo_style, session_id, cancel, tag)
+    image = upscale(decoded(base), tiled['width'], tiled['height'])
+    if base.info.get('model'):
+        image.info['model'] = base.info['model']
+    return image
+
+def generate_image(generation_params, use_cache=True, demo_prompt="", demo_style="None", session_id=None,
+                   tiled=None, cancel=None, tag=None):
+    """Produce one image. Runs on a job executor thread.
+
+    Returns a dict with the PIL 'image', its bytes in OUTPUT_FORMAT ('data'),
+    a small JPEG 'thumbnail' and 'from_cache'. Every image is encoded once,
+    by run_generation (shared with the cache) or here for placeholders and
+    tiled images, so reruns and download buttons never encode anything again.
+
+    Cancellable jobs get a `cancel` event, checked before each request.
+    """
+    if cancel is not None and cancel.wait(1 if DEMO_MODE else 0):
+        raise Cancelled()
+    if DEMO_MODE and cancel is None:
+        time.sleep(1)  # Simulate processing time
+    if tiled:
+        image = generate_tiled_image(generation_params, tiled, use_cache, demo_prompt, demo_style, session_id, cancel,
+                                     tag)
+        from_cache = False
+    else:
+        image, from_cache = generate_single(generation_params, use_cache, demo_prompt, demo_style, session_id, cancel,
+                                            tag)
+    result = encode_result(image, from_cache, OUTPUT_FORMAT)
+    # Perceptual hashes of the thumbnail, for spotting near-duplicates (numpy loads with the first image)
+    from imagegen.perceptual_hash import image_hashes
+
+    with metrics.span("perceptual_hash"):
+        result['hashes'] = image_hashes(result['thumbnail'])
+    return result
 
-        # Draw text
-        draw.text((width//2, height//2 - 30), text, fill=(255, 255, 255), anchor="mm")
-        draw.text((width//2, height//2 + 10), prompt_text, fill=(200, 200, 200), anchor="mm")
-    except:
-        pass
+# Identifies this browser session to the request scheduler's fair queue
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
-    return img
+# Initialize session state for image history
+# Older images beyond the per-session memory budget spill to this shared SQLite file
+@st.cache_resource
+def get_spill_store():
+    return SpillStore(HISTORY_SPILL_PATH)
+
+if 'image_history' not in st.session_state:
+    st.session_state.image_history = HistoryStore(
+        st.session_state.session_id,
+        spill=get_spill_store(),
+        max_items=HISTORY_MAX_ITEMS,
+        memory_budget=int(HISTORY_MEMORY_MB * 1024 * 1024)
+    )
+history = st.session_state.image_history
+
+# Every generation from every session, kept across restarts
+@st.cache_resource
+def get_generation_archive():
+    if not PERSISTENT_HISTORY:
+        return None
+    generation_archive = GenerationArchive(ARCHIVE_DB_PATH, ARCHIVE_IMAGE_DIR)
+    # Generations stored before perceptual hashing get their hashes in the background
+    threading.Thread(target=generation_archive.backfill_hashes, name="imagegen-hash-backfill", daemon=True).start()
+    return generation_archive
+
+archive = get_generation_archive()
+
+# Generation jobs submitted by this session that haven't been collected yet
+if 'pending_jobs' not in st.session_state:
+    st.session_state.pending_jobs = []
+if 'pending_batches' not in st.session_state:
+    st.session_state.pending_batches = []
+# The generation on screen and its refinement, rebuilt from here on every rerun
+if 'refinement' not in st.session_state:
+    st.session_state.refinement = RefinementFlow()
+refinement = st.session_state.refinement
 
 # Sidebar with style selector (must come before main content to define style_preset)
 with st.sidebar:
@@ -163,7 +364,7 @@ with st.sidebar:
 
     style_preset = st.selectbox(
         "Select Style:",
-        list(STYLE_PRESETS.keys()),
+        STYLE_NAMES,
         index=0,
         help="Select a style preset to automatically add style-specific keywords to your prompt",
         disabled=st.session_state.get('realism_mode_temp', False)
@@ -233,15 +434,95 @@ with st.sidebar:
             help="More steps = higher quality but slower. FLUX.1-schnell has a maximum of 16 steps."
         )
 
+        fresh_sample = st.checkbox(
+            "🎲 Always generate a fresh image",
+            value=False,
+            help="Skip the generation cache and request a new sample even if these exact settings were used before",
+            disabled=generation_cache is None
+        )
+
+        tiled_scale = st.select_slider(
+            "🧩 Tiled high resolution",
+            options=[1, 2, 3, 4],
+            value=1,
+            format_func=lambda factor: "Off" if factor == 1 else f"{factor}x",
+            help=f"Render beyond 1024px (up to {TILED_MAX_SIZE}px) by splitting the canvas into overlapping "
+                 "tiles that are rendered concurrently and blended together"
+        )
+        tiled_mode = st.radio(
+            "Tiled mode",
+            list(TILED_MODE_LABELS),
+            format_func=TILED_MODE_LABELS.get,
+            horizontal=True,
+            disabled=tiled_scale == 1,
+            help="Upscale one image: a single API request, sharp and coherent. "
+                 "Generate every tile: one request per tile for real detail everywhere, best for "
+                 "landscapes and textures since each tile is its own image"
+        )
+
+        download_formats = available_formats()
+        download_format = OutputFormat(
+            st.selectbox(
+                "Download format",
+                download_formats,
+                index=download_formats.index(OUTPUT_FORMAT.name),
+                format_func=lambda name: DOWNLOAD_FORMAT_LABELS[name],
+                help="Format of downloaded images. WebP and AVIF are much smaller than PNG; "
+                     "converting from the stored format happens when you click download.",
+                key="download_format"
+            ),
+            quality=OUTPUT_FORMAT.quality,
+            compression=OUTPUT_FORMAT.compression
+        )
+
     st.markdown("---")
     st.header("ℹ️ About")
     st.markdown(f"""
-    **Model:** {MODEL_NAME}
+    **Model:** {MODEL_LABELS}
     **Status:** 🟢 Ready
 
     **Made with:** Streamlit + HuggingFace API
     """)
 
+    if model_router is not None and not DEMO_MODE:
+        for model_health in model_router.health():
+            latency = f"{model_health['latency']:.1f}s avg" if model_health['latency'] is not None else "no data yet"
+            status = "🟢" if model_health['healthy'] else "🔴 cooling down"
+            st.caption(
+                f"{status} {model_health['label']}: {latency} · "
+                f"{model_health['error_rate']:.0%} errors · {model_health['requests']} requests"
+            )
+
+    if generation_cache is not None:
+        cache_stats = generation_cache.stats
+        st.caption(
+            f"♻️ Cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits / "
+            f"{cache_stats['misses']} misses ({generation_cache.hit_rate:.0%} hit rate)"
+        )
+
+    st.caption(
+        f"🧠 History memory: {history.memory_bytes / 2**20:.1f} MB this session "
+        f"({history.spilled_bytes / 2**20:.1f} MB on disk) · "
+        f"{global_memory_bytes() / 2**20:.1f} MB all sessions"
+    )
+
+    if not DEMO_MODE:
+        st.caption(
+            f"🚦 Queue: {admission_controller.queue_depth(LIGHT)} light / "
+            f"{admission_controller.queue_depth(HEAVY)} heavy waiting for admission · "
+            f"{request_scheduler.queue_depth} waiting for rate limit · "
+            f"avg wait {request_scheduler.average_wait:.1f}s · "
+            f"{request_scheduler.stats['retries']} retries · "
+            f"{request_coalescer.stats['coalesced']} duplicate calls saved"
+        )
+
+    if metrics.enabled:
+        stage_means = metrics.stage_means()
+        if stage_means:
+            st.caption("⏱️ Avg per stage: " + " · ".join(
+                f"{stage} {mean * 1000:.0f}ms" for stage, (count, mean) in sorted(stage_means.items())
+            ))
+
 # Main interface
 st.markdown("---")
 
@@ -251,23 +532,12 @@ st.subheader("✍️ Describe Your Image")
 # Image size selection
 image_size_option = st.selectbox(
     "📐 Choose Image Size:",
-    [
-        "Square (512x512)",
-        "Portrait (512x768)",
-        "Landscape (768x512)"
-    ],
+    SIZE_LABELS,
     index=0,
     help="Select the dimensions for your generated image"
 )
 
-# Map size options to dimensions
-size_mapping = {
-    "Square (512x512)": (512, 512),
-    "Portrait (512x768)": (512, 768),
-    "Landscape (768x512)": (768, 512)
-}
-
-selected_width, selected_height = size_mapping[image_size_option]
+selected_width, selected_height = SIZE_OPTIONS[image_size_option]
 
 # Realism boost toggle
 realism_mode = st.checkbox(
@@ -279,6 +549,13 @@ realism_mode = st.checkbox(
 # Update session state for realism mode
 st.session_state.realism_mode_temp = realism_mode
 
+progressive_preview = st.checkbox(
+    "⚡ Quick draft first",
+    value=PROGRESSIVE_PREVIEW,
+    help="Show a fast low-resolution draft within seconds, then swap in the full-quality image when it is ready. "
+         "Discard the draft to cancel the full render."
+)
+
 # Override style preset if realism mode is enabled
 if realism_mode:
     style_preset = "None"
@@ -291,21 +568,6 @@ prompt = st.text_area(
     help="Be specific! Include details about subject, composition, lighting, colors, and mood."
 )
 
-# Add style suffix based on preset
-def enhance_prompt(base_prompt, style, ultra_realism=False):
-    # Detect if prompt contains human body parts
-    human_body_keywords = ['hand', 'hands', 'finger', 'fingers', 'face', 'eye', 'eyes', 'nose', 'mouth', 'ear', 'ears', 'arm', 'arms', 'leg', 'legs', 'foot', 'feet', 'skin', 'body', 'person', 'human', 'portrait', 'man', 'woman', 'child', 'people']
-    contains_human = any(keyword in base_prompt.lower() for keyword in human_body_keywords)
-
-    if ultra_realism:
-        # Ultra realism mode - mimicking real camera photography with authentic characteristics
-        human_anatomy_detail = ", anatomically correct, realistic human anatomy, real human skin texture, visible skin pores, skin imperfections, natural skin subsurface scattering, authentic dermal details, real skin microstructure, fine skin lines, natural skin blemishes, realistic skin tone variation, genuine skin appearance, skin texture like real photographs of humans, dermatological accuracy, macro photography skin detail, individual pore visibility, natural skin oils, authentic epidermal texture, real subcutaneous details, lifelike skin translucency, biological skin accuracy, medical photography skin precision, true to life human skin, photorealistic flesh tones, natural vein visibility under skin, authentic skin undertones, real human dermis characteristics" if contains_human else ""
-        return f"{base_prompt}, RAW photo, genuine photograph, real camera capture, photorealistic, ultra realistic, hyper detailed, 8k uhd, shot on Canon EOS R5, professional DSLR photography, natural photograph, real world scene, authentic lighting, real textures, film grain, natural color grading, high dynamic range, proper exposure, masterpiece quality, crystal clear, sharp focus everywhere, deep focus f/22, everything in focus, full scene detail, volumetric atmospheric lighting, physically accurate, extreme detail throughout, intricate real-world details, accurate colors, natural skin tones, realistic materials, perfect clarity, comprehensive detail, no artificial blur, infinite depth of field, everything sharp, all elements detailed, true to life, optical perfection, real photograph quality, entire scene in sharp focus, background highly detailed, foreground and background equally sharp, no depth of field blur, no bokeh, no defocus, complete scene clarity, f/32 aperture, tack sharp throughout{human_anatomy_detail}"
-    else:
-        # Use style preset
-        style_suffix = STYLE_PRESETS.get(style, "")
-        return base_prompt + style_suffix
-
 # Quality enhancers (hidden in ultra realism mode)
 if not realism_mode:
     col1, col2 = st.columns(2)
@@ -322,301 +584,618 @@ col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     generate_button = st.button("🎨 Generate Image", use_container_width=True)
 
+# Batch mode: several requests sent concurrently, streamed into a grid
+with st.expander("🧪 Batch Generation", expanded=False):
+    batch_modes = ["Variants of this prompt"] if realism_mode else ["Variants of this prompt", "All style presets"]
+    batch_mode = st.radio("Batch type:", batch_modes, horizontal=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_size = st.slider(
+            "Number of variants",
+            min_value=2,
+            max_value=8,
+            value=4,
+            disabled=batch_mode == "All style presets",
+            help="Each variant uses a different random seed"
+        )
+    with col2:
+        batch_parallelism = st.slider(
+            "Parallel requests",
+            min_value=1,
+            max_value=8,
+            value=BATCH_PARALLELISM,
+            help="How many requests may be in flight at once. Lower this if you hit rate limits."
+        )
+
+    batch_button = st.button("🧪 Generate Batch", use_container_width=True, key="batch_button")
+
 # Image generation
+def spinner_message_for(realism_mode):
+    """Status text shown while a generation job is running."""
+    if DEMO_MODE:
+        return "🎨 Generating demo image..."
+    return "🎨 Creating ultra-realistic masterpiece... This will take 30-60 seconds for maximum quality..." if realism_mode else "🎨 Creating your masterpiece... This may take 10-30 seconds..."
+
+def queue_status(job_info, message):
+    """`message`, or the job's place in the admission queue while it waits for a slot upstream."""
+    position = admission_controller.position(job_info.get('tag')) if not DEMO_MODE else None
+    if position is None:
+        return message
+    return f"⏳ Queued, position {position} - waiting for a free slot upstream..."
+
+def submit_generation(kind, job_info, cancellable=False):
+    """Queue a generation job and remember it in this session.
+
+    `job_info` holds everything needed to show and store the result later
+    (prompts, style, realism mode and the generation_params sent upstream).
+    """
+    job_info = dict(job_info, kind=kind, tag=uuid.uuid4().hex)
+    job_info['job_id'] = job_executor.submit(
+        generate_image,
+        job_info['generation_params'],
+        use_cache=not job_info.get('fresh_sample', False),
+        demo_prompt=job_info['prompt'],
+        demo_style=job_info['style'],
+        session_id=st.session_state.session_id,
+        tiled=job_info.get('tiled'),
+        tag=job_info['tag'],
+        meta={'kind': kind},
+        cancellable=cancellable
+    )
+    st.session_state.pending_jobs.append(job_info)
+    return job_info['job_id']
+
+def submit_with_draft(job_info):
+    """Queue a cheap draft of `job_info` and its full render side by side.
+
+    The draft is only a rough preview (fewer steps, smaller size). The full
+    render keeps the request's own parameters, so it hits the same cache
+    entries as a request made without a draft.
+    """
+    draft_id = submit_generation('draft', dict(
+        job_info,
+        generation_params=draft_params(job_info['generation_params']),
+        tiled=None
+    ), cancellable=True)
+    return submit_generation('generate', dict(job_info, draft_id=draft_id), cancellable=True)
+
+def discard_draft(job_info):
+    """The user rejected a draft: cancel its full render (taken off the queue if it is still waiting)."""
+    job_executor.cancel(job_info['job_id'])
+    job_executor.forget(job_info['job_id'])
+    if job_info in st.session_state.pending_jobs:
+        st.session_state.pending_jobs.remove(job_info)
+    metrics.incr("drafts_discarded_total")
+
+def earlier_similar(hashes):
+    """Earlier generations that look almost the same: {'count', 'prompt' of the closest}, or None.
+
+    Searches the archive of every session when there is one, else this session's history.
+    """
+    if not hashes:
+        return None
+    if archive is not None:
+        matches = archive.similar(hashes)
+        closest = archive.get(matches[0][0]) if matches else None
+    else:
+        from imagegen.perceptual_hash import HashIndex
+
+        entries = [entry for entry in history if entry.get('hashes')]
+        index = HashIndex(max(1, len(entries)))
+        index.extend(list(range(len(entries))), [entry['hashes'] for entry in entries])
+        matches = index.similar(hashes)
+        closest = entries[matches[0][0]] if matches else None
+    if not matches:
+        return None
+    return {'count': len(matches), 'prompt': closest['prompt'] if closest else ""}
+
+def add_to_history(result, job_info, seconds):
+    """Add a finished job's result to the session history and the archive.
+
+    Returns the stored session history entry.
+    """
+    image_data = {
+        'prompt': job_info['prompt'],
+        'enhanced_prompt': job_info['enhanced_prompt'],
+        'style': job_info['style'],
+        'timestamp': datetime.now(),
+        'realism_mode': job_info['realism_mode'],
+        'generation_params': job_info['generation_params'],
+        'add_details': job_info.get('add_details', True),
+        'add_quality': job_info.get('add_quality', True),
+        'seconds': seconds,
+        'size': result['image'].size,
+        'model': result.get('model'),
+        'format': result['format'],
+        'tiled': job_info.get('tiled'),
+        'from_cache': result['from_cache'],
+        'hashes': result.get('hashes')
+    }
+    image_data['similar'] = earlier_similar(image_data['hashes'])
+    if archive is not None:
+        archive.record(image_data, result['data'], result['thumbnail'], OUTPUT_FORMAT.extension)
+    return history.add(image_data, result['data'], result['thumbnail'], OUTPUT_FORMAT.mime)
+
+def read_entry_image(entry):
+    """Full-size image bytes of a history entry, from the session or, if it has left it, the archive."""
+    data = history.get_bytes(entry['image_key'])
+    if data is None and archive is not None:
+        data = archive.read_image(entry['image_key'])
+    return data
+
+def zip_export(entries):
+    """Deferred ZIP export for st.download_button: only built when the button is clicked."""
+    return deferred_zip(entries, read_entry_image)
+
+def download_data(image_key):
+    """Download payload for a stored image in the format picked in the sidebar.
+
+    Stored bytes are served as they are when the format matches; otherwise
+    the conversion is deferred until the button is clicked, so it never runs
+    during a rerun.
+    """
+    if download_format.name == OUTPUT_FORMAT.name:
+        return history.get_bytes(image_key)
+    return lambda: download_format.transcode(history.get_bytes(image_key))
+
+def resubmit(entry):
+    """Regenerate a history or archive entry with exactly its stored parameters."""
+    submit_generation('generate', {
+        'prompt': entry['prompt'],
+        'enhanced_prompt': entry['enhanced_prompt'],
+        'style': entry['style'],
+        'realism_mode': entry['realism_mode'],
+        'add_details': entry.get('add_details', True),
+        'add_quality': entry.get('add_quality', True),
+        'fresh_sample': fresh_sample,
+        'generation_params': entry['generation_params'],
+        'tiled': entry.get('tiled')
+    })
+
+def show_prompt_details(job_info):
+    """Show the enhanced prompt and settings a job was submitted with."""
+    params = job_info['generation_params']
+    with st.expander("📝 View Enhanced Prompt & Settings", expanded=True):
+        st.markdown("**Your Base Prompt:**")
+        st.code(job_info['prompt'], language=None)
+
+        if job_info['style'] != "None" and not job_info['realism_mode']:
+            st.markdown(f"**Selected Style:** {job_info['style']}")
+            st.markdown("**Style Keywords Added:**")
+            st.code(STYLE_PRESETS[job_info['style']], language=None)
+
+        st.markdown("**Final Enhanced Prompt:**")
+        st.info(job_info['enhanced_prompt'])
+
+        if params.get("negative_prompt"):
+            st.markdown("**Negative Prompt:**")
+            st.warning(params["negative_prompt"])
+
+        if job_info['realism_mode']:
+            st.success(f"🎯 Ultra Realism Settings Applied:\n- Resolution: {params['width']}x{params['height']}\n- Guidance Scale: {params['guidance_scale']}\n- Inference Steps: {params['num_inference_steps']}")
+
+        tiled = job_info.get('tiled')
+        if tiled:
+            st.info(f"🧩 Tiled output: {tiled['width']}x{tiled['height']} ({TILED_MODE_LABELS[tiled['mode']].lower()})")
+
+def show_generation_error(error_message):
+    # Handle specific error cases
+    if "server busy" in error_message.lower():
+        st.error("🚦 Too many requests are waiting right now, so this one was not queued.")
+        st.info("Smaller images or fewer inference steps use the light lane, which moves faster. Try again in a moment.")
+    elif "rate limit" in error_message.lower() or "429" in error_message:
+        st.error("⏰ Rate limit reached! Please wait a moment before generating another image.")
+        st.info("The free tier has usage limits. Try again in a few minutes.")
+    elif "authorization" in error_message.lower() or "401" in error_message or "403" in error_message:
+        st.error("🔑 Authentication failed!")
+        st.info("""
+        Please check your API token:
+        - Ensure your token has "Write" permissions
+        - Read-only tokens don't work for Inference API
+        - Get a new token at: https://huggingface.co/settings/tokens
+        """)
+    elif "model" in error_message.lower() or "404" in error_message:
+        st.error("❌ Model not found or unavailable!")
+        st.info(f"{MODEL_LABELS} might be unavailable. Add fallback models with MODELS in your .env file.")
+    else:
+        st.error(f"❌ Error generating image: {error_message}")
+        st.info("Please try again with a different prompt or check your internet connection.")
+
+def tiled_target(generation_params):
+    """Tiled output settings for a request, or None when tiling is off."""
+    if tiled_scale == 1:
+        return None
+    width, height = generation_params['width'], generation_params['height']
+    factor = min(tiled_scale, TILED_MAX_SIZE / max(width, height))
+    if factor <= 1:
+        return None
+    return {'mode': tiled_mode, 'width': int(width * factor), 'height': int(height * factor)}
+
+def build_job_info(base_prompt, style, seed=None):
+    """Build the job_info for one request from the current widget values."""
+    job_info = dict(
+        build_request(
+            base_prompt,
+            style,
+            realism_mode=realism_mode,
+            negative_prompt=negative_prompt,
+            # Use selected size from selectbox as default, but advanced settings override if changed
+            width=selected_width if image_width == 768 else image_width,
+            height=selected_height if image_height == 768 else image_height,
+            guidance_scale=guidance_scale,
+            num_inference_steps=num_steps,
+            add_details=add_details,
+            add_quality=add_quality,
+            seed=seed,
+            model=REQUEST_MODEL
+        ),
+        fresh_sample=fresh_sample
+    )
+    job_info['tiled'] = tiled_target(job_info['generation_params'])
+    return job_info
+
+def submit_batch(job_infos, labels):
+    """Fan several requests out concurrently as one background job."""
+    batch = Batch.from_kwargs(
+        [{
+            'generation_params': info['generation_params'],
+            'use_cache': not info['fresh_sample'],
+            'demo_prompt': info['prompt'],
+            'demo_style': info['style'],
+            'session_id': st.session_state.session_id,
+            'tiled': info.get('tiled')
+        } for info in job_infos],
+        labels=labels,
+        max_parallel=batch_parallelism
+    )
+    job_id = job_executor.submit(batch.run, generate_image, meta={'kind': 'batch'})
+    st.session_state.pending_batches.append({
+        'job_id': job_id,
+        'batch': batch,
+        'job_infos': job_infos,
+        'collected': set(),
+        'entries': {}
+    })
+
 if generate_button:
     if not prompt.strip():
         st.warning("Please enter a description for your image!")
     else:
-        # Override advanced settings for realism mode
-        if realism_mode:
-            # Maximum quality settings for ultra photorealism (slower but much better)
-            actual_guidance_scale = 15.0  # Very high guidance for maximum precision
-            actual_width = 1024
-            actual_height = 1024
-            actual_steps = 16  # Maximum steps allowed by FLUX.1-schnell model
-        else:
-            actual_guidance_scale = guidance_scale
-            # Use selected size from selectbox as default, but advanced settings override if changed
-            actual_width = selected_width if image_width == 768 else image_width
-            actual_height = selected_height if image_height == 768 else image_height
-            actual_steps = num_steps
-
-        # Enhance the prompt
-        enhanced_prompt = enhance_prompt(prompt, style_preset, ultra_realism=realism_mode)
-
-        # Add additional quality keywords if selected (and not in realism mode - already added)
-        if not realism_mode:
-            if add_details and "detailed" not in enhanced_prompt.lower():
-                enhanced_prompt += ", highly detailed throughout entire scene"
-            if add_quality:
-                enhanced_prompt += ", high quality, sharp focus everywhere, everything in focus, deep focus, no blur"
-
-        # Show the enhanced prompt and settings
-        with st.expander("📝 View Enhanced Prompt & Settings", expanded=True):
-            st.markdown("**Your Base Prompt:**")
-            st.code(prompt, language=None)
-
-            if style_preset != "None" and not realism_mode:
-                st.markdown(f"**Selected Style:** {style_preset}")
-                st.markdown("**Style Keywords Added:**")
-                st.code(STYLE_PRESETS[style_preset], language=None)
-
-            st.markdown("**Final Enhanced Prompt:**")
-            st.info(enhanced_prompt)
-
-            if negative_prompt and negative_prompt.strip():
-                st.markdown("**Negative Prompt:**")
-                st.warning(negative_prompt)
-
-            if realism_mode:
-                st.success(f"🎯 Ultra Realism Settings Applied:\n- Resolution: {actual_width}x{actual_height}\n- Guidance Scale: {actual_guidance_scale}\n- Inference Steps: {actual_steps}")
-
-        # Adjust spinner message based on mode
-        if DEMO_MODE:
-            spinner_message = "🎨 Generating demo image..."
+        if progressive_preview:
+            submit_with_draft(build_job_info(prompt, style_preset))
         else:
-            spinner_message = "🎨 Creating ultra-realistic masterpiece... This will take 30-60 seconds for maximum quality..." if realism_mode else "🎨 Creating your masterpiece... This may take 10-30 seconds..."
-
-        with st.spinner(spinner_message):
-            try:
-                # Generate image - use demo mode if enabled or if API fails
-                if DEMO_MODE:
-                    # Generate demo placeholder image
-                    import time
-                    time.sleep(1)  # Simulate processing time
-                    image = generate_demo_image(prompt, style_preset, actual_width, actual_height)
+            submit_generation('generate', build_job_info(prompt, style_preset))
+
+if batch_button:
+    if not prompt.strip():
+        st.warning("Please enter a description for your image!")
+    elif batch_mode == "All style presets":
+        styles = [name for name in STYLE_PRESETS if name != "None"]
+        submit_batch([build_job_info(prompt, name) for name in styles], styles)
+    else:
+        seeds = [random.randint(0, 2**31 - 1) for _ in range(batch_size)]
+        submit_batch(
+            [build_job_info(prompt, style_preset, seed=seed) for seed in seeds],
+            [f"Variant {i + 1}" for i in range(batch_size)]
+        )
+
+# Collect jobs that finished since the last rerun. This runs on every rerun, so
+# results land in the history even if the user kept clicking around meanwhile.
+for job_info in list(st.session_state.pending_jobs):
+    job = job_executor.get(job_info['job_id'])
+    if job is not None and not job.finished:
+        continue
+
+    st.session_state.pending_jobs.remove(job_info)
+    if job is None:
+        st.warning(f"⚠️ Lost track of the generation for '{job_info['prompt']}'. Please try again.")
+        continue
+    job_executor.forget(job.id)
+    metrics.observe("job_seconds", job.elapsed, kind=job_info['kind'], status=job.status)
+    metrics.incr("generations_total", kind=job_info['kind'], status=job.status)
+
+    if job.status == CANCELLED:
+        continue
+    if job.status == FAILED:
+        if job_info['kind'] == 'draft':
+            pass  # Its full render is still running and reports any real problem
+        elif job_info['kind'] != 'refine':
+            show_generation_error(str(job.error))
+        elif not refinement.failed(job.id, job.error):
+            st.error(f"❌ Error generating refined image: {str(job.error)}")
+        continue
+
+    if job_info['kind'] == 'draft':
+        # Draft is in: show it in place of its full render until that is ready
+        for final in st.session_state.pending_jobs:
+            if final.get('draft_id') == job_info['job_id']:
+                final['draft'] = job.result['thumbnail']
+        continue
+    if job_info.get('draft_id'):
+        # The full render beat its draft, which is no longer worth waiting for
+        job_executor.cancel(job_info['draft_id'])
+
+    stored = add_to_history(job.result, job_info, job.finished_at - job.started_at)
+    # New images go on screen; a refinement replaces the image it refined (if still followed)
+    if job_info['kind'] == 'refine':
+        refinement.finished(job.id, stored['id'])
+    else:
+        refinement.show(stored['id'])
+
+# Stream batch results into a grid as each item completes
+for batch_info in list(st.session_state.pending_batches):
+    batch = batch_info['batch']
+    job = job_executor.get(batch_info['job_id'])
+
+    st.markdown(f"**🧪 Batch:** {len(batch.completed)}/{len(batch.items)} done ({batch.elapsed:.0f}s, up to {batch.max_parallel} in parallel)")
+    for idx in range(0, len(batch.items), 4):
+        cols = st.columns(4)
+        for col, item in zip(cols, batch.items[idx:idx + 4]):
+            with col:
+                if item.status == BATCH_DONE:
+                    st.image(item.result['thumbnail'], use_column_width=True)
+                    st.caption(f"{item.label} · {item.seconds:.1f}s")
+                elif item.status == BATCH_FAILED:
+                    st.error(f"{item.label}: {item.error}")
                 else:
-                    # Prepare parameters for image generation
-                    generation_params = {
-                        "prompt": enhanced_prompt,
-                        "model": MODEL_NAME,
-                        "width": actual_width,
-                        "height": actual_height,
-                        "guidance_scale": actual_guidance_scale,
-                        "num_inference_steps": actual_steps
-                    }
-
-                    # Add negative prompt if provided
-                    if negative_prompt and negative_prompt.strip():
-                        generation_params["negative_prompt"] = negative_prompt
-
-                    # Generate image using InferenceClient with parameters
-                    image = client.text_to_image(**generation_params)
-
-                # Add to image history
-                image_data = {
-                    'image': image,
-                    'prompt': prompt,
-                    'enhanced_prompt': enhanced_prompt,
-                    'style': style_preset,
-                    'timestamp': datetime.now(),
-                    'realism_mode': realism_mode
-                }
-                st.session_state.image_history.insert(0, image_data)
-
-                # Limit to 10 images
-                if len(st.session_state.image_history) > 10:
-                    st.session_state.image_history = st.session_state.image_history[:10]
-
-                # Display the generated image
-                st.success("✨ Image generated successfully!")
-                st.image(image, caption=f"Generated: {prompt}", use_column_width=True)
-
-                # Optional: Add download button
-                # Convert PIL Image to bytes for download
-                from io import BytesIO
-                buf = BytesIO()
-                image.save(buf, format="PNG")
-                byte_im = buf.getvalue()
-
-                st.download_button(
-                    label="📥 Download Image",
-                    data=byte_im,
-                    file_name="ai_generated_image.png",
-                    mime="image/png",
-                    use_container_width=True
+                    st.info(f"⏳ {item.label}")
+
+            # Completed items join the history as soon as they arrive
+            if item.status == BATCH_DONE and item.index not in batch_info['collected']:
+                batch_info['collected'].add(item.index)
+                metrics.observe("job_seconds", item.seconds, kind="batch", status=item.status)
+                metrics.incr("generations_total", kind="batch", status=item.status)
+                batch_info['entries'][item.index] = add_to_history(
+                    item.result, batch_info['job_infos'][item.index], item.seconds
                 )
 
-                # Image refinement section
-                st.markdown("---")
-                st.subheader("🔧 Refine This Image")
-                st.markdown("Want to improve this image? Tell the AI what to change!")
+    if job is None or job.finished:
+        st.session_state.pending_batches.remove(batch_info)
+        st.session_state.last_batch = [batch_info['entries'][index] for index in sorted(batch_info['entries'])]
+        if job is not None:
+            job_executor.forget(job.id)
+
+# The most recent finished batch can be downloaded in one go
+if st.session_state.get('last_batch') and not st.session_state.pending_batches:
+    st.download_button(
+        label=f"📦 Download Last Batch ({len(st.session_state.last_batch)} images, ZIP)",
+        data=zip_export(st.session_state.last_batch),
+        file_name="ai_image_batch.zip",
+        mime="application/zip",
+        use_container_width=True,
+        key="download_last_batch"
+    )
 
-                refinement_prompt = st.text_area(
-                    "What would you like to improve or change?",
-                    placeholder="e.g., Make the colors more vibrant, add more detail to the face, make the lighting brighter, remove the background blur",
-                    height=80,
-                    key="refinement_prompt"
-                )
+# Show jobs that are still running
+for job_info in st.session_state.pending_jobs:
+    job = job_executor.get(job_info['job_id'])
+    elapsed = f" ({job.elapsed:.0f}s)" if job is not None else ""
+    if job_info['kind'] == 'refine':
+        st.info(queue_status(job_info, f"🎨 Creating improved version: *{job_info['instruction']}*") + elapsed)
+    elif job_info['kind'] == 'draft':
+        # Shown with its full render below
+        continue
+    elif job_info.get('draft'):
+        show_prompt_details(job_info)
+        st.image(job_info['draft'], caption="⚡ Rough draft - the full-quality image replaces it when ready and may differ",
+                 use_column_width=True, output_format="JPEG")
+        st.info(queue_status(job_info, spinner_message_for(job_info['realism_mode'])) + elapsed)
+        st.button("✖️ Discard Draft (cancel full render)", use_container_width=True,
+                  key=f"discard_{job_info['job_id']}", on_click=discard_draft, args=(job_info,))
+    else:
+        show_prompt_details(job_info)
+        st.info(queue_status(job_info, spinner_message_for(job_info['realism_mode'])) + elapsed)
+        if job_info.get('draft_id'):
+            st.caption("⚡ Drawing a quick draft...")
+
+# The generation on screen, with its refine form. Drawn from stored state on every
+# rerun, so the form's button still exists on the rerun its click triggers.
+refine_submitted = False
+with metrics.span("render"):
+    current = history.find(refinement.generation_id) if refinement.generation_id else None
+    if refinement.generation_id and current is None:
+        refinement.reset()  # Cleared or aged out of the history
+    if current is not None:
+        image_bytes = history.get_bytes(current['image_key'])
+        if refinement.refined_from:
+            st.success("✨ Improved image generated!")
+            caption = f"Refined: {current['prompt']}"
+        else:
+            show_prompt_details(current)
+            st.success("✨ Image generated successfully!")
+            caption = f"Generated: {current['prompt']}"
+            if current.get('from_cache'):
+                st.caption("♻️ Served from cache - tick 'Always generate a fresh image' for a new sample")
+            elif current.get('model'):
+                model = current['model']
+                st.caption(f"🤖 Generated with {MODEL_REGISTRY[model].label if model in MODEL_REGISTRY else model}")
+        if current.get('similar'):
+            similar = current['similar']
+            st.caption(f"🔁 Looks almost the same as {similar['count']} earlier generation(s), "
+                       f"closest: \"{similar['prompt'][:60]}\"")
+        st.image(image_bytes, caption=caption, use_column_width=True, output_format=OUTPUT_FORMAT.display_format)
+
+        st.download_button(
+            label="📥 Download Improved Image" if refinement.refined_from else "📥 Download Image",
+            data=download_data(current['image_key']),
+            file_name=download_format.file_name("ai_generated_image_refined" if refinement.refined_from else "ai_generated_image"),
+            mime=download_format.mime,
+            use_container_width=True,
+            key=f"download_current_{current['id']}"
+        )
 
-                col1, col2, col3 = st.columns([1, 2, 1])
-                with col2:
-                    refine_button = st.button("🎨 Regenerate with Changes", use_container_width=True, key="refine_button")
-
-                if refine_button:
-                    if not refinement_prompt.strip():
-                        st.warning("Please describe what you'd like to improve!")
-                    else:
-                        # Create enhanced prompt with refinement instructions
-                        refined_prompt = f"{prompt}, {refinement_prompt}"
-
-                        st.info(f"**Regenerating with improvements:** {refinement_prompt}")
-
-                        with st.spinner("🎨 Creating improved version..."):
-                            try:
-                                # Enhance the refined prompt
-                                enhanced_refined_prompt = enhance_prompt(refined_prompt, style_preset, ultra_realism=realism_mode)
-
-                                # Add quality keywords if not in realism mode
-                                if not realism_mode:
-                                    if add_details and "detailed" not in enhanced_refined_prompt.lower():
-                                        enhanced_refined_prompt += ", highly detailed throughout entire scene"
-                                    if add_quality:
-                                        enhanced_refined_prompt += ", high quality, sharp focus everywhere, everything in focus, deep focus, no blur"
-
-                                # Generate refined image
-                                if DEMO_MODE:
-                                    import time
-                                    time.sleep(1)
-                                    refined_image = generate_demo_image(refined_prompt, style_preset, actual_width, actual_height)
-                                else:
-                                    refined_generation_params = {
-                                        "prompt": enhanced_refined_prompt,
-                                        "model": MODEL_NAME,
-                                        "width": actual_width,
-                                        "height": actual_height,
-                                        "guidance_scale": actual_guidance_scale,
-                                        "num_inference_steps": actual_steps
-                                    }
-
-                                    if negative_prompt and negative_prompt.strip():
-                                        refined_generation_params["negative_prompt"] = negative_prompt
-
-                                    refined_image = client.text_to_image(**refined_generation_params)
-
-                                # Add refined image to history
-                                refined_image_data = {
-                                    'image': refined_image,
-                                    'prompt': refined_prompt,
-                                    'enhanced_prompt': enhanced_refined_prompt,
-                                    'style': style_preset,
-                                    'timestamp': datetime.now(),
-                                    'realism_mode': realism_mode
-                                }
-                                st.session_state.image_history.insert(0, refined_image_data)
-
-                                # Limit to 10 images
-                                if len(st.session_state.image_history) > 10:
-                                    st.session_state.image_history = st.session_state.image_history[:10]
-
-                                # Display refined image
-                                st.success("✨ Improved image generated!")
-                                st.image(refined_image, caption=f"Refined: {refined_prompt}", use_column_width=True)
-
-                                # Download button for refined image
-                                buf_refined = BytesIO()
-                                refined_image.save(buf_refined, format="PNG")
-                                byte_im_refined = buf_refined.getvalue()
-
-                                st.download_button(
-                                    label="📥 Download Improved Image",
-                                    data=byte_im_refined,
-                                    file_name="ai_generated_image_refined.png",
-                                    mime="image/png",
-                                    use_container_width=True,
-                                    key="download_refined"
-                                )
-
-                            except Exception as e:
-                                st.error(f"❌ Error generating refined image: {str(e)}")
-
-            except Exception as e:
-                error_message = str(e)
-
-                # Handle specific error cases
-                if "rate limit" in error_message.lower() or "429" in error_message:
-                    st.error("⏰ Rate limit reached! Please wait a moment before generating another image.")
-                    st.info("The free tier has usage limits. Try again in a few minutes.")
-                elif "authorization" in error_message.lower() or "401" in error_message or "403" in error_message:
-                    st.error("🔑 Authentication failed!")
-                    st.info("""
-                    Please check your API token:
-                    - Ensure your token has "Write" permissions
-                    - Read-only tokens don't work for Inference API
-                    - Get a new token at: https://huggingface.co/settings/tokens
-                    """)
-                elif "model" in error_message.lower() or "404" in error_message:
-                    st.error("❌ Model not found or unavailable!")
-                    st.info(f"The model '{MODEL_NAME}' might be unavailable. Try alternative models in the code.")
-                else:
-                    st.error(f"❌ Error generating image: {error_message}")
-                    st.info("Please try again with a different prompt or check your internet connection.")
+        # Image refinement section
+        st.markdown("---")
+        st.subheader("🔧 Refine This Image")
+        st.markdown("Want to improve this image? Tell the AI what to change!")
+        if refinement.error:
+            st.error(f"❌ Error generating refined image: {refinement.error}")
+
+        refinement_prompt = st.text_area(
+            "What would you like to improve or change?",
+            placeholder="e.g., Make the colors more vibrant, add more detail to the face, make the lighting brighter, remove the background blur",
+            height=80,
+            key=f"refinement_prompt_{current['id']}"
+        )
+
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            refine_button = st.button(
+                "🎨 Regenerate with Changes",
+                use_container_width=True,
+                key=f"refine_button_{current['id']}",
+                # One refinement at a time: double clicks must not queue duplicate generations
+                disabled=refinement.state == REFINING
+            )
+
+        if refine_button:
+            if not refinement_prompt.strip():
+                st.warning("Please describe what you'd like to improve!")
+            elif refinement.can_refine:
+                # Same stored parameters (seed, size, model...) with the instruction added to the prompt
+                job_info = dict(refined_job_info(current, refinement_prompt), fresh_sample=fresh_sample)
+                refinement.start(submit_generation('refine', job_info), job_info['instruction'])
+                refine_submitted = True
+# st.rerun() raises to restart the script, so it stays out of the span (which would count it as an error)
+if refine_submitted:
+    st.rerun()
 
 # Image History Gallery
-if st.session_state.image_history:
+if history:
     st.markdown("---")
     st.header("🖼️ Image History")
-    st.markdown(f"*Showing {len(st.session_state.image_history)} of 10 maximum images*")
+    st.markdown(f"*Showing {len(history)} of {history.max_items} maximum images*")
+
+    # Export everything as one ZIP (images plus a manifest of prompts and settings)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="📦 Download All (ZIP)",
+            data=zip_export(history),
+            file_name="ai_image_history.zip",
+            mime="application/zip",
+            use_container_width=True,
+            key="download_all_history"
+        )
 
     # Clear history button
-    col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         if st.button("🗑️ Clear History", use_container_width=True, key="clear_history"):
-            st.session_state.image_history = []
+            history.clear()
+            st.session_state.open_image = None
             st.rerun()
 
     st.markdown("---")
 
-    # Display images in grid (3 columns)
-    for idx in range(0, len(st.session_state.image_history), 3):
-        cols = st.columns(3)
+    # Full-resolution view of one history image, opened from its tile
+    open_key = st.session_state.get('open_image')
+    if open_key and open_key in history:
+        st.image(history.get_bytes(open_key), use_column_width=True, output_format=OUTPUT_FORMAT.display_format)
+        st.button("✖️ Close", use_container_width=True, key="close_open_image",
+                  on_click=lambda: st.session_state.update(open_image=None))
+        st.markdown("---")
 
-        for col_idx, col in enumerate(cols):
-            img_idx = idx + col_idx
-            if img_idx < len(st.session_state.image_history):
-                img_data = st.session_state.image_history[img_idx]
+    # Regenerations of the same idea are shown once, as their newest image
+    if st.toggle("🔁 Collapse near-duplicates", value=True, key="collapse_duplicates"):
+        from imagegen.perceptual_hash import collapse
 
+        groups = collapse(list(range(len(history))), [entry.get('hashes') for entry in history])
+    else:
+        groups = [(img_idx, []) for img_idx in range(len(history))]
+
+    # Display images in grid (3 columns) from compact thumbnails
+    with metrics.span("gallery"):
+        for idx in range(0, len(groups), 3):
+            cols = st.columns(3)
+
+            for col_idx, col in enumerate(cols):
+                if idx + col_idx < len(groups):
+                    img_idx, duplicates = groups[idx + col_idx]
+                    img_data = history[img_idx]
+
+                    with col:
+                        # Display thumbnail; the full image is only sent for "Open" or download
+                        st.image(history.get_bytes(img_data['thumb_key']), use_column_width=True, output_format="JPEG")
+                        st.button("🔍 Open", use_container_width=True, key=f"open_{img_idx}",
+                                  on_click=lambda key=img_data['image_key']: st.session_state.update(open_image=key))
+
+                        # Show style badge
+                        if img_data['realism_mode']:
+                            st.markdown("🎯 **Ultra Realism Mode**")
+                        elif img_data['style'] != "None":
+                            st.markdown(f"🎨 **Style:** {img_data['style']}")
+                        if duplicates:
+                            st.caption(f"🔁 +{len(duplicates)} near-duplicate{'s' if len(duplicates) > 1 else ''} hidden")
+
+                        # Show prompt in expander
+                        with st.expander(f"📝 Prompt #{img_idx + 1}", expanded=False):
+                            st.markdown(f"**Original:** {img_data['prompt']}")
+                            timing = f" in {img_data['seconds']:.1f}s" if img_data.get('seconds') is not None else ""
+                            st.caption(f"*Generated: {img_data['timestamp'].strftime('%H:%M:%S')}{timing}*")
+
+                        # Download button for this image
+                        st.download_button(
+                            label="📥 Download",
+                            data=download_data(img_data['image_key']),
+                            file_name=download_format.file_name(f"ai_image_{img_idx + 1}"),
+                            mime=download_format.mime,
+                            use_container_width=True,
+                            key=f"download_history_{img_idx}"
+                        )
+
+                        # Regenerate with the exact same parameters
+                        if st.button("🔄 Regenerate", use_container_width=True, key=f"regen_{img_idx}"):
+                            resubmit(img_data)
+                            st.info(f"💡 Regenerating '{img_data['prompt']}' - it will appear above when ready")
+
+                        # Bring this image back up top with its refine form (no new generation)
+                        st.button("🔧 Refine", use_container_width=True, key=f"refine_history_{img_idx}",
+                                  on_click=lambda entry_id=img_data['id']: refinement.show(entry_id))
+
+# Browse every past generation (all sessions), one page at a time
+if archive is not None and len(archive):
+    st.markdown("---")
+    if st.toggle("📚 Browse all past generations", key="show_archive"):
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            archive_search = st.text_input("Search prompts:", key="archive_search")
+        with col2:
+            archive_style = st.selectbox("Style:", ["Any"] + archive.styles(), key="archive_style")
+        with col3:
+            archive_realism = st.selectbox("Realism:", ["Any", "Ultra Realism", "Standard"], key="archive_realism")
+
+        archive_filters = dict(
+            style=None if archive_style == "Any" else archive_style,
+            realism_mode=None if archive_realism == "Any" else archive_realism == "Ultra Realism",
+            search=archive_search
+        )
+        requested_page = st.session_state.get('archive_page', 1)
+        rows, total = archive.query(page=requested_page - 1, page_size=ARCHIVE_PAGE_SIZE, **archive_filters)
+        page_count = max(1, -(-total // ARCHIVE_PAGE_SIZE))
+        if requested_page > page_count:
+            # Filters narrowed the results; jump back to the last page that exists
+            st.session_state.archive_page = page_count
+            rows, total = archive.query(page=page_count - 1, page_size=ARCHIVE_PAGE_SIZE, **archive_filters)
+        st.number_input(f"Page (of {page_count}, {total} images):", min_value=1, max_value=page_count, key="archive_page")
+
+        for idx in range(0, len(rows), 3):
+            cols = st.columns(3)
+            for col, row in zip(cols, rows[idx:idx + 3]):
                 with col:
-                    # Display image
-                    st.image(img_data['image'], use_column_width=True)
-
-                    # Show style badge
-                    if img_data['realism_mode']:
-                        st.markdown("🎯 **Ultra Realism Mode**")
-                    elif img_data['style'] != "None":
-                        st.markdown(f"🎨 **Style:** {img_data['style']}")
-
-                    # Show prompt in expander
-                    with st.expander(f"📝 Prompt #{img_idx + 1}", expanded=False):
-                        st.markdown(f"**Original:** {img_data['prompt']}")
-                        st.caption(f"*Generated: {img_data['timestamp'].strftime('%H:%M:%S')}*")
-
-                    # Download button for this image
-                    from io import BytesIO
-                    buf_history = BytesIO()
-                    img_data['image'].save(buf_history, format="PNG")
-                    byte_im_history = buf_history.getvalue()
-
-                    st.download_button(
-                        label="📥 Download",
-                        data=byte_im_history,
-                        file_name=f"ai_image_{img_idx + 1}.png",
-                        mime="image/png",
-                        use_container_width=True,
-                        key=f"download_history_{img_idx}"
-                    )
-
-                    # Regenerate with same prompt button
-                    if st.button("🔄 Regenerate", use_container_width=True, key=f"regen_{img_idx}"):
-                        st.session_state.regen_prompt = img_data['prompt']
-                        st.session_state.regen_style = img_data['style']
-                        st.info(f"💡 Scroll up and click 'Generate Image' to recreate with prompt: '{img_data['prompt']}'")
+                    thumbnail = archive.read_thumbnail(row['thumb_key'])
+                    if thumbnail is not None:
+                        st.image(thumbnail, use_column_width=True, output_format="JPEG")
+                    st.caption(f"{row['prompt'][:60]} · {datetime.fromtimestamp(row['created_at']).strftime('%Y-%m-%d %H:%M')}")
+                    if st.button("🔄 Regenerate", use_container_width=True, key=f"archive_regen_{row['id']}"):
+                        resubmit(dict(row, generation_params=row['params']))
+                        st.info("💡 Regenerating - it will appear above when ready")
 
 # Footer
 st.markdown("---")
-st.markdown("""
-    <div style='text-align: center; color: #666;'>
-        <p>Powered by HuggingFace FLUX.1-schnell model 🚀</p>
-        <p style='font-size: 0.8rem;'>Free tier has rate limits. For unlimited access, consider upgrading your HuggingFace plan.</p>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(FOOTER_HTML.format(models=MODEL_LABELS), unsafe_allow_html=True)
+
+# Poll running jobs: rerun shortly so finished images show up without a click
+if st.session_state.pending_jobs or st.session_state.pending_batches:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
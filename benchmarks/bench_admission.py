@@ -0,0 +1,151 @@
+"""Latency of light requests under mixed light/heavy load, with and without admission control.
+
+A simulated upstream serves `capacity` requests at a time in arrival
+order (the quota), taking time proportional to each request's cost.
+Sessions send a mix of light (512x512 or 768x768, 4 steps) and heavy
+(realism mode: 1024x1024, 16 steps) requests with Poisson arrivals at a
+little over what the upstream can serve. "direct" sends everything
+straight to the upstream, as the app did before; "admission" puts an
+AdmissionController with `capacity` slots in front of it. Time is scaled
+so one cost unit takes `--unit` seconds.
+
+The run fails unless light-request p99 latency with admission is at most
+`--margin` times (default half) what it is going direct.
+
+Run from the project root:
+
+    python -m benchmarks.bench_admission --sessions 8 --requests 15 --heavy 0.3
+"""
+import argparse
+import math
+import random
+import threading
+import time
+
+from benchmarks.load_test import percentile
+from imagegen.admission import HEAVY, LIGHT, AdmissionController, Overloaded, cost_class, request_cost
+
+LIGHT_SIZES = (512, 768)
+HEAVY_PARAMS = {"width": 1024, "height": 1024, "num_inference_steps": 16}
+
+
+class SimulatedUpstream:
+    """`capacity` requests at a time, first come first served; each takes cost x `unit` seconds."""
+
+    def __init__(self, capacity, unit):
+        self.unit = unit
+        self._slots = threading.Semaphore(capacity)
+
+    def text_to_image(self, session_id=None, **params):
+        with self._slots:
+            time.sleep(request_cost(params) * self.unit)
+
+
+def workload(sessions, requests, heavy_share, seed):
+    """Per session, a list of (delay before sending, params)."""
+    rng = random.Random(seed)
+    plans = []
+    for _ in range(sessions):
+        plan = []
+        for _ in range(requests):
+            if rng.random() < heavy_share:
+                params = dict(HEAVY_PARAMS)
+            else:
+                size = rng.choice(LIGHT_SIZES)
+                params = {"width": size, "height": size, "num_inference_steps": 4}
+            plan.append((rng.random(), params))
+        plans.append(plan)
+    return plans
+
+
+def simulate(plans, text_to_image, mean_gap):
+    """Send every planned request (each its own thread) and collect latencies by cost class."""
+    latencies = {LIGHT: [], HEAVY: []}
+    shed = {LIGHT: 0, HEAVY: 0}
+    lock = threading.Lock()
+
+    def send(session_id, params):
+        lane = cost_class(params)
+        start = time.perf_counter()
+        try:
+            text_to_image(session_id=session_id, **params)
+        except Overloaded:
+            with lock:
+                shed[lane] += 1
+            return
+        with lock:
+            latencies[lane].append(time.perf_counter() - start)
+
+    def session(index, plan):
+        threads = []
+        for gap, params in plan:
+            # Exponential gaps: Poisson arrivals per session
+            time.sleep(-mean_gap * math.log(1 - gap))
+            thread = threading.Thread(target=send, args=(f"session-{index}", params))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+    runners = [threading.Thread(target=session, args=(i, plan)) for i, plan in enumerate(plans)]
+    start = time.perf_counter()
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+    return latencies, shed, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate mixed light/heavy load with and without admission.")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=15, help="requests per session")
+    parser.add_argument("--heavy", type=float, default=0.3, help="share of heavy requests")
+    parser.add_argument("--capacity", type=int, default=4, help="requests the upstream serves at once")
+    parser.add_argument("--load", type=float, default=1.1, help="offered load relative to upstream capacity")
+    parser.add_argument("--unit", type=float, default=0.02, help="seconds per cost unit")
+    parser.add_argument("--heavy-slots", type=int, default=2)
+    parser.add_argument("--per-session", type=int, default=2)
+    parser.add_argument("--max-queue", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--margin", type=float, default=0.5,
+                        help="light p99 with admission must be at most this fraction of direct light p99")
+    args = parser.parse_args(argv)
+
+    plans = workload(args.sessions, args.requests, args.heavy, args.seed)
+    mean_cost = sum(request_cost(p) for plan in plans for _, p in plan) / (args.sessions * args.requests)
+    # Per-session gap so all sessions together offer `load` x what the upstream can serve
+    mean_gap = mean_cost * args.unit * args.sessions / (args.capacity * args.load)
+    print(f"{args.sessions} sessions x {args.requests} requests, {args.heavy:.0%} heavy, "
+          f"capacity {args.capacity}, offered load {args.load:.0%}, mean cost {mean_cost:.1f} units")
+    print(f"{'mode':<10} | {'class':<5} | {'done':>4} | {'shed':>4} | {'p50 s':>6} | {'p95 s':>6} | "
+          f"{'p99 s':>6} | {'max s':>6}")
+    print("-" * 68)
+
+    upstream = SimulatedUpstream(args.capacity, args.unit)
+    controller = AdmissionController(upstream.text_to_image, max_in_flight=args.capacity,
+                                     heavy_slots=args.heavy_slots, per_session=args.per_session,
+                                     max_queue=args.max_queue)
+    light_p99 = {}
+    for mode, text_to_image in (("direct", upstream.text_to_image), ("admission", controller.text_to_image)):
+        latencies, shed, wall = simulate(plans, text_to_image, mean_gap)
+        for lane in (LIGHT, HEAVY):
+            values = sorted(latencies[lane])
+            if lane == LIGHT:
+                light_p99[mode] = percentile(values, 99)
+            print(f"{mode:<10} | {lane:<5} | {len(values):>4} | {shed[lane]:>4} | {percentile(values, 50):>6.2f} | "
+                  f"{percentile(values, 95):>6.2f} | {percentile(values, 99):>6.2f} | "
+                  f"{(values[-1] if values else 0.0):>6.2f}")
+        print(f"{mode:<10} | wall {wall:.1f}s")
+
+    # The point of admission control: light requests stay fast while heavy ones crowd the upstream
+    assert light_p99["admission"] <= args.margin * light_p99["direct"], (
+        f"light p99 with admission {light_p99['admission']:.2f}s is not below "
+        f"{args.margin:.0%} of direct {light_p99['direct']:.2f}s"
+    )
+    print(f"light p99: {light_p99['admission']:.2f}s with admission vs {light_p99['direct']:.2f}s direct "
+          f"({light_p99['admission'] / light_p99['direct']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Batch fan-out against a stub client that sleeps to simulate API latency.
+
+Run from the project root:
+
+    python -m benchmarks.bench_batch
+"""
+import random
+import time
+
+from PIL import Image
+
+from imagegen.batch import DONE, Batch
+
+LATENCY_SECONDS = (0.2, 0.4)
+BATCH_SIZE = 8
+
+
+class StubClient:
+    """Stands in for InferenceClient: sleeps, then returns a tiny image."""
+
+    def __init__(self, latency=LATENCY_SECONDS, seed=0):
+        self.latency = latency
+        self.rng = random.Random(seed)
+
+    def text_to_image(self, prompt, width=64, height=64, **kwargs):
+        time.sleep(self.rng.uniform(*self.latency))
+        return Image.new('RGB', (width, height))
+
+
+def main():
+    client = StubClient()
+    kwargs_list = [{"prompt": f"variant {i}", "seed": i} for i in range(BATCH_SIZE)]
+
+    print(f"{BATCH_SIZE} requests, stub latency {LATENCY_SECONDS[0]}-{LATENCY_SECONDS[1]}s each")
+    print(f"{'parallel':>8} | {'wall s':>7} | {'sum of items s':>14} | {'first result s':>14}")
+    print("-" * 54)
+    for parallel in (1, 2, 4, 8):
+        batch = Batch.from_kwargs(kwargs_list, max_parallel=parallel)
+        start = time.perf_counter()
+        first = None
+        for item in batch.run_iter(client.text_to_image):
+            if first is None:
+                first = time.perf_counter() - start
+        wall = time.perf_counter() - start
+        assert all(item.status == DONE for item in batch.items)
+        print(f"{parallel:>8} | {wall:>7.2f} | {sum(item.seconds for item in batch.items):>14.2f} | {first:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
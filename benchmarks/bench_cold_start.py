@@ -0,0 +1,78 @@
+"""Cold start: time to first paint of app.py in a fresh interpreter.
+
+Each scenario runs in its own subprocess, like a freshly scheduled pod: import
+Streamlit's test harness, then execute app.py once and report the script
+time and which heavy optional modules ended up imported. Scenarios are the
+missing-token error page, DEMO_MODE and the normal (API) mode before any
+generation has been requested.
+
+Run from the project root:
+
+    python -m benchmarks.bench_cold_start
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+HEAVY_MODULES = ("huggingface_hub", "PIL.ImageDraw", "PIL.ImageFont", "dotenv", "http.server")
+
+SCENARIOS = {
+    "missing token": {"HUGGINGFACE_TOKEN": ""},
+    "demo mode": {"HUGGINGFACE_TOKEN": "hf_benchmark", "DEMO_MODE": "true"},
+    "api mode": {"HUGGINGFACE_TOKEN": "hf_benchmark", "DEMO_MODE": "false"},
+}
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+harness = time.perf_counter()
+before = set(sys.modules)
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+done = time.perf_counter()
+print(json.dumps({{
+    "harness": harness - start,
+    "first_paint": done - harness,
+    "modules": len(set(sys.modules) - before),
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+    "exception": [str(e.value) for e in at.exception],
+}}))
+"""
+
+
+def run_once(app_path, env):
+    scratch = tempfile.mkdtemp(prefix="cold-start-")
+    child_env = dict(os.environ, **env,
+                     GENERATION_CACHE_DIR=os.path.join(scratch, "cache"),
+                     HISTORY_SPILL_PATH=os.path.join(scratch, "spill.sqlite"),
+                     ARCHIVE_DB_PATH=os.path.join(scratch, "archive.sqlite"),
+                     ARCHIVE_IMAGE_DIR=os.path.join(scratch, "archive"))
+    code = CHILD.format(app=app_path, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], env=child_env, cwd=scratch,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    app_path = os.path.abspath("app.py")
+    print(f"median of {RUNS} fresh interpreters per scenario")
+    print(f"{'scenario':<14} | {'first paint ms':>14} | {'new modules':>11} | heavy modules loaded")
+    print("-" * 80)
+    for name, env in SCENARIOS.items():
+        results = [run_once(app_path, env) for _ in range(RUNS)]
+        if results[0]["exception"]:
+            print(f"{name:<14} | app raised: {results[0]['exception'][0][:60]}")
+            continue
+        first_paint = statistics.median(r["first_paint"] for r in results) * 1000
+        modules = statistics.median(r["modules"] for r in results)
+        heavy = ", ".join(results[0]["heavy"]) or "-"
+        print(f"{name:<14} | {first_paint:>14.0f} | {modules:>11.0f} | {heavy}")
+
+
+if __name__ == "__main__":
+    main()
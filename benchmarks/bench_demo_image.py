@@ -0,0 +1,63 @@
+"""Compare the DEMO_MODE gradient renderer with the original per-row draw loop.
+
+All three columns time the background only (the text overlay is the same
+in every case): the original loop, the vectorised render_gradient(), and
+a background cache hit, which is a copy of the cached image.
+
+Run from the project root:
+
+    python -m benchmarks.bench_demo_image
+"""
+import time
+
+from PIL import Image, ImageDraw
+
+from imagegen.demo_image import STYLE_COLORS, _cached_background, render_gradient
+
+# Every size the width/height sliders in app.py allow
+SLIDER_SIZES = range(256, 1024 + 1, 128)
+REPEATS = 3
+
+
+def legacy_gradient(top, bottom, width, height):
+    """The original renderer: one draw.rectangle call per pixel row."""
+    img = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(img)
+    for i in range(height):
+        r = int(top[0] + (bottom[0] - top[0]) * i / height)
+        g = int(top[1] + (bottom[1] - top[1]) * i / height)
+        b = int(top[2] + (bottom[2] - top[2]) * i / height)
+        draw.rectangle([(0, i), (width, i + 1)], fill=(r, g, b))
+    return img
+
+
+def best_of(fn, *args):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    top, bottom = STYLE_COLORS["Cyberpunk"]
+    print(f"{'size':>11} | {'loop ms':>8} | {'new ms':>8} | {'cached ms':>9} | {'speedup':>7}")
+    print("-" * 56)
+    for width in SLIDER_SIZES:
+        for height in SLIDER_SIZES:
+            # The new renderer must stay pixel-identical to the loop it replaces
+            assert legacy_gradient(top, bottom, width, height).tobytes() == \
+                render_gradient(top, bottom, width, height).tobytes()
+
+            loop_ms = best_of(legacy_gradient, top, bottom, width, height)
+            new_ms = best_of(render_gradient, top, bottom, width, height)
+            _cached_background.cache_clear()
+            _cached_background("Cyberpunk", width, height)
+            # What generate_demo_image does with the background on a cache hit
+            cached_ms = best_of(lambda: _cached_background("Cyberpunk", width, height).copy())
+            print(f"{width:>5}x{height:<5} | {loop_ms:>8.2f} | {new_ms:>8.2f} | {cached_ms:>9.2f} | {loop_ms / new_ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
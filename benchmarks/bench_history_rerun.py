@@ -0,0 +1,69 @@
+"""Gallery rerun cost with a full image history, before and after encode-once.
+
+Before: every rerun called `image.save(buf, format="PNG")` for each history
+item to feed its download button. After: bytes are encoded once at generation
+time and each rerun only looks them up in the BlobStore.
+
+Run from the project root:
+
+    python -m benchmarks.bench_history_rerun
+"""
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from imagegen.demo_image import generate_demo_image
+from imagegen.image_store import BlobStore, encode_png, make_thumbnail
+
+HISTORY_SIZE = 10
+RERUNS = 5
+
+
+def sample_image(i, size):
+    """Demo gradient with noise blended in, so PNG has real work to do."""
+    base = generate_demo_image(f"benchmark image {i}", "Fantasy", size, size)
+    noise = Image.effect_noise((size, size), 40).convert("RGB")
+    return Image.blend(base, noise, 0.3)
+
+
+def rerun_before(history):
+    for image in history:
+        buf = BytesIO()
+        image.save(buf, format="PNG")
+        buf.getvalue()
+
+
+def rerun_after(store, keys):
+    for key in keys:
+        store.get(key)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    for _ in range(RERUNS):
+        fn(*args)
+    return (time.perf_counter() - start) / RERUNS * 1000
+
+
+def main():
+    print(f"{HISTORY_SIZE} history items, average over {RERUNS} reruns")
+    print(f"{'size':>9} | {'before ms':>9} | {'after ms':>8} | {'one-off encode ms':>17} | {'PNG KB':>7} | {'thumbs KB':>9}")
+    print("-" * 76)
+    for size in (512, 768, 1024):
+        history = [sample_image(i, size) for i in range(HISTORY_SIZE)]
+
+        store = BlobStore()
+        start = time.perf_counter()
+        keys = [store.put(encode_png(image)) for image in history]
+        encode_ms = (time.perf_counter() - start) * 1000
+        png_kb = sum(len(store.get(key)) for key in keys) / 1024
+        thumbs_kb = sum(len(make_thumbnail(image)) for image in history) / 1024
+
+        before = timed(rerun_before, history)
+        after = timed(rerun_after, store, keys)
+        print(f"{size:>4}x{size:<4} | {before:>9.1f} | {after:>8.3f} | {encode_ms:>17.1f} | {png_kb:>7.0f} | {thumbs_kb:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
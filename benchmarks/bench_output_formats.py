@@ -0,0 +1,78 @@
+"""Encode time, size and fidelity of each OUTPUT_FORMAT setting.
+
+Images are demo gradients with blurred noise blended in, which compresses
+roughly like a generated photo (pure gradients flatter every codec, raw
+noise flatters none). PSNR is against the original pixels; lossless rows
+show "inf".
+
+Run from the project root:
+
+    python -m benchmarks.bench_output_formats
+"""
+import math
+import time
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+from imagegen.demo_image import generate_demo_image
+from imagegen.encoding import OutputFormat, available_formats
+
+SAMPLES = 3
+# (OUTPUT_FORMAT, OUTPUT_QUALITY, OUTPUT_COMPRESSION); the first row (today's default) is the baseline
+SETTINGS = [
+    ("png", 90, 6),
+    ("png", 90, 1),
+    ("png", 90, 9),
+    ("webp", 100, 6),
+    ("webp", 90, 6),
+    ("webp", 80, 3),
+    ("webp", 80, 0),
+    ("avif", 80, 6),
+    ("avif", 60, 6),
+    ("avif", 60, 0),
+    ("jpeg", 95, 6),
+    ("jpeg", 90, 6),
+    ("jpeg", 80, 0),
+]
+
+
+def sample_image(i, size):
+    base = generate_demo_image(f"benchmark image {i}", "Photorealistic", size, size)
+    texture = Image.effect_noise((size, size), 60).filter(ImageFilter.GaussianBlur(1.2)).convert("RGB")
+    return Image.blend(base, texture, 0.25)
+
+
+def psnr(original, data):
+    with Image.open(BytesIO(data)) as decoded:
+        diff = ImageChops.difference(original, decoded.convert("RGB"))
+    rms = math.sqrt(sum(value ** 2 for value in ImageStat.Stat(diff).rms) / 3)
+    return float("inf") if rms == 0 else 20 * math.log10(255 / rms)
+
+
+def main():
+    supported = available_formats()
+    for size in (512, 1024):
+        images = [sample_image(i, size) for i in range(SAMPLES)]
+        baseline_kb = None
+        print(f"\n{size}x{size}, mean of {SAMPLES} images")
+        print(f"{'setting':<18} | {'encode ms':>9} | {'KB':>6} | {'vs PNG-6':>8} | {'PSNR dB':>7}")
+        print("-" * 62)
+        for name, quality, compression in SETTINGS:
+            if name not in supported:
+                print(f"{name:<18} | not supported by this Pillow build")
+                continue
+            output_format = OutputFormat(name, quality=quality, compression=compression)
+            start = time.perf_counter()
+            encoded = [output_format.encode(image) for image in images]
+            encode_ms = (time.perf_counter() - start) / SAMPLES * 1000
+            kb = sum(len(data) for data in encoded) / SAMPLES / 1024
+            baseline_kb = baseline_kb or kb
+            ratio = f"{kb / baseline_kb:.2f}x"
+            quality_db = sum(psnr(image, data) for image, data in zip(images, encoded)) / SAMPLES
+            label = f"{output_format} c{compression}"
+            print(f"{label:<18} | {encode_ms:>9.1f} | {kb:>6.0f} | {ratio:>8} | {quality_db:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
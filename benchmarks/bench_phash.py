@@ -0,0 +1,110 @@
+"""Perceptual hashing: hashing throughput, index lookups, and how well near-duplicates are caught.
+
+Hashing is timed per thumbnail with image_hashes() and for a whole batch
+with hash_thumbnails(), the vectorised path the archive backfill uses.
+Lookups are HashIndex.similar() over random hashes. Accuracy uses random
+synthetic scenes (blurred ellipses and rectangles): each scene's edited
+variants (resized, brighter, cropped, lower contrast, blurred) should
+match it, and no two different scenes should.
+
+Run from the project root:
+
+    python -m benchmarks.bench_phash --scenes 200
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from imagegen.image_store import make_thumbnail
+from imagegen.perceptual_hash import HashIndex, THRESHOLDS, hash_thumbnails, image_hashes
+
+SCENE_SIZE = 768
+VARIANTS = {
+    "resized": lambda image: image.resize((512, 512), Image.LANCZOS),
+    "brighter": lambda image: ImageEnhance.Brightness(image).enhance(1.15),
+    "cropped": lambda image: image.crop((24, 24, image.width - 24, image.height - 24)),
+    "contrast": lambda image: ImageEnhance.Contrast(image).enhance(0.85),
+    "blurred": lambda image: image.filter(ImageFilter.GaussianBlur(3)),
+}
+
+
+def scene(seed):
+    """A random RGB scene of a few soft-edged shapes on a coloured background."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (SCENE_SIZE, SCENE_SIZE), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(4, 9)):
+        x0, y0 = rng.randrange(SCENE_SIZE), rng.randrange(SCENE_SIZE)
+        box = (x0, y0, x0 + rng.randint(60, 400), y0 + rng.randint(60, 400))
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=fill)
+    return image.filter(ImageFilter.GaussianBlur(6))
+
+
+def hashing(thumbnails):
+    start = time.perf_counter()
+    for data in thumbnails:
+        image_hashes(data)
+    single = (time.perf_counter() - start) / len(thumbnails) * 1e6
+    start = time.perf_counter()
+    hash_thumbnails(thumbnails)
+    batch = (time.perf_counter() - start) / len(thumbnails) * 1e6
+    print(f"hashing, {len(thumbnails)} thumbnails: {single:.0f} us each one at a time, "
+          f"{batch:.0f} us each in one batch")
+
+
+def lookups(sizes, repeats=200):
+    rng = np.random.default_rng(0)
+    print(f"\n{'images':>8} | {'index KB':>8} | {'lookup us':>9}")
+    print("-" * 32)
+    for size in sizes:
+        hashes = rng.integers(0, 2 ** 63, size=(size, 3), dtype=np.uint64)
+        index = HashIndex(size)
+        index.extend(list(range(size)), hashes)
+        queries = rng.integers(0, 2 ** 63, size=(repeats, 3), dtype=np.uint64)
+        start = time.perf_counter()
+        for query in queries:
+            index.similar(query)
+        lookup = (time.perf_counter() - start) / repeats * 1e6
+        print(f"{size:>8} | {index.nbytes / 1024:>8.0f} | {lookup:>9.0f}")
+
+
+def accuracy(scenes):
+    originals = [make_thumbnail(scene(seed)) for seed in range(scenes)]
+    index = HashIndex(scenes)
+    index.extend(list(range(scenes)), hash_thumbnails(originals))
+
+    false_positives = sum(len(index.similar(values, exclude=key)) for key, values in
+                          enumerate(hash_thumbnails(originals)))
+    pairs = scenes * (scenes - 1)
+    print(f"\naccuracy over {scenes} scenes, thresholds (ahash, dhash, phash) = {THRESHOLDS}")
+    print(f"false positives: {false_positives // 2} of {pairs // 2} pairs of different scenes")
+    print(f"{'variant':<10} | {'found':>9} | {'mean distance':>13}")
+    print("-" * 38)
+    for name, edit in VARIANTS.items():
+        found, distances = 0, []
+        for seed in range(scenes):
+            matches = dict(index.similar(image_hashes(make_thumbnail(edit(scene(seed))))))
+            if seed in matches:
+                found += 1
+                distances.append(matches[seed])
+        mean = sum(distances) / len(distances) if distances else float("nan")
+        print(f"{name:<10} | {found:>4}/{scenes:<4} | {mean:>13.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark perceptual hashing and near-duplicate lookups.")
+    parser.add_argument("--scenes", type=int, default=200, help="synthetic scenes for the accuracy check")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="index sizes to time")
+    args = parser.parse_args(argv)
+
+    hashing([make_thumbnail(scene(seed)) for seed in range(min(args.scenes, 100))])
+    lookups(args.sizes)
+    accuracy(args.scenes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Prompt enhancement: original substring scans vs the precompiled, memoized pipeline.
+
+Also counts the corpus prompts whose output changes because a false
+positive ("heart" matching "ear", "warm" matching "arm") is no longer
+detected. Output parity for genuine matches is covered by tests/test_prompts.py.
+
+Run from the project root:
+
+    python -m benchmarks.bench_prompts
+"""
+import random
+import time
+
+from imagegen.prompts import (DETAIL_SUFFIX, HUMAN_ANATOMY_SUFFIX, HUMAN_BODY_KEYWORDS, QUALITY_SUFFIX,
+                              REALISM_SUFFIX, STYLE_PRESETS, build_prompt)
+
+CORPUS_SIZE = 20000
+VOCABULARY = (
+    "a serene landscape mountains sunset lake forest city street night neon dragon castle robot "
+    "heart warm earth legend charm handle shear farm spear alarm pearl year beard learn harmony "
+    "hand face eyes portrait woman man child people skin fingers feet body person human "
+    "children fingertips eyelashes fisherman barefoot "
+    "detailed intricate Detailed vivid dramatic lighting golden hour misty river ocean waves"
+).split()
+
+
+def legacy_build_prompt(base_prompt, style, ultra_realism=False, add_details=True, add_quality=True):
+    """The original enhance_prompt plus the caller's quality-keyword logic."""
+    contains_human = any(keyword in base_prompt.lower() for keyword in list(HUMAN_BODY_KEYWORDS))
+    if ultra_realism:
+        anatomy = HUMAN_ANATOMY_SUFFIX if contains_human else ""
+        return f"{base_prompt}{REALISM_SUFFIX}{anatomy}"
+    enhanced = base_prompt + STYLE_PRESETS.get(style, "")
+    if add_details and "detailed" not in enhanced.lower():
+        enhanced += DETAIL_SUFFIX
+    if add_quality:
+        enhanced += QUALITY_SUFFIX
+    return enhanced
+
+
+def make_corpus(size, seed=0):
+    rng = random.Random(seed)
+    styles = list(STYLE_PRESETS)
+    return [
+        (" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(3, 14))),
+         rng.choice(styles), rng.random() < 0.3, rng.random() < 0.8, rng.random() < 0.8)
+        for _ in range(size)
+    ]
+
+
+def timed(fn, corpus):
+    start = time.perf_counter()
+    for args in corpus:
+        fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    corpus = make_corpus(CORPUS_SIZE)
+
+    outputs = [(legacy_build_prompt(*args), build_prompt(*args)) for args in corpus]
+    identical = sum(legacy == new for legacy, new in outputs)
+    # Only realism prompts are affected, and only by the anatomy block
+    removed = sum(legacy == new + HUMAN_ANATOMY_SUFFIX for legacy, new in outputs)
+    print(f"{identical} prompts identical, {removed} false-positive anatomy blocks removed, "
+          f"{len(corpus) - identical - removed} other differences")
+
+    build_prompt.cache_clear()
+    uncached = build_prompt.__wrapped__
+    legacy_ms = timed(legacy_build_prompt, corpus)
+    pipeline_ms = timed(uncached, corpus)
+    timed(build_prompt, corpus)
+    # A rerun: the most recent prompts are still memoized
+    recent = corpus[-build_prompt.cache_info().maxsize:]
+    cached_ms = timed(build_prompt, recent) / len(recent) * CORPUS_SIZE
+    print(f"{CORPUS_SIZE} prompts: original {legacy_ms:.1f} ms, pipeline {pipeline_ms:.1f} ms, "
+          f"memoized {cached_ms:.1f} ms (scaled from {len(recent)} cached prompts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Cost of handling one response: decoded by InferenceClient vs kept as bytes by RawInferenceClient.
+
+"decoded" is what happens to an InferenceClient result: the response is
+decoded to a PIL image, then encoded again in the output format and
+thumbnailed. "raw" is the RawInferenceClient path: the response becomes an
+EncodedImage, passes through when it is already in the output format, and
+is only decoded for the thumbnail (at reduced scale for JPEG). Network time
+is the same for both and not included.
+
+Run from the project root:
+
+    python -m benchmarks.bench_raw_passthrough
+"""
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks.bench_output_formats import sample_image
+from imagegen.encoding import EncodedImage, OutputFormat
+from imagegen.generation import encode_result
+
+SAMPLES = 3
+# (format the server responds in, OUTPUT_FORMAT)
+CASES = [
+    ("png", "png"),
+    ("jpeg", "jpeg"),
+    ("png", "webp"),
+    ("jpeg", "png"),
+]
+
+
+def decoded_path(response, output_format):
+    image = Image.open(BytesIO(response))
+    image.load()
+    return encode_result(image, output_format=output_format)
+
+
+def raw_path(response, output_format):
+    return encode_result(EncodedImage(response), output_format=output_format)
+
+
+def mean_ms(fn, responses, output_format):
+    start = time.perf_counter()
+    for response in responses:
+        fn(response, output_format)
+    return (time.perf_counter() - start) / len(responses) * 1000
+
+
+def main():
+    for size in (512, 1024):
+        images = [sample_image(i, size) for i in range(SAMPLES)]
+        print(f"\n{size}x{size}, mean of {SAMPLES} responses")
+        print(f"{'response -> output':<18} | {'decoded ms':>10} | {'raw ms':>7} | {'saved':>6} | {'passed through':>14}")
+        print("-" * 68)
+        for response_format, output_name in CASES:
+            responses = [OutputFormat(response_format).encode(image) for image in images]
+            output_format = OutputFormat(output_name)
+            decoded_ms = mean_ms(decoded_path, responses, output_format)
+            raw_ms = mean_ms(raw_path, responses, output_format)
+            passed = raw_path(responses[0], output_format)['data'] is responses[0]
+            label = f"{response_format} -> {output_name}"
+            print(f"{label:<18} | {decoded_ms:>10.1f} | {raw_ms:>7.1f} | {1 - raw_ms / decoded_ms:>6.0%} | "
+                  f"{'yes' if passed else 'no':>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Time and peak memory of tiled high-resolution rendering.
+
+Uses the demo generator as the model, so only the tiling itself is
+measured. "upscale" is the single Lanczos resize used by that mode, for
+comparison. "naive" is what blending without the cell bookkeeping costs: one
+float32 accumulator and one weight plane the size of the whole canvas.
+Peak memory is what tracemalloc sees from numpy (PIL's own buffers are not
+counted).
+
+Run from the project root:
+
+    python -m benchmarks.bench_tiling
+"""
+import time
+import tracemalloc
+
+import numpy as np
+
+from imagegen.demo_image import generate_demo_image
+from imagegen.tiling import TilePlan, generate_tiled, upscale
+
+
+def demo_tile(params, tile):
+    return generate_demo_image(f"tile {tile.index}", "Fantasy", params["width"], params["height"])
+
+
+def naive_peak_mb(width, height):
+    return (width * height * 3 * 4 + width * height * 4 + width * height * 3) / 2 ** 20
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    image = fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return image, seconds, peak
+
+
+def main():
+    base = generate_demo_image("benchmark", "Fantasy", 1024, 1024)
+    print(f"{'canvas':>9} | {'mode':<8} | {'tiles':>5} | {'seconds':>7} | {'peak MB':>7} | {'output MB':>9} | {'naive MB':>8}")
+    print("-" * 72)
+    for size in (2048, 3072, 4096):
+        output_mb = size * size * 3 / 2 ** 20
+        count = len(TilePlan(size, size))
+        for mode in ("upscale", "generate"):
+            if mode == "upscale":
+                run, tiles = lambda: upscale(base, size, size), 1
+            else:
+                run, tiles = lambda: generate_tiled({"prompt": "benchmark"}, size, size, demo_tile), count
+            image, seconds, peak = measure(run)
+            assert image.size == (size, size) and np.asarray(image).any()
+            print(f"{size:>4}x{size:<4} | {mode:<8} | {tiles:>5} | {seconds:>7.2f} | {peak:>7.0f} | "
+                  f"{output_mb:>9.0f} | {naive_peak_mb(size, size):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
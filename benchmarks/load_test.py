@@ -0,0 +1,213 @@
+"""Load test of the full generation path against the local mock server.
+
+N simulated users each submit a series of generations the way the app
+does: a job on the shared JobExecutor that runs run_generation through the
+generation cache, the request coalescer and the RequestScheduler, into a
+real InferenceClient pointed at imagegen.mock_server, and then encodes the
+result. Prompts are drawn from a small pool of preset demos, so popular
+requests repeat like they do at peak.
+
+Run from the project root:
+
+    python -m benchmarks.load_test --users 20 --requests 5 --latency lognormal:1,0.5 --rate-429 0.05
+
+Pass --endpoint to drive an already running mock server (or any other
+endpoint) instead of starting one in-process.
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from huggingface_hub import InferenceClient
+
+from imagegen.generation import EndpointClient, RawInferenceClient, build_request, encode_result, run_generation
+from imagegen.generation_cache import GenerationCache
+from imagegen.jobs import DONE, JobExecutor
+from imagegen.metrics import metrics
+from imagegen.models import AUTO_MODEL, resolve_models
+from imagegen.mock_server import MockInferenceServer
+from imagegen.prompts import STYLE_PRESETS
+from imagegen.router import ModelRouter
+from imagegen.scheduler import RequestScheduler
+from imagegen.singleflight import SingleFlight
+
+DEMO_PROMPTS = (
+    "a cat astronaut floating above the earth",
+    "a cozy cabin in a snowy forest at night",
+    "a futuristic city skyline at sunset",
+    "a dragon made of autumn leaves",
+    "a lighthouse on a cliff during a storm",
+    "a bowl of ramen in a neon-lit alley",
+    "a portrait of a robot painter in its studio",
+    "an underwater temple covered in coral",
+)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_load(endpoint, users=10, requests_per_user=5, distinct=8, size=512, think=0.0,
+             rate_limit=600.0, burst=10, workers=4, max_retries=4, use_cache=True, coalesce=True, seed=0,
+             models=None, raw=False):
+    """Drive the generation path with `users` concurrent simulated users. Returns a results dict."""
+    if raw:
+        client = RawInferenceClient("load-test", endpoint, timeout=60, pool_size=workers)
+    else:
+        client = EndpointClient(InferenceClient(token="load-test", timeout=60), endpoint)
+    scheduler = RequestScheduler(client, token="load-test", requests_per_minute=rate_limit,
+                                 burst=burst, max_retries=max_retries)
+    text_to_image = scheduler.text_to_image
+    router = None
+    if models:
+        router = ModelRouter(scheduler.text_to_image, resolve_models(models), failover_retries=1)
+        text_to_image = router.text_to_image
+    cache = GenerationCache(tempfile.mkdtemp(prefix="load-test-cache-")) if use_cache else None
+    coalescer = SingleFlight() if coalesce else None
+    executor = JobExecutor(max_workers=workers)
+
+    styles = list(STYLE_PRESETS)
+    pool = [
+        build_request(DEMO_PROMPTS[i % len(DEMO_PROMPTS)], style=styles[i % len(styles)],
+                      width=size, height=size, **({'model': AUTO_MODEL} if router else {}))['generation_params']
+        for i in range(distinct)
+    ]
+
+    def generate(generation_params, session_id):
+        image, from_cache = run_generation(generation_params, text_to_image, cache=cache,
+                                           coalescer=coalescer, session_id=session_id)
+        return encode_result(image, from_cache)
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        session_id = f"user-{index}"
+        for _ in range(requests_per_user):
+            job_id = executor.submit(generate, rng.choice(pool), session_id)
+            job = executor.wait(job_id)
+            with lock:
+                if job.status == DONE:
+                    latencies.append(job.elapsed)
+                else:
+                    errors.append(str(job.error))
+            executor.forget(job_id)
+            if think:
+                time.sleep(rng.uniform(0, 2 * think))
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    executor.shutdown()
+
+    latencies.sort()
+    total = len(latencies) + len(errors)
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "error_rate": len(errors) / total if total else 0.0,
+        "wall": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+        "cache_hit_rate": cache.hit_rate if cache is not None else 0.0,
+        "coalesced": coalescer.stats["coalesced"] if coalescer is not None else 0,
+        "retries": scheduler.stats["retries"],
+        "average_wait": scheduler.average_wait,
+        "sample_errors": sorted(set(errors))[:3],
+        "models": router.health() if router else [],
+        "failovers": router.stats["failovers"] if router else 0,
+    }
+
+
+def report(results, server_stats=None):
+    print(f"requests      {results['requests']} ({results['ok']} ok, {results['errors']} failed, "
+          f"{results['error_rate']:.1%} error rate)")
+    print(f"wall time     {results['wall']:.2f}s, throughput {results['throughput']:.2f} images/s")
+    print(f"latency       p50 {results['p50']:.2f}s · p95 {results['p95']:.2f}s · "
+          f"p99 {results['p99']:.2f}s · max {results['max']:.2f}s")
+    print(f"cache         {results['cache_hit_rate']:.0%} hit rate, {results['coalesced']} calls coalesced")
+    print(f"scheduler     {results['retries']} retries, avg wait {results['average_wait']:.2f}s")
+    if server_stats is not None:
+        print(f"upstream      {server_stats['requests']} calls ({server_stats['ok']} ok, "
+              f"{server_stats['429']}x 429, {server_stats['503']}x 503, "
+              f"max {server_stats['max_in_flight']} in flight)")
+    for model_health in results['models']:
+        latency = f"{model_health['latency']:.2f}s" if model_health['latency'] is not None else "-"
+        print(f"model         {model_health['label']}: {model_health['requests']} requests, {latency} avg, "
+              f"{model_health['error_rate']:.0%} errors{'' if model_health['healthy'] else ', cooling down'}")
+    if results['models']:
+        print(f"router        {results['failovers']} failovers")
+    stage_means = metrics.stage_means()
+    if stage_means:
+        print("stages        " + " · ".join(
+            f"{stage} {mean * 1000:.1f}ms" for stage, (count, mean) in sorted(stage_means.items())
+        ))
+    for error in results['sample_errors']:
+        print(f"  error: {error[:120]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the generation path offline.")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=5, help="generations per user")
+    parser.add_argument("--distinct", type=int, default=8, help="size of the shared prompt pool")
+    parser.add_argument("--size", type=int, default=512, help="image width and height")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between a user's requests (s)")
+    parser.add_argument("--workers", type=int, default=4, help="JobExecutor threads (GENERATION_WORKERS)")
+    parser.add_argument("--rate-limit", type=float, default=600.0, help="client-side requests per minute")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--no-coalesce", action="store_true")
+    parser.add_argument("--endpoint", help="use this server instead of starting a mock one")
+    parser.add_argument("--latency", default="lognormal:1,0.5", help="mock server latency distribution")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-503", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--capacity", type=int, default=None, help="mock server concurrency before 503s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", help="comma-separated models to route between (default: no routing)")
+    parser.add_argument("--down", action="append", default=[], metavar="MODEL",
+                        help="mock server answers every request for MODEL with 503")
+    parser.add_argument("--raw", action="store_true",
+                        help="use RawInferenceClient (pooled HTTP, responses kept as bytes) instead of InferenceClient")
+    parser.add_argument("--no-metrics", action="store_true", help="skip the per-stage timing breakdown")
+    args = parser.parse_args(argv)
+    metrics.enabled = not args.no_metrics
+
+    options = dict(users=args.users, requests_per_user=args.requests, distinct=args.distinct, size=args.size,
+                   think=args.think, rate_limit=args.rate_limit, burst=args.burst, workers=args.workers,
+                   max_retries=args.retries, use_cache=not args.no_cache, coalesce=not args.no_coalesce,
+                   seed=args.seed, models=args.models, raw=args.raw)
+    print(f"{args.users} users x {args.requests} requests, {args.distinct} distinct prompts, "
+          f"{args.workers} workers, {args.rate_limit:g} req/min")
+
+    if args.endpoint:
+        report(run_load(args.endpoint, **options))
+        return
+
+    with MockInferenceServer(latency=args.latency, rate_429=args.rate_429, rate_503=args.rate_503,
+                             retry_after=args.retry_after, capacity=args.capacity, seed=args.seed,
+                             down_models=args.down) as server:
+        print(f"mock server   {args.latency}, {args.rate_429:.0%} 429s, {args.rate_503:.0%} 503s")
+        results = run_load(server.url, **options)
+        report(results, server.snapshot())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Helpers for the AI Image Generator app that outlive a single Streamlit rerun."""
@@ -0,0 +1,189 @@
+"""Admission control: cost classes, priority lanes and load shedding.
+
+Requests differ a lot in what they cost upstream. A realism-mode request
+(1024x1024, 16 steps) is sixteen times the work of a 512x512, 4-step one,
+and when quota is tight a few of them would hold every slot while quick
+requests queue up behind them. AdmissionController sits in front of the
+upstream call and lets at most `max_in_flight` requests through at a time:
+
+- Each request gets a cost class from width x height x steps. Light
+  requests are admitted before heavy ones, and heavy ones may use at most
+  `heavy_slots` of the slots, so some are always left for light requests.
+  A heavy request that has waited `heavy_boost_seconds` queues by arrival
+  time, so a steady stream of light requests can't starve it.
+- One session has at most `per_session` requests in flight. Its other
+  requests wait without holding up other sessions' requests in the lane.
+- A lane with `max_queue` requests already waiting turns new ones away
+  straight away (Overloaded) instead of letting the wait grow without bound.
+
+Waiting requests carry an optional tag (the app uses one per job), so the
+page can show "queued, position N" while a job waits.
+"""
+import threading
+import time
+from collections import deque
+
+from imagegen.jobs import Cancelled
+from imagegen.metrics import metrics
+
+LIGHT = "light"
+HEAVY = "heavy"
+# One cost unit: a 512x512 image at 4 steps
+BASE_COST = 512 * 512 * 4
+# Requests costing this many units or more are heavy (realism mode, 1024x1024 at 16 steps, is 16)
+HEAVY_COST = 6.0
+# How often a cancellable waiting request checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.25
+
+
+class Overloaded(RuntimeError):
+    """Raised when a request is shed because its lane's queue is full."""
+
+
+def request_cost(generation_params):
+    """Upstream cost of a request in units of a 512x512, 4-step image."""
+    return (generation_params.get("width", 1024) * generation_params.get("height", 1024)
+            * generation_params.get("num_inference_steps", 4)) / BASE_COST
+
+
+def cost_class(generation_params, heavy_cost=HEAVY_COST):
+    return HEAVY if request_cost(generation_params) >= heavy_cost else LIGHT
+
+
+class _Ticket:
+    __slots__ = ("session_id", "tag", "lane", "enqueued")
+
+    def __init__(self, session_id, tag, lane):
+        self.session_id = session_id
+        self.tag = tag
+        self.lane = lane
+        self.enqueued = time.monotonic()
+
+
+class AdmissionController:
+    """Priority-lane admission in front of `text_to_image(**params)`."""
+
+    def __init__(self, text_to_image, max_in_flight=4, heavy_slots=2, per_session=2, max_queue=20,
+                 heavy_cost=HEAVY_COST, heavy_boost_seconds=30.0):
+        if not 0 < heavy_slots <= max_in_flight:
+            raise ValueError("heavy_slots must be between 1 and max_in_flight")
+        self._text_to_image = text_to_image
+        self.max_in_flight = max_in_flight
+        self.heavy_slots = heavy_slots
+        self.per_session = per_session
+        self.max_queue = max_queue
+        self.heavy_cost = heavy_cost
+        self.heavy_boost_seconds = heavy_boost_seconds
+        self._queues = {LIGHT: deque(), HEAVY: deque()}
+        self._in_flight = {LIGHT: 0, HEAVY: 0}
+        self._sessions = {}  # session_id -> requests in flight
+        self._cond = threading.Condition()
+        self.stats = {
+            lane: {"admitted": 0, "shed": 0, "cancelled": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for lane in (LIGHT, HEAVY)
+        }
+
+    def _priority(self, ticket, now):
+        """Sort key of a waiting ticket: light first, then heavy, by arrival; aged heavy ones by arrival only."""
+        boosted = ticket.lane == LIGHT or now - ticket.enqueued >= self.heavy_boost_seconds
+        return (0 if boosted else 1), ticket.enqueued
+
+    def _order(self):
+        now = time.monotonic()
+        return sorted((t for queue in self._queues.values() for t in queue), key=lambda t: self._priority(t, now))
+
+    def _next(self):
+        """The waiting ticket to admit now, or None when no slot is free for any of them."""
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return None
+        for ticket in self._order():
+            if ticket.lane == HEAVY and self._in_flight[HEAVY] >= self.heavy_slots:
+                continue
+            if self._sessions.get(ticket.session_id, 0) >= self.per_session:
+                continue
+            return ticket
+        return None
+
+    def _dequeue(self, ticket):
+        self._queues[ticket.lane].remove(ticket)
+        self._cond.notify_all()
+
+    def acquire(self, generation_params, session_id=None, tag=None, cancel=None):
+        """Wait for a slot for this request. Returns its lane; pass that to release().
+
+        Raises Overloaded when the lane's queue is full, and Cancelled (giving
+        up its place) once `cancel` is set.
+        """
+        lane = cost_class(generation_params, self.heavy_cost)
+        with self._cond:
+            if len(self._queues[lane]) >= self.max_queue:
+                self.stats[lane]["shed"] += 1
+                metrics.incr("requests_shed_total", cost_class=lane)
+                raise Overloaded(
+                    f"Server busy: {len(self._queues[lane])} {lane} requests are already waiting. "
+                    f"Please try again in a moment."
+                )
+            ticket = _Ticket(session_id, tag, lane)
+            self._queues[lane].append(ticket)
+            # Also wake up now and then so aged heavy requests get re-ranked
+            poll = self.heavy_boost_seconds if cancel is None else min(CANCEL_POLL_SECONDS, self.heavy_boost_seconds)
+            while True:
+                if cancel is not None and cancel.is_set():
+                    self._dequeue(ticket)
+                    self.stats[lane]["cancelled"] += 1
+                    raise Cancelled()
+                if self._next() is ticket:
+                    break
+                self._cond.wait(timeout=poll)
+
+            self._dequeue(ticket)
+            self._in_flight[lane] += 1
+            self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+            waited = time.monotonic() - ticket.enqueued
+            stats = self.stats[lane]
+            stats["admitted"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+        metrics.observe("admission_wait_seconds", waited, cost_class=lane)
+        return lane
+
+    def release(self, lane, session_id=None):
+        with self._cond:
+            self._in_flight[lane] -= 1
+            self._sessions[session_id] -= 1
+            if not self._sessions[session_id]:
+                del self._sessions[session_id]
+            self._cond.notify_all()
+
+    def text_to_image(self, session_id=None, cancel=None, tag=None, **params):
+        """`text_to_image(**params)` once admitted. `tag` names the request for position()."""
+        lane = self.acquire(params, session_id, tag, cancel)
+        call_kwargs = {} if cancel is None else {"cancel": cancel}
+        try:
+            return self._text_to_image(session_id=session_id, **call_kwargs, **params)
+        finally:
+            self.release(lane, session_id)
+
+    def position(self, tag):
+        """1-based place in the admission order of the first waiting request tagged `tag`, or None."""
+        with self._cond:
+            for position, ticket in enumerate(self._order(), 1):
+                if ticket.tag == tag:
+                    return position
+        return None
+
+    def queue_depth(self, lane=None):
+        with self._cond:
+            if lane is not None:
+                return len(self._queues[lane])
+            return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return sum(self._in_flight.values())
+
+    def average_wait(self, lane):
+        with self._cond:
+            stats = self.stats[lane]
+            return stats["total_wait"] / stats["admitted"] if stats["admitted"] else 0.0
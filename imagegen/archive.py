@@ -0,0 +1,270 @@
+"""Persistent generation history shared across sessions and restarts.
+
+Metadata lives in SQLite with indexes on timestamp, style and realism mode,
+plus an FTS5 index over the prompts (falling back to LIKE when SQLite was
+built without FTS5). Image bytes live in a content-addressed directory, so
+listing a page of results never touches more than that page's thumbnails.
+
+Each row also keeps the perceptual hashes of its thumbnail. They are loaded
+into a HashIndex on first use, which answers "have we made something like
+this before?" without touching a single image.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from imagegen.encoding import FORMATS
+from imagegen.image_store import content_key
+
+# Full-size files are named by the format they were encoded in; PNG first since most are
+IMAGE_EXTENSIONS = [extension for _, extension, _ in FORMATS.values()]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    prompt TEXT NOT NULL,
+    enhanced_prompt TEXT NOT NULL,
+    style TEXT NOT NULL,
+    realism_mode INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    image_key TEXT NOT NULL,
+    thumb_key TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    seconds REAL,
+    ahash INTEGER,
+    dhash INTEGER,
+    phash INTEGER,
+    tiled TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_generations_created ON generations (created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_style ON generations (style, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_realism ON generations (realism_mode, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_prompt ON generations (prompt);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5 (
+    prompt, content='generations', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS generations_fts_insert AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, prompt) VALUES (new.id, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_fts_delete AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+END;
+"""
+
+HASH_COLUMNS = ("ahash", "dhash", "phash")
+# Added after the first release; older databases get them on open
+ADDED_COLUMNS = {"ahash": "INTEGER", "dhash": "INTEGER", "phash": "INTEGER", "tiled": "TEXT"}
+COLUMNS = ("id", "created_at", "prompt", "enhanced_prompt", "style", "realism_mode",
+           "params", "image_key", "thumb_key", "width", "height", "seconds", "tiled")
+
+
+def _signed(value):
+    """Hashes are unsigned 64-bit; SQLite INTEGERs are signed."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    words = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class GenerationArchive:
+    """SQLite index plus content-addressed image directory."""
+
+    def __init__(self, db_path, image_dir):
+        self.image_dir = image_dir
+        os.makedirs(image_dir, exist_ok=True)
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._hash_index = None
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(generations)")}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE generations ADD COLUMN {column} {column_type}")
+            try:
+                self._conn.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                self.has_fts = False
+
+    # Image files
+
+    def _image_path(self, key, ext):
+        return os.path.join(self.image_dir, key[:2], f"{key}.{ext}")
+
+    def _write_blob(self, data, ext):
+        key = content_key(data)
+        path = self._image_path(key, ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return key
+
+    def read_image(self, key):
+        """Full-size image bytes (whatever format they were stored in), or None if the file is gone."""
+        for ext in IMAGE_EXTENSIONS:
+            data = self._read(self._image_path(key, ext))
+            if data is not None:
+                return data
+        return None
+
+    def read_thumbnail(self, key):
+        """Thumbnail JPEG bytes, or None if the file is gone."""
+        return self._read(self._image_path(key, "jpg"))
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    # Records
+
+    def record(self, entry, data, thumbnail, extension="png"):
+        """Store one generation. `entry` is a history entry with 'generation_params'
+        and, optionally, its 'tiled' output settings and the thumbnail's perceptual 'hashes'."""
+        image_key = self._write_blob(data, extension)
+        thumb_key = self._write_blob(thumbnail, "jpg")
+        width, height = entry.get('size') or (None, None)
+        created_at = entry['timestamp'].timestamp() if entry.get('timestamp') else time.time()
+        hashes = entry.get('hashes')
+        stored_hashes = [_signed(value) for value in hashes] if hashes else [None] * len(HASH_COLUMNS)
+        tiled = json.dumps(entry['tiled']) if entry.get('tiled') else None
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO generations (created_at, prompt, enhanced_prompt, style, realism_mode,"
+                " params, image_key, thumb_key, width, height, seconds, ahash, dhash, phash, tiled)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (created_at, entry['prompt'], entry['enhanced_prompt'], entry['style'],
+                 int(bool(entry['realism_mode'])), json.dumps(entry['generation_params']),
+                 image_key, thumb_key, width, height, entry.get('seconds'), *stored_hashes, tiled)
+            )
+            if hashes and self._hash_index is not None:
+                self._hash_index.add(cursor.lastrowid, hashes)
+        return cursor.lastrowid
+
+    # Near-duplicates
+
+    def hash_index(self):
+        """HashIndex of every generation with hashes, keyed by id. Loaded from the database on first use."""
+        from imagegen.perceptual_hash import HashIndex
+
+        with self._lock:
+            if self._hash_index is None:
+                rows = self._conn.execute(
+                    "SELECT id, ahash, dhash, phash FROM generations WHERE phash IS NOT NULL ORDER BY id"
+                ).fetchall()
+                self._hash_index = HashIndex(max(1024, 2 * len(rows)))
+                self._hash_index.extend([row[0] for row in rows],
+                                        [[_unsigned(value) for value in row[1:]] for row in rows])
+            return self._hash_index
+
+    def similar(self, hashes, limit=None, exclude=None):
+        """[(id, distance)] of stored generations that look almost the same as `hashes`, closest first."""
+        return self.hash_index().similar(hashes, limit=limit, exclude=exclude)
+
+    def backfill_hashes(self, batch_size=256):
+        """Hash the thumbnails of generations stored before hashes were. Returns how many were hashed."""
+        from imagegen.perceptual_hash import hash_thumbnails
+
+        hashed, last_id = 0, 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, thumb_key FROM generations WHERE phash IS NULL AND id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return hashed
+            last_id = rows[-1][0]
+            # Rows whose thumbnail is gone stay without hashes
+            found = [(row[0], values) for row, values in
+                     zip(rows, hash_thumbnails([self.read_thumbnail(row[1]) for row in rows])) if values]
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "UPDATE generations SET ahash = ?, dhash = ?, phash = ? WHERE id = ?",
+                    [[_signed(value) for value in values] + [key] for key, values in found]
+                )
+                if self._hash_index is not None and found:
+                    self._hash_index.extend([key for key, _ in found], [values for _, values in found])
+            hashed += len(found)
+
+    def _where(self, style, realism_mode, search):
+        clauses, args = [], []
+        if style is not None:
+            clauses.append("g.style = ?")
+            args.append(style)
+        if realism_mode is not None:
+            clauses.append("g.realism_mode = ?")
+            args.append(int(bool(realism_mode)))
+        if search and search.strip():
+            if self.has_fts:
+                clauses.append("g.id IN (SELECT rowid FROM generations_fts WHERE generations_fts MATCH ?)")
+                args.append(_fts_query(search))
+            else:
+                clauses.append("g.prompt LIKE ?")
+                args.append(f"%{search.strip()}%")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, args
+
+    def query(self, page=0, page_size=12, style=None, realism_mode=None, search=None):
+        """Return (rows, total) for one page of results, newest first.
+
+        Rows are dicts; 'params' is decoded back into the generation_params dict.
+        """
+        where, args = self._where(style, realism_mode, search)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM generations g{where}", args).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join('g.' + c for c in COLUMNS)} FROM generations g{where}"
+                " ORDER BY g.created_at DESC, g.id DESC LIMIT ? OFFSET ?",
+                args + [page_size, page * page_size]
+            ).fetchall()
+        return [self._row_dict(row) for row in rows], total
+
+    def get(self, generation_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM generations WHERE id = ?", (generation_id,)
+            ).fetchone()
+        return self._row_dict(row) if row else None
+
+    def styles(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT style FROM generations ORDER BY style")]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    @staticmethod
+    def _row_dict(row):
+        data = dict(row)
+        data['params'] = json.loads(data['params'])
+        data['realism_mode'] = bool(data['realism_mode'])
+        data['tiled'] = json.loads(data['tiled']) if data['tiled'] else None
+        return data
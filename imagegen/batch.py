@@ -0,0 +1,97 @@
+"""Concurrent fan-out of several generation requests.
+
+A Batch runs its items on its own small thread pool (so one batch can't
+monopolise the shared job executor) and records each result as soon as it
+arrives. The UI polls `batch.items` on every rerun to stream images into a
+grid; scripts and benchmarks can iterate `batch.run_iter()` instead.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class BatchItem:
+    """One request in a batch. `kwargs` are passed to the generate function."""
+
+    def __init__(self, index, label, kwargs):
+        self.index = index
+        self.label = label
+        self.kwargs = kwargs
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.seconds = None
+
+    @property
+    def finished(self):
+        return self.status != PENDING
+
+
+class Batch:
+    """A group of generation requests run with at most `max_parallel` in flight."""
+
+    def __init__(self, items, max_parallel=3):
+        self.items = list(items)
+        self.max_parallel = max(1, max_parallel)
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_kwargs(cls, kwargs_list, labels=None, max_parallel=3):
+        labels = labels or [f"#{i + 1}" for i in range(len(kwargs_list))]
+        return cls(
+            [BatchItem(i, label, kwargs) for i, (label, kwargs) in enumerate(zip(labels, kwargs_list))],
+            max_parallel=max_parallel
+        )
+
+    def _run_item(self, generate_fn, item):
+        start = time.perf_counter()
+        try:
+            result = generate_fn(**item.kwargs)
+        except Exception as e:
+            with self._lock:
+                item.error = e
+                item.seconds = time.perf_counter() - start
+                item.status = FAILED
+        else:
+            with self._lock:
+                item.result = result
+                item.seconds = time.perf_counter() - start
+                item.status = DONE
+        return item
+
+    def run_iter(self, generate_fn):
+        """Run every item and yield each BatchItem as soon as it finishes."""
+        self.started_at = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="imagegen-batch") as pool:
+                futures = [pool.submit(self._run_item, generate_fn, item) for item in self.items]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            self.finished_at = time.time()
+
+    def run(self, generate_fn):
+        """Run every item to completion and return the batch."""
+        for _ in self.run_iter(generate_fn):
+            pass
+        return self
+
+    @property
+    def completed(self):
+        return [item for item in self.items if item.finished]
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
@@ -0,0 +1,271 @@
+"""Headless batch generation from a JSONL or CSV file of prompts.
+
+    python -m imagegen.cli prompts.jsonl --out outputs --concurrency 4
+
+Each input row needs a "prompt"; optional columns are id, style,
+realism_mode, negative_prompt, width, height, guidance_scale,
+num_inference_steps, seed, add_details and add_quality. Images are written
+to the output directory as they finish (PNG unless --format says otherwise), together with a manifest.jsonl
+line per request. Re-running the same command skips every request already
+recorded as done in the manifest, so interrupted jobs can simply be resumed.
+Set DEMO_MODE=true (or pass --demo) to run offline with placeholder images.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from imagegen.batch import DONE, Batch
+from imagegen.encoding import FORMATS, OutputFormat
+from imagegen.generation import (
+    HF_INFERENCE_URL, MODEL_NAME, EndpointClient, RawInferenceClient, build_request, raw_client_enabled, run_generation
+)
+from imagegen.generation_cache import canonical_key
+from imagegen.metrics import metrics
+from imagegen.models import AUTO_MODEL, DEFAULT_MODELS, resolve_models
+from imagegen.prompts import STYLE_PRESETS
+from imagegen.singleflight import SingleFlight
+
+MANIFEST_NAME = "manifest.jsonl"
+
+INT_FIELDS = ("width", "height", "num_inference_steps", "seed")
+FLOAT_FIELDS = ("guidance_scale",)
+BOOL_FIELDS = ("realism_mode", "add_details", "add_quality")
+REQUEST_FIELDS = ("style", "realism_mode", "negative_prompt", "width", "height", "guidance_scale",
+                  "num_inference_steps", "add_details", "add_quality", "seed")
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def _numbered_rows(f, csv_file):
+    """(line number in the file, raw row) for every row, counting blank and header lines too."""
+    if csv_file:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # line_num is the physical line the row ended on (rows may span lines in quotes)
+            yield reader.line_num, row
+    else:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {line_no}: {e.msg}") from e
+            yield line_no, row
+
+
+def read_prompts(path):
+    """Yield (line number, row dict) for each row with a prompt in a .jsonl or .csv prompt file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for line_no, row in _numbered_rows(f, path.lower().endswith(".csv")):
+            row = {key: value for key, value in row.items() if value not in (None, "")}
+            if not str(row.get("prompt", "")).strip():
+                continue
+            try:
+                for field in INT_FIELDS:
+                    if field in row:
+                        row[field] = int(row[field])
+                for field in FLOAT_FIELDS:
+                    if field in row:
+                        row[field] = float(row[field])
+            except ValueError as e:
+                raise ValueError(f"line {line_no}: {e}") from e
+            for field in BOOL_FIELDS:
+                if field in row:
+                    row[field] = _parse_bool(row[field])
+            yield line_no, row
+
+
+def load_manifest(out_dir):
+    """Return the request keys already generated successfully in `out_dir`."""
+    done = set()
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["key"])
+    return done
+
+
+def plan_requests(rows, model=MODEL_NAME):
+    """Turn (line number, row) pairs from read_prompts() into job_info dicts, each tagged with a stable 'key'
+    and the source 'line'."""
+    requests = []
+    for line_no, row in rows:
+        style = row.get("style", "None")
+        if style not in STYLE_PRESETS:
+            raise ValueError(f"line {line_no}: unknown style {style!r}")
+        job_info = build_request(
+            row["prompt"],
+            model=model,
+            **{field: row[field] for field in REQUEST_FIELDS if field in row}
+        )
+        # An explicit id wins; otherwise identical parameters mean an identical request
+        job_info['key'] = str(row.get("id") or canonical_key(job_info['generation_params']))
+        job_info['line'] = line_no
+        requests.append(job_info)
+    return requests
+
+
+def _file_name(job_info, output_format):
+    safe_key = "".join(c if c.isalnum() or c in "-_" else "_" for c in job_info['key'])[:40]
+    return output_format.file_name(f"{job_info['line']:05d}-{safe_key}")
+
+
+def _generate_encoded(output_format, **kwargs):
+    # Encode on the batch worker so the loop writing files never waits on an encoder
+    image, _ = run_generation(output_format=output_format, **kwargs)
+    with metrics.span("encode", format=output_format.name):
+        return output_format.encode(image)  # Already encoded unless it is a demo placeholder
+
+
+def run(requests, out_dir, text_to_image=None, concurrency=2, demo=False, output_format=None, log=print):
+    """Generate every request not yet in the manifest. Returns (ok, failed, skipped)."""
+    output_format = output_format or OutputFormat()
+    os.makedirs(out_dir, exist_ok=True)
+    done = load_manifest(out_dir)
+    todo = [job_info for job_info in requests if job_info['key'] not in done]
+    skipped = len(requests) - len(todo)
+    if skipped:
+        log(f"Skipping {skipped} request(s) already in {MANIFEST_NAME}")
+
+    # Rows with different ids but identical parameters only call the API once
+    coalescer = SingleFlight()
+    batch = Batch.from_kwargs(
+        [{
+            'generation_params': job_info['generation_params'],
+            'text_to_image': text_to_image,
+            'coalescer': coalescer,
+            'demo': demo,
+            'demo_prompt': job_info['prompt'],
+            'demo_style': job_info['style'],
+            'output_format': output_format
+        } for job_info in todo],
+        labels=[job_info['key'] for job_info in todo],
+        max_parallel=concurrency
+    )
+
+    ok = failed = 0
+    with open(os.path.join(out_dir, MANIFEST_NAME), "a", encoding="utf-8") as manifest:
+        for item in batch.run_iter(_generate_encoded):
+            job_info = todo[item.index]
+            record = {
+                "key": job_info['key'],
+                "line": job_info['line'],
+                "prompt": job_info['prompt'],
+                "enhanced_prompt": job_info['enhanced_prompt'],
+                "style": job_info['style'],
+                "realism_mode": job_info['realism_mode'],
+                "params": job_info['generation_params'],
+                "seconds": round(item.seconds, 3),
+                "finished_at": time.time()
+            }
+            if item.status == DONE:
+                record["file"] = _file_name(job_info, output_format)
+                record["format"] = str(output_format)
+                with open(os.path.join(out_dir, record["file"]), "wb") as f:
+                    f.write(item.result)
+                record["status"] = "ok"
+                ok += 1
+            else:
+                record["status"] = "error"
+                record["error"] = str(item.error)
+                failed += 1
+
+            # Don't hold every finished image in memory for large prompt files
+            item.result = None
+            manifest.write(json.dumps(record) + "\n")
+            manifest.flush()
+            log(f"[{ok + failed}/{len(todo)}] {record['status']}: {job_info['prompt'][:60]}")
+
+    return ok, failed, skipped
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Generate images in bulk without the web UI.")
+    parser.add_argument("prompts", help="JSONL or CSV file with one prompt per row")
+    parser.add_argument("--out", default="outputs", help="directory for images and manifest.jsonl")
+    parser.add_argument("--concurrency", type=int, default=2, help="requests in flight at once")
+    parser.add_argument("--model", default=MODEL_NAME,
+                        help=f"model to use, or '{AUTO_MODEL}' to route between the MODELS in .env with failover")
+    parser.add_argument("--demo", action="store_true", default=os.getenv("DEMO_MODE", "false").lower() == "true",
+                        help="draw placeholder images instead of calling the API")
+    parser.add_argument("--rate-limit", type=float, default=float(os.getenv("RATE_LIMIT_PER_MINUTE", "30")),
+                        help="maximum requests per minute")
+    parser.add_argument("--format", default=os.getenv("OUTPUT_FORMAT", "png"), choices=list(FORMATS) + ["jpg"],
+                        help="image format to write")
+    parser.add_argument("--quality", type=int, default=int(os.getenv("OUTPUT_QUALITY", "90")),
+                        help="WebP/AVIF/JPEG quality, 1-100 (100 makes WebP lossless)")
+    parser.add_argument("--compression", type=int, default=int(os.getenv("OUTPUT_COMPRESSION", "6")),
+                        help="0-9: higher is smaller but slower to encode")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="append a JSON snapshot of per-stage timings and counters to PATH when done")
+    args = parser.parse_args(argv)
+    metrics.enabled = bool(args.metrics)
+    output_format = OutputFormat(args.format, quality=args.quality, compression=args.compression)
+    if not output_format.supported:
+        parser.error(f"this Pillow build cannot write {output_format.name}")
+
+    try:
+        requests = plan_requests(read_prompts(args.prompts), model=args.model)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    text_to_image = None
+    if not args.demo:
+        token = os.getenv("HUGGINGFACE_TOKEN")
+        if not token or token == "your_token_here":
+            parser.error("HUGGINGFACE_TOKEN is not configured (or pass --demo)")
+        from imagegen.scheduler import RequestScheduler
+
+        endpoint = os.getenv("INFERENCE_ENDPOINT", "")
+        if raw_client_enabled(os.getenv("RAW_CLIENT", "auto"), endpoint):
+            client = RawInferenceClient(token, endpoint or HF_INFERENCE_URL, accept=output_format.mime,
+                                        pool_size=max(1, args.concurrency))
+        else:
+            from huggingface_hub import InferenceClient
+
+            client = InferenceClient(token=token)
+            if endpoint:
+                client = EndpointClient(client, endpoint)
+        scheduler = RequestScheduler(
+            client,
+            token=token,
+            requests_per_minute=args.rate_limit,
+            burst=max(1, args.concurrency),
+            max_retries=int(os.getenv("MAX_RETRIES", "4"))
+        )
+        text_to_image = scheduler.text_to_image
+        if args.model == AUTO_MODEL:
+            from imagegen.router import ModelRouter
+
+            router = ModelRouter(scheduler.text_to_image, resolve_models(os.getenv("MODELS", DEFAULT_MODELS)),
+                                 failover_retries=1)
+            text_to_image = router.text_to_image
+
+    ok, failed, skipped = run(requests, args.out, text_to_image, concurrency=args.concurrency, demo=args.demo,
+                              output_format=output_format)
+    if args.metrics:
+        metrics.write_json(args.metrics)
+    print(f"Done: {ok} generated, {failed} failed, {skipped} skipped. Output in {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Output formats for generated images.
+
+An OutputFormat says how a full-size image is encoded for storage and
+download: PNG (lossless), WebP, AVIF or JPEG, at a quality (lossy formats)
+and a compression level that trades encode time for size. The level uses
+PNG's 0-9 scale everywhere and is mapped onto each encoder's own knob.
+
+An EncodedImage is an image still in the bytes it arrived in. Encoding one
+in its own format hands those bytes back untouched, so a server response
+already in the output format is stored and served without being decoded.
+"""
+import copy
+from io import BytesIO
+
+from imagegen.metrics import metrics
+
+# name -> (PIL format, file extension, MIME type)
+FORMATS = {
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "avif": ("AVIF", "avif", "image/avif"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+ALIASES = {"jpg": "jpeg"}
+# PIL format -> name
+PIL_NAMES = {pil_format: name for name, (pil_format, _, _) in FORMATS.items()}
+DEFAULT_QUALITY = 90
+DEFAULT_COMPRESSION = 6
+
+
+def available_formats():
+    """Format names the installed Pillow can write (AVIF needs Pillow 11.2+ built with libavif)."""
+    from PIL import features
+
+    names = []
+    for name in FORMATS:
+        if name in ("webp", "avif") and not features.check(name):
+            continue
+        names.append(name)
+    return names
+
+
+class EncodedImage:
+    """An image kept as its encoded bytes; the pixels are decoded only when asked for.
+
+    Reading the header gives the format, size and mode without decoding
+    anything. `info` holds metadata the way a PIL image's does (e.g. the
+    'model' the router picked) and is copied onto decoded images. `image`
+    is the PIL image the bytes were just encoded from, if there is one;
+    decode() then hands it back instead of decoding.
+    """
+
+    def __init__(self, data, image=None):
+        from PIL import Image
+
+        self.data = bytes(data)
+        self._image = image
+        with Image.open(BytesIO(self.data)) as header:
+            self.format = PIL_NAMES.get(header.format)  # None for formats we don't store as is
+            self.size = header.size
+            self.mode = header.mode
+        self.info = {}
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def decode(self, reduce_to=None):
+        """The pixels as a PIL image. With `reduce_to` (width, height), JPEGs are decoded at a
+        smaller scale that still covers that size, which is much cheaper."""
+        from PIL import Image
+
+        if self._image is not None:
+            return self._image
+        with metrics.span("decode"):
+            image = Image.open(BytesIO(self.data))
+            if reduce_to is not None:
+                image.draft("RGB", reduce_to)
+            image.load()
+        image.info.update(self.info)
+        return image
+
+    def without_pixels(self):
+        """This image without the PIL image it was encoded from, for holding on to cheaply."""
+        if self._image is None:
+            return self
+        image = copy.copy(self)
+        image.info = dict(self.info)
+        image._image = None
+        return image
+
+    def __repr__(self):
+        return f"EncodedImage({self.format}, size={self.size}, {len(self.data)} bytes)"
+
+
+def decoded(image):
+    """A PIL image for pixel work, decoding an EncodedImage if that's what `image` is."""
+    return image.decode() if isinstance(image, EncodedImage) else image
+
+
+class OutputFormat:
+    """Encoder settings for one output format.
+
+    `quality` (1-100) applies to WebP, AVIF and JPEG; 100 makes WebP
+    lossless. `compression` (0-9, higher is smaller and slower) becomes
+    PNG's compress_level, WebP's method (0-6), AVIF's speed (10-4) and
+    JPEG's optimize flag.
+    """
+
+    def __init__(self, name="png", quality=DEFAULT_QUALITY, compression=DEFAULT_COMPRESSION):
+        name = ALIASES.get(name.strip().lower(), name.strip().lower())
+        if name not in FORMATS:
+            raise ValueError(f"Unknown output format {name!r}; choose from {', '.join(FORMATS)}")
+        self.name = name
+        self.quality = max(1, min(100, int(quality)))
+        self.compression = max(0, min(9, int(compression)))
+        self.pil_format, self.extension, self.mime = FORMATS[name]
+
+    @classmethod
+    def parse(cls, spec, quality=DEFAULT_QUALITY, compression=DEFAULT_COMPRESSION):
+        """Build from "name" or "name:quality" (e.g. "webp:85")."""
+        name, _, spec_quality = spec.partition(":")
+        return cls(name, int(spec_quality) if spec_quality else quality, compression)
+
+    @property
+    def supported(self):
+        return self.name in available_formats()
+
+    @property
+    def lossless(self):
+        return self.name == "png" or (self.name == "webp" and self.quality == 100)
+
+    @property
+    def display_format(self):
+        """Format to hand st.image: PNG and JPEG bytes pass through untouched, anything else is re-encoded."""
+        return "PNG" if self.name == "png" else "JPEG"
+
+    def save_options(self):
+        if self.name == "png":
+            return {"compress_level": self.compression}
+        if self.name == "webp":
+            return {"quality": self.quality, "lossless": self.quality == 100,
+                    "method": round(self.compression * 6 / 9)}
+        if self.name == "avif":
+            # Below speed 4 libavif gets ~10x slower for a few percent smaller files
+            return {"quality": self.quality, "speed": 10 - round(self.compression * 6 / 9)}
+        return {"quality": self.quality, "optimize": self.compression > 0}
+
+    def encode(self, image):
+        """Encode a PIL image or EncodedImage in this format and return the bytes.
+
+        An EncodedImage already in this format is returned as it is, without
+        decoding it; its own quality settings are kept.
+        """
+        if isinstance(image, EncodedImage):
+            if image.format == self.name:
+                return image.data
+            image = image.decode()
+        if self.name == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buf = BytesIO()
+        image.save(buf, format=self.pil_format, **self.save_options())
+        return buf.getvalue()
+
+    def encoded(self, image):
+        """`image` as an EncodedImage in this format, encoding it at most once.
+
+        The result keeps the pixels it was encoded from, so a thumbnail or
+        tiling step after this needs no decode.
+        """
+        if isinstance(image, EncodedImage):
+            if image.format == self.name:
+                return image
+            image = image.decode()
+        result = EncodedImage(self.encode(image), image)
+        result.info.update(image.info)
+        return result
+
+    def transcode(self, data):
+        """Re-encode already encoded image bytes (any format Pillow reads) in this format."""
+        from PIL import Image
+
+        with Image.open(BytesIO(data)) as image:
+            if image.format == self.pil_format:
+                return data  # Already this format; re-encoding would only lose quality
+            return self.encode(image)
+
+    def file_name(self, stem):
+        return f"{stem}.{self.extension}"
+
+    def __repr__(self):
+        return f"OutputFormat({self.name!r}, quality={self.quality}, compression={self.compression})"
+
+    def __str__(self):
+        return self.name if self.lossless else f"{self.name}:{self.quality}"
+
@@ -0,0 +1,100 @@
+"""ZIP export of generated images plus a JSON manifest.
+
+The archive is produced incrementally: each image's stored bytes go into
+the ZIP as they are (stored, not recompressed - PNG, WebP, AVIF and JPEG
+are already compressed), one entry at a time, and finished chunks are
+handed out as soon as they are written. stream_zip() itself holds one
+image plus a small buffer; how much of the ZIP ends up in memory depends
+on where the chunks go. st.download_button needs the finished ZIP as
+bytes, so in the app an export costs about its own size.
+"""
+import json
+import time
+import zipfile
+from io import BytesIO
+
+from imagegen.encoding import FORMATS
+
+MANIFEST_NAME = "manifest.json"
+
+MANIFEST_FIELDS = ("prompt", "enhanced_prompt", "style", "realism_mode", "model", "seconds", "timestamp",
+                   "size", "format", "generation_params")
+
+
+class _ChunkSink:
+    """Write-only, unseekable stream that collects ZipFile output for the caller to drain.
+
+    Without tell()/seek() ZipFile writes sizes in data descriptors after each
+    entry, so nothing already written ever needs to be revisited.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def safe_name(text, limit=40):
+    name = "".join(c if c.isalnum() or c in "-_" else "_" for c in text.strip())[:limit].strip("_")
+    return name or "image"
+
+
+def manifest_record(entry, file_name):
+    record = {field: entry[field] for field in MANIFEST_FIELDS if entry.get(field) is not None}
+    record["file"] = file_name
+    return record
+
+
+def stream_zip(entries, read_bytes, manifest_name=MANIFEST_NAME):
+    """Yield the bytes of a ZIP with one image per entry, then the manifest.
+
+    `entries` are history-style dicts (prompt, style, format, generation_params, ...);
+    `read_bytes(entry)` returns an entry's encoded image, or None if it is gone,
+    in which case the manifest lists it without a file.
+    """
+    sink = _ChunkSink()
+    records = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for index, entry in enumerate(entries, start=1):
+            data = read_bytes(entry)
+            if data is None:
+                records.append(manifest_record(entry, None))
+                continue
+            extension = FORMATS[entry.get('format') or "png"][1]
+            file_name = f"{index:04d}-{safe_name(entry.get('prompt', ''))}.{extension}"
+            info = zipfile.ZipInfo(file_name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            zf.writestr(info, data)
+            records.append(manifest_record(entry, file_name))
+            yield from sink.drain()
+
+        manifest = {"exported_at": time.time(), "count": len(records), "images": records}
+        zf.writestr(manifest_name, json.dumps(manifest, indent=2, default=str), compress_type=zipfile.ZIP_DEFLATED)
+    yield from sink.drain()
+
+
+def export_zip(entries, read_bytes):
+    """The whole ZIP as bytes, built one image at a time."""
+    out = BytesIO()
+    for chunk in stream_zip(entries, read_bytes):
+        out.write(chunk)
+    return out.getvalue()
+
+
+def deferred_zip(entries, read_bytes):
+    """A callable building the ZIP of `entries`, for st.download_button's deferred `data`.
+
+    The ZIP is only built when the button is clicked. Entries are captured
+    now, so later changes to the history don't change what is exported.
+    """
+    entries = list(entries)
+    return lambda: export_zip(entries, read_bytes)
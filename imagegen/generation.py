@@ -0,0 +1,236 @@
+"""Generation core shared by the Streamlit app and the command-line interface.
+
+Everything here is UI-free: prompt enhancement, the Ultra Realism parameter
+overrides, building `text_to_image` parameters, and running one request
+(demo placeholder, generation cache and the actual client call).
+"""
+import threading
+
+from imagegen.encoding import EncodedImage, OutputFormat
+from imagegen.generation_cache import canonical_key
+from imagegen.image_store import make_thumbnail
+from imagegen.metrics import metrics
+from imagegen.prompts import build_prompt
+
+MODEL_NAME = "stabilityai/stable-diffusion-xl-base-1.0"
+# HuggingFace's own serverless inference, behind the router
+HF_INFERENCE_URL = "https://router.huggingface.co/hf-inference"
+
+# Ultra Realism Mode ignores the advanced settings and uses these instead
+REALISM_SETTINGS = {
+    "guidance_scale": 15.0,  # Very high guidance for maximum precision
+    "width": 1024,
+    "height": 1024,
+    "num_inference_steps": 16  # Maximum steps allowed by FLUX.1-schnell model
+}
+
+
+class LazyClient:
+    """Defer building the real client (and importing its library) until the first request.
+
+    `factory()` runs once, on whichever thread makes the first call; if it
+    raises, the error goes to that caller and the next call tries again.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def text_to_image(self, *args, **kwargs):
+        return self.client.text_to_image(*args, **kwargs)
+
+
+class EndpointClient:
+    """Send an InferenceClient's text_to_image calls to a self-hosted endpoint.
+
+    `base_url` is a dedicated Inference Endpoint or the local mock server;
+    each request goes to `<base_url>/models/<model>`. The model name in
+    generation_params stays the same, so cache keys and rate-limit lanes
+    are unchanged.
+    """
+
+    def __init__(self, client, base_url):
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+
+    def text_to_image(self, prompt, model=MODEL_NAME, **params):
+        return self.client.text_to_image(prompt, model=f"{self.base_url}/models/{model}", **params)
+
+
+def raw_client_enabled(setting, endpoint=""):
+    """RAW_CLIENT: "true", "false", or "auto" (the default), which uses it for a self-hosted endpoint only."""
+    setting = (setting or "auto").strip().lower()
+    return setting == "true" or (setting == "auto" and bool(endpoint))
+
+
+class RawInferenceClient:
+    """text_to_image over one pooled, keep-alive HTTP session, returning the response undecoded.
+
+    Speaks the HF Inference protocol (a JSON POST to `<base_url>/models/<model>`,
+    image bytes back), which HuggingFace's hf-inference provider, dedicated
+    Inference Endpoints and the local mock server all accept. Results are
+    EncodedImages, so bytes already in the output format are stored and
+    served as they arrived; `accept` asks the server for that format.
+    Errors are requests.HTTPError, with the response attached for retries.
+    """
+
+    def __init__(self, token, base_url=HF_INFERENCE_URL, timeout=None, accept="image/png", pool_size=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        # One connection per concurrent request, reused across requests instead of a new TLS handshake each time
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": accept})
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def text_to_image(self, prompt, model=MODEL_NAME, **params):
+        payload = {"inputs": prompt, "parameters": {name: value for name, value in params.items() if value is not None}}
+        response = self.session.post(f"{self.base_url}/models/{model}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return EncodedImage(response.content)
+
+    def close(self):
+        self.session.close()
+
+
+def build_request(prompt, style="None", realism_mode=False, negative_prompt="",
+                  width=768, height=768, guidance_scale=7.5, num_inference_steps=4,
+                  add_details=True, add_quality=True, seed=None, model=MODEL_NAME):
+    """Apply realism overrides and prompt enhancement for one request.
+
+    Returns a job_info dict: the base and enhanced prompts, style, flags and
+    the `generation_params` to send to `text_to_image`.
+    """
+    if realism_mode:
+        # Style presets don't apply in Ultra Realism Mode
+        style = "None"
+        settings = dict(REALISM_SETTINGS)
+    else:
+        settings = {
+            "guidance_scale": guidance_scale,
+            "width": width,
+            "height": height,
+            "num_inference_steps": num_inference_steps
+        }
+
+    with metrics.span("prompt_enhancement"):
+        enhanced_prompt = build_prompt(prompt, style, realism_mode, add_details, add_quality)
+
+    # Prepare parameters for image generation
+    generation_params = {
+        "prompt": enhanced_prompt,
+        "model": model,
+        "width": settings["width"],
+        "height": settings["height"],
+        "guidance_scale": settings["guidance_scale"],
+        "num_inference_steps": settings["num_inference_steps"]
+    }
+
+    # Add negative prompt if provided
+    if negative_prompt and negative_prompt.strip():
+        generation_params["negative_prompt"] = negative_prompt
+
+    # Variants of one prompt differ only by seed (which also keeps them apart in the cache)
+    if seed is not None:
+        generation_params["seed"] = seed
+
+    return {
+        'prompt': prompt,
+        'enhanced_prompt': enhanced_prompt,
+        'style': style,
+        'realism_mode': realism_mode,
+        'add_details': add_details,
+        'add_quality': add_quality,
+        'generation_params': generation_params
+    }
+
+
+def run_generation(generation_params, text_to_image=None, cache=None, use_cache=True,
+                   demo=False, demo_prompt="", demo_style="None", coalescer=None, timeout=None,
+                   output_format=None, **call_kwargs):
+    """Produce one image for `generation_params`. Returns (image, from_cache).
+
+    In demo mode a placeholder is drawn locally. Otherwise identical requests
+    are served from `cache` when given, and misses call
+    `text_to_image(**generation_params, **call_kwargs)`. New images are
+    encoded here, once, in `output_format` (PNG by default); the cache and
+    the caller share those bytes, so encode_result() passes them through.
+    The image is an EncodedImage, or a PIL image in demo mode. With a `coalescer`
+    (a SingleFlight), identical misses already in flight share that one call,
+    waiting up to `timeout` seconds for it. Fresh samples (`use_cache=False`)
+    and cancellable calls (a `cancel` event in `call_kwargs`) are never
+    shared, so one caller's cancellation can't fail another's request.
+    """
+    if demo:
+        # Only demo runs need the placeholder renderer (and PIL's drawing modules)
+        from imagegen.demo_image import generate_demo_image
+
+        with metrics.span("demo_render"):
+            return generate_demo_image(demo_prompt, demo_style, generation_params["width"], generation_params["height"]), False
+
+    output_format = output_format or OutputFormat()
+    if cache is not None and use_cache:
+        with metrics.span("cache_lookup"):
+            image = cache.get(generation_params)
+        if image is not None:
+            return image, True
+
+    def call():
+        # The previous leader for these params may have just finished and cached its image
+        if coalescer is not None and cache is not None and use_cache:
+            image = cache.get(generation_params)
+            if image is not None:
+                return image
+        image = text_to_image(**generation_params, **call_kwargs)
+        if not isinstance(image, EncodedImage):
+            # PIL opens images lazily; decode the pixels here so the cost shows up as its own stage
+            with metrics.span("decode"):
+                image.load()
+        with metrics.span("encode", format=output_format.name):
+            image = output_format.encoded(image)
+        if cache is not None:
+            with metrics.span("cache_store"):
+                cache.put(generation_params, image)
+        return image
+
+    if coalescer is None or not use_cache or call_kwargs.get("cancel") is not None:
+        return call(), False
+    return coalescer.do(canonical_key(generation_params), call, timeout=timeout), False
+
+
+def encode_result(image, from_cache=False, output_format=None):
+    """Encode a generated image once for display, download and storage.
+
+    'data' holds the full-size image in `output_format` (PNG by default),
+    'format' that format's name. An EncodedImage already in that format is
+    passed through as is; only the thumbnail needs its pixels.
+    """
+    output_format = output_format or OutputFormat()
+    if isinstance(image, EncodedImage) and image.format != output_format.name:
+        # Needs re-encoding anyway; decode once for both the encoder and the thumbnail
+        image = image.decode()
+    with metrics.span("encode", format=output_format.name):
+        return {
+            'image': image,
+            'data': output_format.encode(image),
+            'format': output_format.name,
+            'thumbnail': make_thumbnail(image),
+            'from_cache': from_cache,
+            # Set by ModelRouter when it picked the model
+            'model': image.info.get('model')
+        }
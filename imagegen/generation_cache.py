@@ -0,0 +1,185 @@
+"""Content-addressed cache for generated images.
+
+Identical `text_to_image` parameter sets map to the same key, so pressing
+"Generate" again on an unchanged prompt is served locally instead of spending
+rate-limited API quota. There are two tiers: a small in-memory LRU of
+images, and a size-capped directory of image files that survives restarts.
+Files hold the image's encoded bytes under an extension naming their
+format, and are read back as EncodedImages without decoding.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from imagegen.encoding import FORMATS, EncodedImage
+
+# Extension for bytes in a format we have no name for
+OTHER_EXTENSION = "img"
+
+# Parameters the API treats as floats, whether they arrive as 7 or 7.0
+FLOAT_PARAMS = ("guidance_scale",)
+
+
+def canonical_key(params):
+    """Return a stable hash for a `generation_params` dict.
+
+    Keys are sorted and float parameters normalised, so `{"width": 512, ...}`
+    built in a different order (or with guidance_scale 7 vs 7.0) hashes the same.
+    """
+    normalised = {
+        name: float(value) if name in FLOAT_PARAMS and isinstance(value, int) else value
+        for name, value in params.items()
+        if value is not None
+    }
+    payload = json.dumps(normalised, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Two-tier (memory + disk) LRU cache of generated images."""
+
+    def __init__(self, cache_dir, memory_items=32, disk_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # key -> (file name, size), least recently used first
+        self._disk_total = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, self._disk[key][0])
+
+    def _load_disk_index(self):
+        extensions = {extension for _, extension, _ in FORMATS.values()} | {OTHER_EXTENSION}
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            key, _, extension = name.rpartition(".")
+            if extension not in extensions:
+                continue  # Includes half-written .tmp files
+            try:
+                info = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((info.st_mtime, key, name, info.st_size))
+        for _, key, name, size in sorted(entries):
+            if key in self._disk:
+                # The same request stored in two formats; keep the newer file
+                self._disk_total -= self._disk[key][1]
+                self._remove_file(self._disk.pop(key)[0])
+            self._disk[key] = (name, size)
+            self._disk_total += size
+        self._evict_disk()
+
+    def get(self, params):
+        """Return the cached image for `params`, or None on a miss."""
+        key = canonical_key(params)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._memory[key]
+
+            if key in self._disk:
+                try:
+                    with open(self._path(key), "rb") as f:
+                        image = EncodedImage(f.read())
+                except OSError:
+                    # File vanished or is corrupt - forget about it
+                    self._disk_total -= self._disk.pop(key)[1]
+                else:
+                    self._disk.move_to_end(key)
+                    os.utime(self._path(key))
+                    self._remember(key, image)
+                    self.stats["disk_hits"] += 1
+                    return image
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, params, image):
+        """Store `image` as the result for `params` in both tiers.
+
+        An EncodedImage is stored as it is; a PIL image is encoded as PNG.
+        The memory tier only keeps the encoded bytes, never decoded pixels.
+        """
+        key = canonical_key(params)
+        if isinstance(image, EncodedImage):
+            data = image.data
+            extension = FORMATS[image.format][1] if image.format else OTHER_EXTENSION
+            image = image.without_pixels()
+        else:
+            buf = BytesIO()
+            image.save(buf, format="PNG")
+            data, extension = buf.getvalue(), "png"
+            info = image.info
+            image = EncodedImage(data)
+            image.info.update(info)
+        name = f"{key}.{extension}"
+
+        with self._lock:
+            self._remember(key, image)
+            if key in self._disk:
+                return
+            if len(data) > self.disk_bytes:
+                return
+
+            # Write to a temp file first so readers never see a partial image
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, os.path.join(self.cache_dir, name))
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+
+            self._disk[key] = (name, len(data))
+            self._disk_total += len(data)
+            self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for name, _ in self._disk.values():
+                self._remove_file(name)
+            self._disk.clear()
+            self._disk_total = 0
+
+    def _remember(self, key, image):
+        self._memory[key] = image
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        while self._disk_total > self.disk_bytes and self._disk:
+            _, (name, size) = self._disk.popitem(last=False)
+            self._disk_total -= size
+            self.stats["evictions"] += 1
+            self._remove_file(name)
+
+    def _remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    @property
+    def disk_usage(self):
+        return self._disk_total
+
+    @property
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
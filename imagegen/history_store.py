@@ -0,0 +1,231 @@
+"""Memory-bounded per-session image history.
+
+A HistoryStore keeps entry metadata plus encoded image bytes for one browser
+session. Bytes stay in memory up to a configurable budget; beyond that the
+oldest blobs (full-size images first, thumbnails last) are spilled to a SQLite
+file shared by the whole process (and possibly others) and read back on demand.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+import weakref
+
+from imagegen.image_store import BlobStore
+
+# Every live HistoryStore, for reporting memory use across all sessions
+_stores = weakref.WeakSet()
+
+
+class SpillStore:
+    """SQLite table of image bytes spilled out of session memory.
+
+    Several processes (or stores) may share one file. Each store tags its
+    rows with its own owner id and only ever deletes those: its sessions'
+    rows as they end, and all of them when it is closed or the process
+    exits. Rows left behind by a process on this host that has died are
+    cleared when the next store opens the file.
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(spilled)")}
+            if columns and "owner" not in columns:
+                # Written before owners were recorded, by a process that emptied it on start
+                self._conn.execute("DROP TABLE spilled")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS spilled ("
+                " owner TEXT NOT NULL, session_id TEXT NOT NULL, key TEXT NOT NULL, data BLOB NOT NULL,"
+                " PRIMARY KEY (owner, session_id, key))"
+            )
+            self._conn.executemany("DELETE FROM spilled WHERE owner = ?",
+                                   [(owner,) for owner in self._dead_owners()])
+        self._finalizer = weakref.finalize(self, _delete_owner, self._conn, self._lock, self.owner)
+
+    def _dead_owners(self):
+        """Owners of rows in the table whose process, on this host, no longer runs."""
+        dead = []
+        for (owner,) in self._conn.execute("SELECT DISTINCT owner FROM spilled"):
+            host, _, rest = owner.partition(":")
+            pid = rest.partition(":")[0]
+            if host != socket.gethostname() or not pid.isdigit():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                dead.append(owner)
+            except OSError:
+                pass  # Alive, but someone else's
+        return dead
+
+    def close(self):
+        """Delete every row this store has written."""
+        self._finalizer()
+
+    def put(self, session_id, key, data):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO spilled (owner, session_id, key, data) VALUES (?, ?, ?, ?)",
+                (self.owner, session_id, key, data)
+            )
+
+    def get(self, session_id, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM spilled WHERE owner = ? AND session_id = ? AND key = ?",
+                (self.owner, session_id, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, session_id, keys):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM spilled WHERE owner = ? AND session_id = ? AND key = ?",
+                [(self.owner, session_id, key) for key in keys]
+            )
+
+    def delete_session(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM spilled WHERE owner = ? AND session_id = ?", (self.owner, session_id))
+
+    def nbytes(self, session_id=None):
+        """Bytes this store has spilled, for one session or all of them."""
+        query = "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM spilled WHERE owner = ?"
+        args = (self.owner,)
+        if session_id is not None:
+            query += " AND session_id = ?"
+            args += (session_id,)
+        with self._lock:
+            return self._conn.execute(query, args).fetchone()[0]
+
+
+def _delete_owner(conn, lock, owner):
+    # The connection stays open: sessions may still drop their (now deleted) rows on the way out
+    with lock:
+        try:
+            with conn:
+                conn.execute("DELETE FROM spilled WHERE owner = ?", (owner,))
+        except sqlite3.Error:
+            pass  # Left for the next store to clear
+
+
+class HistoryStore:
+    """Newest-first list of history entries with a capped memory footprint.
+
+    Entries are plain metadata dicts with a unique 'id'; their image bytes
+    are referenced by 'image_key' (full-size image, in the entry's 'format')
+    and 'thumb_key' (grid thumbnail) and fetched with get_bytes().
+    """
+
+    BLOB_FIELDS = ('thumb_key', 'image_key')
+
+    def __init__(self, session_id, spill=None, max_items=10, memory_budget=16 * 1024 * 1024):
+        self.session_id = session_id
+        self.spill = spill
+        self.max_items = max_items
+        self.memory_budget = memory_budget
+        self.entries = []
+        self._blobs = BlobStore()
+        self._spilled = set()
+        _stores.add(self)
+        if spill is not None:
+            # Sessions end without notice; drop their spilled rows once the store is collected
+            weakref.finalize(self, spill.delete_session, session_id)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def add(self, entry, data, thumbnail, mime="image/png"):
+        """Store the encoded images, insert `entry` at the front and enforce limits."""
+        entry = dict(entry)
+        entry.setdefault('id', uuid.uuid4().hex)
+        entry['image_key'] = self._blobs.put(data, mime=mime)
+        entry['thumb_key'] = self._blobs.put(thumbnail, mime="image/jpeg")
+        # Same bytes as an older, spilled entry: they're back in memory now
+        reloaded = self._spilled & {entry['image_key'], entry['thumb_key']}
+        if reloaded:
+            self._spilled -= reloaded
+            self.spill.delete(self.session_id, reloaded)
+        self.entries.insert(0, entry)
+
+        dropped = self.entries[self.max_items:]
+        del self.entries[self.max_items:]
+        self._forget_unreferenced(dropped)
+        self._enforce_budget()
+        return entry
+
+    def find(self, entry_id):
+        """The entry with this 'id', or None once it has left the history."""
+        for entry in self.entries:
+            if entry['id'] == entry_id:
+                return entry
+        return None
+
+    def get_bytes(self, key):
+        """Return the bytes for `key`, reading them back from the spill store if needed."""
+        data = self._blobs.get(key)
+        if data is None and key in self._spilled and self.spill is not None:
+            data = self.spill.get(self.session_id, key)
+        return data
+
+    def __contains__(self, key):
+        return key in self._blobs or key in self._spilled
+
+    def clear(self):
+        self.entries = []
+        self._blobs.clear()
+        self._spilled.clear()
+        if self.spill is not None:
+            self.spill.delete_session(self.session_id)
+
+    def _forget_unreferenced(self, dropped):
+        live = {entry[field] for entry in self.entries for field in self.BLOB_FIELDS}
+        gone = {entry[field] for entry in dropped for field in self.BLOB_FIELDS} - live
+        if not gone:
+            return
+        self._blobs.retain(live)
+        spilled_gone = gone & self._spilled
+        self._spilled -= spilled_gone
+        if spilled_gone and self.spill is not None:
+            self.spill.delete(self.session_id, spilled_gone)
+
+    def _enforce_budget(self):
+        if self.spill is None:
+            return
+        # Oldest full-size images go first, then oldest thumbnails
+        for field in self.BLOB_FIELDS[::-1]:
+            for entry in reversed(self.entries):
+                if self._blobs.nbytes <= self.memory_budget:
+                    return
+                key = entry[field]
+                data = self._blobs.get(key)
+                if data is None:
+                    continue
+                self.spill.put(self.session_id, key, data)
+                self._spilled.add(key)
+                self._blobs.discard(key)
+
+    @property
+    def memory_bytes(self):
+        return self._blobs.nbytes
+
+    @property
+    def spilled_bytes(self):
+        return self.spill.nbytes(self.session_id) if self.spill is not None else 0
+
+
+def global_memory_bytes():
+    """In-memory image bytes held by every live session's history."""
+    return sum(store.memory_bytes for store in list(_stores))
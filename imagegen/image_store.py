@@ -0,0 +1,107 @@
+"""Encode-once storage for generated images.
+
+Images are encoded a single time, right after generation, and kept as
+immutable bytes keyed by their SHA-256. Display and download buttons serve
+those bytes directly, so Streamlit reruns never re-compress a PNG.
+"""
+import hashlib
+import threading
+from io import BytesIO
+
+from imagegen.encoding import EncodedImage
+
+# The history grid has 3 columns of roughly 224px in the centered layout;
+# thumbnails are twice that so they stay sharp on HiDPI screens.
+THUMBNAIL_WIDTH = 448
+# JPEG rather than WebP: st.image passes JPEG bytes through untouched but
+# decodes and re-encodes anything that isn't JPEG/PNG/GIF on every rerun.
+THUMBNAIL_FORMAT = "JPEG"
+THUMBNAIL_QUALITY = 80
+
+
+def encode_png(image):
+    """Encode a PIL image as PNG bytes."""
+    buf = BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_thumbnail(image, width=THUMBNAIL_WIDTH, quality=THUMBNAIL_QUALITY):
+    """Return compact JPEG bytes of `image` scaled down to at most `width` pixels wide."""
+    if isinstance(image, EncodedImage):
+        image = image.decode(reduce_to=(width, max(1, round(image.height * width / image.width))))
+    thumb = image.convert("RGB")
+    if thumb.width > width:
+        height = max(1, round(thumb.height * width / thumb.width))
+        thumb.thumbnail((width, height))
+    buf = BytesIO()
+    thumb.save(buf, format=THUMBNAIL_FORMAT, quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed, immutable in-memory store of encoded images."""
+
+    def __init__(self):
+        self._blobs = {}
+        self._mimes = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data, mime="image/png"):
+        """Store `data` and return its key. Storing the same bytes twice is free."""
+        key = content_key(data)
+        with self._lock:
+            if key not in self._blobs:
+                self._blobs[key] = bytes(data)
+                self._mimes[key] = mime
+                self._nbytes += len(data)
+        return key
+
+    def get(self, key):
+        """Return the stored bytes, or None if `key` is unknown."""
+        with self._lock:
+            return self._blobs.get(key)
+
+    def mime(self, key):
+        with self._lock:
+            return self._mimes.get(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._blobs
+
+    def __len__(self):
+        with self._lock:
+            return len(self._blobs)
+
+    def discard(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def retain(self, keys):
+        """Drop every blob whose key is not in `keys`."""
+        keys = set(keys)
+        with self._lock:
+            for key in [k for k in self._blobs if k not in keys]:
+                self._drop(key)
+
+    def _drop(self, key):
+        data = self._blobs.pop(key, None)
+        if data is not None:
+            self._nbytes -= len(data)
+            del self._mimes[key]
+
+    def clear(self):
+        with self._lock:
+            self._blobs.clear()
+            self._mimes.clear()
+            self._nbytes = 0
+
+    @property
+    def nbytes(self):
+        return self._nbytes
@@ -0,0 +1,137 @@
+"""Process-wide background job executor.
+
+Streamlit throws away the running script whenever a widget changes, so long
+API calls made inline are lost on every interaction. Jobs submitted here run
+on a bounded thread pool that is independent of the script runner; the
+script only keeps the job ID and polls for the result on later reruns.
+
+Jobs can be cancelled. One that hasn't started never runs; a running one
+is asked to stop through its `cancel` event, which long steps (waiting for
+a rate-limit slot, retry backoff) check before spending API quota.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Cancelled(Exception):
+    """Raised inside a job that noticed it was cancelled."""
+
+
+class Job:
+    """State of one submitted job. Read it via JobExecutor.get()."""
+
+    def __init__(self, job_id, meta=None):
+        self.id = job_id
+        self.meta = meta or {}
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self):
+        end = self.finished_at or time.time()
+        return end - self.submitted_at
+
+
+class JobExecutor:
+    """Bounded thread pool that tracks jobs by ID."""
+
+    def __init__(self, max_workers=4, retention_seconds=3600):
+        self.retention_seconds = retention_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="imagegen-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, meta=None, cancellable=False, **kwargs):
+        """Run `fn(*args, **kwargs)` in the background and return the new job ID.
+
+        With `cancellable`, `fn` also gets `cancel=<threading.Event>`, set
+        when cancel() is called for the job.
+        """
+        job = Job(uuid.uuid4().hex, meta)
+        if cancellable:
+            kwargs["cancel"] = job.cancel_event
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.time()
+        job.status = RUNNING
+        try:
+            if job.cancel_event.is_set():
+                raise Cancelled()
+            job.result = fn(*args, **kwargs)
+        except Cancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        else:
+            job.status = DONE
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        """Return the Job for `job_id`, or None if it is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes (or `timeout` passes) and return it."""
+        job = self.get(job_id)
+        if job is not None and job.future is not None:
+            try:
+                job.future.result(timeout=timeout)
+            except Exception:
+                pass
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job. Returns False if it is unknown or already finished."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            # Never started: it won't run at all
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return True
+
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self):
+        # Finished jobs nobody collected (closed tabs) are dropped after a while
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    @property
+    def active_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
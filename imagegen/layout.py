@@ -0,0 +1,56 @@
+"""Static page content for app.py.
+
+Streamlit re-executes app.py on every interaction; anything defined here is
+built once per process when the module is first imported.
+"""
+from imagegen.prompts import STYLE_PRESETS
+
+# Custom CSS for better styling
+CUSTOM_CSS = """
+    <style>
+    .main {
+        padding: 2rem;
+    }
+    .stButton>button {
+        width: 100%;
+        background-color: #FF6B6B;
+        color: white;
+        font-weight: bold;
+        padding: 0.5rem 1rem;
+        border-radius: 0.5rem;
+        border: none;
+        font-size: 1.1rem;
+    }
+    .stButton>button:hover {
+        background-color: #FF5252;
+    }
+    </style>
+"""
+
+TOKEN_SETUP_HELP = """
+    **Setup Instructions:**
+    1. Go to https://huggingface.co/settings/tokens
+    2. Create a new token with "Write" permissions
+    3. Create a `.env` file in the project directory
+    4. Add: `HUGGINGFACE_TOKEN=your_token_here`
+    5. Restart the application
+
+    **Note:** Read-only tokens will NOT work for the Inference API.
+    """
+
+FOOTER_HTML = """
+    <div style='text-align: center; color: #666;'>
+        <p>Powered by HuggingFace {models} 🚀</p>
+        <p style='font-size: 0.8rem;'>Free tier has rate limits. For unlimited access, consider upgrading your HuggingFace plan.</p>
+    </div>
+"""
+
+# Map size options to dimensions
+SIZE_OPTIONS = {
+    "Square (512x512)": (512, 512),
+    "Portrait (512x768)": (512, 768),
+    "Landscape (768x512)": (768, 512)
+}
+SIZE_LABELS = list(SIZE_OPTIONS)
+
+STYLE_NAMES = list(STYLE_PRESETS)
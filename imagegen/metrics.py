@@ -0,0 +1,256 @@
+"""Lightweight span timers and counters for the generation hot path.
+
+Everything records into the module-level `metrics` registry, which is off
+until the app (or CLI) enables it. While disabled, span() and start() hand
+back one shared no-op object and incr()/observe() return straight away, so
+instrumented code pays little more than an attribute check.
+
+When enabled, durations are kept as Prometheus-style histograms and the
+whole registry can be exported as Prometheus text or JSON, either directly
+or from a small HTTP endpoint serving /metrics and /metrics.json.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+
+PREFIX = "imagegen"
+# Upper bounds (seconds) of the histogram buckets, from PIL work up to slow API calls
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def stop(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_metrics", "_key", "_start")
+
+    def __init__(self, metrics, key):
+        self._metrics = metrics
+        self._key = key
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        if exc_type is not None:
+            self._metrics._add(("stage_errors_total", self._key[1]), 1)
+        return False
+
+    def stop(self):
+        self._metrics._record(self._key, time.perf_counter() - self._start)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Registry of histograms (stage timings) and counters."""
+
+    def __init__(self, enabled=False, prefix=PREFIX, buckets=BUCKETS):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}  # key -> [count, sum, max, per-bucket counts]
+        self._counters = {}
+        self._collectors = []
+
+    # Recording
+
+    def span(self, stage, **labels):
+        """Context manager timing one stage into the stage_seconds histogram."""
+        if not self.enabled:
+            return _NULL_SPAN
+        labels["stage"] = stage
+        return _Span(self, _key("stage_seconds", labels))
+
+    def observe(self, name, seconds, **labels):
+        """Add one duration to the `name` histogram."""
+        if not self.enabled:
+            return
+        self._record(_key(name, labels), seconds)
+
+    def incr(self, name, value=1, **labels):
+        """Increase the `name` counter."""
+        if not self.enabled:
+            return
+        self._add(_key(name, labels), value)
+
+    def add_collector(self, collect):
+        """Register `collect()` -> {name: value}, read at export time.
+
+        Used for components that already keep their own counters (cache,
+        scheduler, coalescer), so they don't have to count twice.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def _record(self, key, seconds):
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0, 0.0, 0.0, [0] * (len(self.buckets) + 1)]
+            histogram[0] += 1
+            histogram[1] += seconds
+            histogram[2] = max(histogram[2], seconds)
+            histogram[3][bucket] += 1
+
+    def _add(self, key, value):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    # Export
+
+    def _collected(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        values = {}
+        for collect in collectors:
+            try:
+                values.update(collect())
+            except Exception:
+                continue  # A broken collector must not take the metrics endpoint down
+        return values
+
+    def snapshot(self):
+        """Plain-dict view of every series, suitable for JSON."""
+        with self._lock:
+            histograms = {key: (h[0], h[1], h[2]) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        def label_string(name, labels):
+            return name + _format_labels(labels)
+
+        return {
+            "timestamp": time.time(),
+            "enabled": self.enabled,
+            "histograms": {
+                label_string(name, labels): {
+                    "count": count, "sum": round(total, 6), "mean": round(total / count, 6) if count else 0.0,
+                    "max": round(peak, 6)
+                }
+                for (name, labels), (count, total, peak) in sorted(histograms.items())
+            },
+            "counters": {label_string(name, labels): value for (name, labels), value in sorted(counters.items())},
+            "gauges": self._collected(),
+        }
+
+    def stage_means(self):
+        """{stage: (count, mean seconds)} for the stage_seconds histogram, summed over other labels."""
+        totals = {}
+        with self._lock:
+            for (name, labels), histogram in self._histograms.items():
+                if name != "stage_seconds":
+                    continue
+                stage = dict(labels)["stage"]
+                count, total = totals.get(stage, (0, 0.0))
+                totals[stage] = (count + histogram[0], total + histogram[1])
+        return {stage: (count, total / count) for stage, (count, total) in totals.items() if count}
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = {key: (h[0], h[1], list(h[3])) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        typed = set()
+        for (name, labels), (count, total, bucket_counts) in sorted(histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+        for (name, labels), value in sorted(counters.items()):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for name, value in sorted(self._collected().items()):
+            metric = f"{self.prefix}_{name}"
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        """Append one snapshot line to a JSON log file."""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_json() + "\n")
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve /metrics (Prometheus) and /metrics.json on a daemon thread. Returns the server."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                if path == "/metrics":
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif path == "/metrics.json":
+                    body, content_type = registry.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+        return httpd
+
+
+# Shared by the app, the CLI and every imagegen module
+metrics = Metrics()
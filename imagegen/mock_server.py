@@ -0,0 +1,237 @@
+"""Local stand-in for the HuggingFace text-to-image endpoint.
+
+    python -m imagegen.mock_server --port 8765 --latency lognormal:2,0.5 --rate-429 0.05
+
+then start the app (or the CLI) with INFERENCE_ENDPOINT=http://127.0.0.1:8765
+and any non-empty HUGGINGFACE_TOKEN. Requests go through the real
+InferenceClient, request scheduler, cache and job executor; only the model
+is fake. Each response takes a latency drawn from a configurable
+distribution, a configurable share of requests fail with 429 (with
+Retry-After) or 503, and images are deterministic: the same prompt, seed and
+settings always produce the same PNG. Models listed with --down answer
+every request with 503, to rehearse failover. GET /stats returns counters
+as JSON.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from imagegen.demo_image import render_gradient
+from imagegen.image_store import encode_png
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+def parse_latency(spec):
+    """Turn "name:arg1,arg2" into a function rng -> seconds.
+
+    fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA
+    and exponential:MEAN are supported. Negative draws are clamped to 0.
+    """
+    name, _, args = spec.partition(":")
+    try:
+        values = [float(v) for v in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"bad latency spec {spec!r}") from None
+
+    if name == "fixed" and len(values) == 1:
+        draw = lambda rng: values[0]
+    elif name == "uniform" and len(values) == 2:
+        draw = lambda rng: rng.uniform(*values)
+    elif name == "normal" and len(values) == 2:
+        draw = lambda rng: rng.gauss(*values)
+    elif name == "lognormal" and len(values) == 2:
+        median, sigma = values
+        draw = lambda rng: median * rng.lognormvariate(0, sigma)
+    elif name == "exponential" and len(values) == 1:
+        draw = lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    else:
+        raise ValueError(f"bad latency spec {spec!r}; expected one of {', '.join(DISTRIBUTIONS)}")
+    return lambda rng: max(0.0, draw(rng))
+
+
+def image_seed(inputs, parameters):
+    """Stable digest of everything that should change the picture."""
+    payload = json.dumps({"inputs": inputs, "parameters": parameters}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+@lru_cache(maxsize=64)
+def render_png(digest, width, height):
+    """Deterministic gradient PNG whose colors come from `digest`."""
+    top, bottom = tuple(digest[0:3]), tuple(digest[3:6])
+    return encode_png(render_gradient(top, bottom, width, height))
+
+
+class MockInferenceServer:
+    """Threaded HTTP server answering text-to-image POSTs on any path."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency="uniform:0.5,1.5", rate_429=0.0,
+                 rate_503=0.0, retry_after=1.0, capacity=None, seed=0, down_models=()):
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.retry_after = retry_after
+        self.capacity = capacity
+        self.down_models = set(down_models)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "503": 0, "bad_request": 0,
+                      "max_in_flight": 0, "total_latency": 0.0}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/stats":
+                    self._send(200, "application/json", json.dumps(server.snapshot()).encode("utf-8"))
+                else:
+                    self._send(404, "application/json", b'{"error": "not found"}')
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    inputs = body["inputs"]
+                    parameters = body.get("parameters") or {}
+                except (ValueError, KeyError, TypeError):
+                    server._count("bad_request")
+                    self._send(400, "application/json", b'{"error": "expected JSON with \\"inputs\\""}')
+                    return
+                model = self.path.split("/models/", 1)[-1] if "/models/" in self.path else ""
+                status, headers, content_type, data = server.respond(inputs, parameters, model)
+                self._send(status, content_type, data, headers)
+
+            def _send(self, status, content_type, data, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep load tests quiet
+
+        return Handler
+
+    def _count(self, field):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[field] += 1
+
+    def respond(self, inputs, parameters, model=""):
+        """Decide the outcome of one request. Returns (status, headers, content_type, body)."""
+        with self._lock:
+            roll = self._rng.random()
+            delay = self.latency(self._rng)
+            overloaded = self.capacity is not None and self._in_flight >= self.capacity
+            if roll < self.rate_429:
+                outcome = "429"
+            elif overloaded or model in self.down_models or roll < self.rate_429 + self.rate_503:
+                outcome = "503"
+            else:
+                outcome = "ok"
+                self._in_flight += 1
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+
+        if outcome == "429":
+            self._count("429")
+            headers = {"Retry-After": f"{self.retry_after:g}"}
+            return 429, headers, "application/json", b'{"error": "Rate limit reached. Please retry later."}'
+        if outcome == "503":
+            self._count("503")
+            body = json.dumps({"error": "Model is currently loading", "estimated_time": self.retry_after})
+            return 503, {}, "application/json", body.encode("utf-8")
+
+        try:
+            time.sleep(delay)
+            width = int(parameters.get("width") or 512)
+            height = int(parameters.get("height") or 512)
+            data = render_png(image_seed(inputs, parameters), width, height)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["ok"] += 1
+            self.stats["total_latency"] += delay
+        return 200, {}, "image/png", data
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, in_flight=self._in_flight)
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted."""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def start(self):
+        """Serve on a background thread. Returns self."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-inference", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fake text-to-image responses for offline load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="uniform:0.5,1.5",
+                        help=f"latency distribution in seconds, one of {', '.join(DISTRIBUTIONS)} (e.g. lognormal:2,0.5)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--rate-503", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--capacity", type=int, default=None, help="answer 503 beyond this many requests in flight")
+    parser.add_argument("--seed", type=int, default=0, help="seed for latency and error injection")
+    parser.add_argument("--down", action="append", default=[], metavar="MODEL",
+                        help="answer every request for MODEL with 503 (repeatable)")
+    args = parser.parse_args(argv)
+
+    try:
+        server = MockInferenceServer(args.host, args.port, args.latency, args.rate_429, args.rate_503,
+                                     args.retry_after, args.capacity, args.seed, args.down)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Mock inference server on {server.url} - run the app with INFERENCE_ENDPOINT={server.url}")
+    server.serve_forever()
+    print(json.dumps(server.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Text-to-image models the app can use, and what each one accepts.
+
+Every request is built against the generic parameters the UI exposes; a
+ModelSpec adapts them to one model's limits (step count, image size,
+supported arguments) right before the call, so the router can send the same
+request to whichever model is healthy.
+"""
+
+# Sent as the model when any registered model may serve the request
+AUTO_MODEL = "auto"
+
+
+class ModelSpec:
+    """Limits of one model. Sizes must fall in [min_size, max_size] and be a multiple of `size_step`."""
+
+    def __init__(self, name, label, max_steps, min_size=256, max_size=1024, size_step=8,
+                 negative_prompt=True, guidance=True):
+        self.name = name
+        self.label = label
+        self.max_steps = max_steps
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size_step = size_step
+        self.negative_prompt = negative_prompt
+        self.guidance = guidance
+
+    def fit_size(self, value):
+        value = min(self.max_size, max(self.min_size, int(value)))
+        return value - value % self.size_step
+
+    def fit(self, params):
+        """Copy of `params` for this model: its name, steps and size clamped, unsupported args dropped."""
+        params = dict(params, model=self.name)
+        if "num_inference_steps" in params:
+            params["num_inference_steps"] = max(1, min(self.max_steps, int(params["num_inference_steps"])))
+        for field in ("width", "height"):
+            if field in params:
+                params[field] = self.fit_size(params[field])
+        if not self.negative_prompt:
+            params.pop("negative_prompt", None)
+        if not self.guidance:
+            params.pop("guidance_scale", None)
+        return params
+
+
+MODEL_REGISTRY = {
+    spec.name: spec for spec in (
+        ModelSpec("stabilityai/stable-diffusion-xl-base-1.0", "Stable Diffusion XL", max_steps=50),
+        ModelSpec("black-forest-labs/FLUX.1-schnell", "FLUX.1-schnell", max_steps=16, max_size=1440,
+                  size_step=16, negative_prompt=False, guidance=False),
+        ModelSpec("black-forest-labs/FLUX.1-dev", "FLUX.1-dev", max_steps=50, max_size=1440,
+                  size_step=16, negative_prompt=False),
+    )
+}
+
+
+# Routed between by default; on equal footing the first one wins
+DEFAULT_MODELS = "stabilityai/stable-diffusion-xl-base-1.0,black-forest-labs/FLUX.1-schnell"
+
+
+def resolve_models(names):
+    """ModelSpecs for a comma-separated list (or iterable) of model names, in order.
+
+    Unknown names get a permissive spec so custom models still work.
+    """
+    if isinstance(names, str):
+        names = names.split(",")
+    specs = []
+    for name in names:
+        name = name.strip()
+        if name and name not in [spec.name for spec in specs]:
+            specs.append(MODEL_REGISTRY.get(name) or ModelSpec(name, name.split("/")[-1], max_steps=50))
+    return specs
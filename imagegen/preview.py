@@ -0,0 +1,26 @@
+"""Progressive preview: a cheap draft alongside the full-quality render.
+
+The draft asks for the same prompt at a reduced size and only a couple of
+inference steps, so it comes back in a fraction of the time. It is a rough
+preview only: diffusion at another resolution and step count does not
+reproduce the full render's composition, even with the same seed. The full
+render is submitted at the same time as the draft, as a cancellable job, and
+keeps the request's own parameters, so it shares cache entries with the same
+request made without a draft.
+"""
+
+DRAFT_STEPS = 2
+DRAFT_MAX_SIDE = 512
+DRAFT_MIN_SIDE = 256
+
+
+def draft_params(generation_params, steps=DRAFT_STEPS, max_side=DRAFT_MAX_SIDE):
+    """The draft version of a request: same prompt, fewer steps, longest side at most `max_side`."""
+    width, height = generation_params["width"], generation_params["height"]
+    scale = min(1.0, max_side / max(width, height))
+    return dict(
+        generation_params,
+        width=max(DRAFT_MIN_SIDE, int(width * scale) // 64 * 64),
+        height=max(DRAFT_MIN_SIDE, int(height * scale) // 64 * 64),
+        num_inference_steps=min(steps, generation_params.get("num_inference_steps", steps))
+    )
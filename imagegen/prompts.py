@@ -0,0 +1,122 @@
+"""Prompt enhancement as a declarative pipeline of rules.
+
+Each rule decides from the request (prompt, style and flags) whether it
+applies and what text it appends; the rules run in order. Keyword detection
+uses precompiled word-boundary patterns, so "heart" no longer counts as an
+ear and "warm" no longer counts as an arm, and finished prompts are memoized
+because Streamlit rebuilds them on every rerun.
+"""
+import re
+from functools import lru_cache
+
+# Style preset definitions
+STYLE_PRESETS = {
+    "None": "",
+    "Anime": ", anime style, vibrant colors, Studio Ghibli inspired, detailed illustration, manga art, highly detailed",
+    "Realistic": ", photorealistic, highly detailed, 8K resolution, professional photography, sharp focus, natural lighting, realistic materials",
+    "Digital Art": ", digital painting, artstation trending, concept art, highly detailed, intricate details, professional digital illustration",
+    "Watercolor": ", watercolor painting, soft colors, artistic, flowing brushstrokes, traditional art, delicate details",
+    "Oil Painting": ", oil painting, classical art style, rich colors, textured brushstrokes, traditional painting, masterpiece",
+    "Cyberpunk": ", cyberpunk style, neon lights, futuristic, sci-fi, dystopian city, technology, glowing elements, dark atmosphere",
+    "Fantasy": ", fantasy art, magical, enchanted, epic, mystical atmosphere, dramatic lighting, otherworldly, highly detailed"
+}
+
+# Prompts mentioning any of these get the human anatomy block in Ultra Realism Mode
+HUMAN_BODY_KEYWORDS = (
+    'hand', 'hands', 'finger', 'fingers', 'face', 'eye', 'eyes', 'nose', 'mouth',
+    'ear', 'ears', 'arm', 'arms', 'leg', 'legs', 'foot', 'feet', 'skin', 'body',
+    'person', 'human', 'portrait', 'man', 'woman', 'child', 'people'
+)
+# Irregular plurals and compounds of those keywords, which the word-boundary pattern
+# would otherwise miss. Each contains a keyword, so the original substring check caught them.
+HUMAN_BODY_FORMS = (
+    'children', 'fingertip', 'fingernail', 'fingerprint', 'handprint', 'handshake',
+    'eyelash', 'eyelid', 'eyebrow', 'eyeball', 'earlobe', 'forearm', 'armpit', 'barefoot',
+    'bodybuilder', 'fisherman', 'businessman', 'businesswoman', 'gentleman', 'policeman',
+    'policewoman', 'fireman', 'craftsman', 'horseman', 'horsewoman', 'swordsman', 'sportsman',
+    'sportswoman', 'postman', 'chairman', 'chairwoman'
+)
+
+# Ultra realism mode - mimicking real camera photography with authentic characteristics
+REALISM_SUFFIX = ", RAW photo, genuine photograph, real camera capture, photorealistic, ultra realistic, hyper detailed, 8k uhd, shot on Canon EOS R5, professional DSLR photography, natural photograph, real world scene, authentic lighting, real textures, film grain, natural color grading, high dynamic range, proper exposure, masterpiece quality, crystal clear, sharp focus everywhere, deep focus f/22, everything in focus, full scene detail, volumetric atmospheric lighting, physically accurate, extreme detail throughout, intricate real-world details, accurate colors, natural skin tones, realistic materials, perfect clarity, comprehensive detail, no artificial blur, infinite depth of field, everything sharp, all elements detailed, true to life, optical perfection, real photograph quality, entire scene in sharp focus, background highly detailed, foreground and background equally sharp, no depth of field blur, no bokeh, no defocus, complete scene clarity, f/32 aperture, tack sharp throughout"
+HUMAN_ANATOMY_SUFFIX = ", anatomically correct, realistic human anatomy, real human skin texture, visible skin pores, skin imperfections, natural skin subsurface scattering, authentic dermal details, real skin microstructure, fine skin lines, natural skin blemishes, realistic skin tone variation, genuine skin appearance, skin texture like real photographs of humans, dermatological accuracy, macro photography skin detail, individual pore visibility, natural skin oils, authentic epidermal texture, real subcutaneous details, lifelike skin translucency, biological skin accuracy, medical photography skin precision, true to life human skin, photorealistic flesh tones, natural vein visibility under skin, authentic skin undertones, real human dermis characteristics"
+
+DETAIL_SUFFIX = ", highly detailed throughout entire scene"
+QUALITY_SUFFIX = ", high quality, sharp focus everywhere, everything in focus, deep focus, no blur"
+
+# Whole words only, allowing a plural ending ("faces", "portraits", "eyelashes")
+HUMAN_PATTERN = re.compile(
+    r"\b(?:" + "|".join(sorted(map(re.escape, HUMAN_BODY_KEYWORDS + HUMAN_BODY_FORMS), key=len, reverse=True))
+    + r")(?:e?s)?\b",
+    re.IGNORECASE
+)
+DETAILED_PATTERN = re.compile("detailed", re.IGNORECASE)
+# Style suffixes never change, so whether they already say "detailed" is known up front
+STYLE_SAYS_DETAILED = {name: bool(DETAILED_PATTERN.search(suffix)) for name, suffix in STYLE_PRESETS.items()}
+
+
+def contains_human(prompt):
+    """True if the prompt mentions a person or a body part."""
+    return HUMAN_PATTERN.search(prompt) is not None
+
+
+def mentions_detailed(prompt):
+    return DETAILED_PATTERN.search(prompt) is not None
+
+
+class PromptRule:
+    """Append `text` when `when(options)` holds and, if given, `needs(prompt)` too.
+
+    `options` are the per-request flags (style, ultra_realism, add_details,
+    add_quality). `when` only looks at those, so its result can be planned
+    once per combination; `needs` is the part that has to inspect the prompt.
+    """
+
+    def __init__(self, name, when, text, needs=None):
+        self.name = name
+        self.when = when
+        self.text = text if callable(text) else (lambda options, value=text: value)
+        self.needs = needs
+
+
+PROMPT_RULES = (
+    PromptRule(
+        "style suffix",
+        lambda o: not o['ultra_realism'],
+        lambda o: STYLE_PRESETS.get(o['style'], "")
+    ),
+    PromptRule("realism block", lambda o: o['ultra_realism'], REALISM_SUFFIX),
+    PromptRule("human anatomy block", lambda o: o['ultra_realism'], HUMAN_ANATOMY_SUFFIX, needs=contains_human),
+    # Realism mode already asks for detail and quality, so these only apply outside it
+    PromptRule(
+        "detail keywords",
+        lambda o: not o['ultra_realism'] and o['add_details'] and not STYLE_SAYS_DETAILED.get(o['style'], False),
+        DETAIL_SUFFIX,
+        needs=lambda prompt: not mentions_detailed(prompt)
+    ),
+    PromptRule("quality keywords", lambda o: not o['ultra_realism'] and o['add_quality'], QUALITY_SUFFIX),
+)
+
+
+@lru_cache(maxsize=None)
+def _plan(style, ultra_realism, add_details, add_quality):
+    """The (needs, text) steps that apply to one combination of options."""
+    options = {
+        'style': style,
+        'ultra_realism': ultra_realism,
+        'add_details': add_details,
+        'add_quality': add_quality
+    }
+    return tuple((rule.needs, rule.text(options)) for rule in PROMPT_RULES if rule.when(options))
+
+
+@lru_cache(maxsize=4096)
+def build_prompt(base_prompt, style, ultra_realism=False, add_details=True, add_quality=True):
+    """Run the prompt through every rule and return the enhanced prompt."""
+    plan = _plan(style, bool(ultra_realism), bool(add_details), bool(add_quality))
+    return base_prompt + "".join(text for needs, text in plan if needs is None or needs(base_prompt))
+
+
+def enhance_prompt(base_prompt, style, ultra_realism=False):
+    """Style suffix, or the realism blocks in Ultra Realism Mode, without quality keywords."""
+    return build_prompt(base_prompt, style, ultra_realism, add_details=False, add_quality=False)
@@ -0,0 +1,102 @@
+"""Refining a generated image, as a small state machine kept in session state.
+
+Streamlit reruns the script on every click, so a refine form drawn only in
+the rerun that produced an image is gone before its button can be handled.
+A RefinementFlow remembers which stored generation is on screen and whether
+a refinement of it is in flight, and the page is rebuilt from it on every
+rerun:
+
+    IDLE --show()--> SHOWING --start()--> REFINING --finished()--> SHOWING (the refined image)
+                                                   --failed()----> SHOWING (same image, with the error)
+
+Generations are referred to by their history entry 'id', so the base image
+and its parameters come from the history instead of being generated again.
+"""
+from imagegen.metrics import metrics
+from imagegen.prompts import build_prompt
+
+IDLE = "idle"
+SHOWING = "showing"
+REFINING = "refining"
+
+
+def refined_job_info(entry, instruction):
+    """job_info for refining a stored generation: its exact parameters with the instruction added to the prompt."""
+    prompt = f"{entry['prompt']}, {instruction.strip()}"
+    with metrics.span("prompt_enhancement"):
+        enhanced_prompt = build_prompt(
+            prompt,
+            entry['style'],
+            ultra_realism=entry['realism_mode'],
+            add_details=entry.get('add_details', True),
+            add_quality=entry.get('add_quality', True)
+        )
+    return {
+        'prompt': prompt,
+        'enhanced_prompt': enhanced_prompt,
+        'style': entry['style'],
+        'realism_mode': entry['realism_mode'],
+        'add_details': entry.get('add_details', True),
+        'add_quality': entry.get('add_quality', True),
+        'generation_params': dict(entry['generation_params'], prompt=enhanced_prompt),
+        'tiled': entry.get('tiled'),
+        'instruction': instruction.strip(),
+        'refined_from': entry['id']
+    }
+
+
+class RefinementFlow:
+    """Which generation is on screen and the refinement job following it, if any."""
+
+    def __init__(self):
+        self.state = IDLE
+        self.generation_id = None
+        self.refined_from = None
+        self.job_id = None
+        self.instruction = None
+        self.error = None
+
+    def show(self, generation_id, refined_from=None):
+        """Put a stored generation on screen.
+
+        A refinement still in flight keeps running and lands in the history,
+        but is no longer followed here.
+        """
+        self.state = SHOWING
+        self.generation_id = generation_id
+        self.refined_from = refined_from
+        self.job_id = None
+        self.instruction = None
+        self.error = None
+
+    def reset(self):
+        self.__init__()
+
+    @property
+    def can_refine(self):
+        return self.state == SHOWING
+
+    def start(self, job_id, instruction):
+        """Follow the refinement job `job_id` of the generation on screen."""
+        if not self.can_refine:
+            raise ValueError(f"Cannot start a refinement while {self.state}")
+        self.state = REFINING
+        self.job_id = job_id
+        self.instruction = instruction
+        self.error = None
+
+    def finished(self, job_id, generation_id):
+        """A refinement job's result was stored as `generation_id`. Returns whether it was the one followed."""
+        if self.state != REFINING or job_id != self.job_id:
+            return False
+        self.show(generation_id, refined_from=self.generation_id)
+        return True
+
+    def failed(self, job_id, error):
+        """A refinement job failed. Returns whether it was the one followed."""
+        if self.state != REFINING or job_id != self.job_id:
+            return False
+        self.state = SHOWING
+        self.job_id = None
+        self.error = str(error)
+        return True
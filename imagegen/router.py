@@ -0,0 +1,196 @@
+"""Pick a model per request from observed latency and errors, failing over on outages.
+
+ModelRouter keeps a rolling window of outcomes per model. Healthy models are
+ranked by mean latency, inflated by their recent error rate, and a request
+is sent to the best one first. If that model is down (404, 5xx, timeouts or
+429s that outlasted the scheduler's retries) the next one is tried. A model
+that fails several times in a row is taken out of rotation for a cooldown,
+after which a single request probes it again.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+from imagegen.jobs import Cancelled
+from imagegen.metrics import metrics
+from imagegen.scheduler import error_status
+
+# Caller errors (bad input, auth, billing) would fail the same way on every model
+NO_FAILOVER_STATUS = (400, 401, 402, 403, 422)
+
+
+class NoHealthyModel(RuntimeError):
+    """Every candidate model failed or is cooling down."""
+
+
+class _ModelHealth:
+    def __init__(self, window):
+        self.outcomes = deque(maxlen=window)  # (ok, seconds)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+    @property
+    def mean_latency(self):
+        latencies = [seconds for ok, seconds in self.outcomes if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+
+class ModelRouter:
+    """Routes `text_to_image` calls across `models` (ModelSpecs, preferred first).
+
+    `call(**params)` performs one request for a concrete model - normally
+    RequestScheduler.text_to_image, so every model keeps its own rate-limit
+    lane and retries. With `failover_retries` set, `call` also gets
+    max_retries=failover_retries whenever another model is left to try, so
+    an outage costs a retry or two instead of the full backoff schedule.
+    """
+
+    def __init__(self, call, models, window=20, failure_threshold=3, cooldown=30.0,
+                 error_penalty=4.0, explore=0.05, failover_retries=None, clock=time.monotonic, rng=None):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.call = call
+        self.models = list(models)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.error_penalty = error_penalty
+        self.explore = explore
+        self.failover_retries = failover_retries
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._health = {spec.name: _ModelHealth(window) for spec in self.models}
+        self.stats = {"requests": 0, "failovers": 0, "exhausted": 0}
+
+    def _score(self, name):
+        health = self._health[name]
+        latency = health.mean_latency
+        if latency is None:
+            # Untried (or only failed) models: 0 when untried, so every model gets measured once
+            return 0.0 if not health.outcomes else float("inf")
+        return latency * (1 + self.error_penalty * health.error_rate)
+
+    def candidates(self, preferred=None):
+        """Models to try in order: ranked healthy models, then probes of ones whose cooldown ended.
+
+        Returns (ordered specs, probes). Each probe is reserved for this
+        request until record() or release_probes() is called for it.
+        """
+        with self._lock:
+            now = self._clock()
+
+            healthy, cooling = [], []
+            for position, spec in enumerate(self.models):
+                health = self._health[spec.name]
+                if health.open_until > now or health.probing:
+                    cooling.append(spec)
+                    continue
+                rank = 0 if spec.name == preferred else 1
+                healthy.append((rank, self._score(spec.name), position, spec))
+
+            healthy.sort(key=lambda entry: entry[:3])
+            ordered = [entry[-1] for entry in healthy]
+            if len(ordered) > 1 and preferred is None and self._rng.random() < self.explore:
+                # Now and then send a request elsewhere so the ranking keeps learning
+                ordered.insert(0, ordered.pop(self._rng.randrange(1, len(ordered))))
+
+            # After the cooldown a model gets exactly one probe before rejoining the rotation
+            probes = []
+            for spec in cooling:
+                health = self._health[spec.name]
+                if health.open_until <= now and not health.probing:
+                    health.probing = True
+                    probes.append(spec)
+            return ordered + probes, probes
+
+    def record(self, name, ok, seconds):
+        with self._lock:
+            health = self._health[name]
+            health.requests += 1
+            health.outcomes.append((ok, seconds))
+            health.probing = False
+            if ok:
+                health.consecutive_failures = 0
+                health.open_until = 0.0
+                return
+            health.failures += 1
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.failure_threshold:
+                health.open_until = self._clock() + self.cooldown
+
+    def text_to_image(self, session_id=None, cancel=None, **params):
+        """Generate with the best available model, failing over to the next on outages.
+
+        A cancelled call (see RequestScheduler) is not a model failure: it is
+        raised straight away.
+        """
+        requested = params.get("model")
+        preferred = requested if requested in self._health else None
+        with self._lock:
+            self.stats["requests"] += 1
+
+        candidates, probes = self.candidates(preferred)
+        last_error = None
+        try:
+            while candidates:
+                spec = candidates.pop(0)
+                if last_error is not None:
+                    with self._lock:
+                        self.stats["failovers"] += 1
+                    metrics.incr("model_failovers_total", model=spec.name)
+                call_kwargs = {} if cancel is None else {"cancel": cancel}
+                if self.failover_retries is not None and candidates:
+                    call_kwargs["max_retries"] = self.failover_retries
+                started = time.perf_counter()
+                try:
+                    image = self.call(session_id=session_id, **call_kwargs, **spec.fit(params))
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    if error_status(e) in NO_FAILOVER_STATUS:
+                        raise
+                    self.record(spec.name, False, time.perf_counter() - started)
+                    last_error = e
+                    continue
+                self.record(spec.name, True, time.perf_counter() - started)
+                image.info["model"] = spec.name
+                return image
+        finally:
+            # Probes handed out but never completed go back to the pool
+            self.release_probes(probes)
+
+        with self._lock:
+            self.stats["exhausted"] += 1
+        if last_error is not None:
+            raise NoHealthyModel(f"All models failed; last error: {last_error}") from last_error
+        raise NoHealthyModel("All models are cooling down after repeated failures")
+
+    def release_probes(self, specs):
+        with self._lock:
+            for spec in specs:
+                health = self._health[spec.name]
+                if health.probing and health.open_until <= self._clock():
+                    health.probing = False
+
+    def health(self):
+        """Per-model summary for display: label, healthy, mean latency, error rate, requests."""
+        with self._lock:
+            now = self._clock()
+            return [{
+                "name": spec.name,
+                "label": spec.label,
+                "healthy": self._health[spec.name].open_until <= now,
+                "latency": self._health[spec.name].mean_latency,
+                "error_rate": self._health[spec.name].error_rate,
+                "requests": self._health[spec.name].requests,
+            } for spec in self.models]
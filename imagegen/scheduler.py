@@ -0,0 +1,232 @@
+"""Client-side rate limiting for the HuggingFace Inference API.
+
+RequestScheduler sits in front of InferenceClient. Each (token, model) pair
+has its own token bucket, and requests waiting for it are served round-robin
+across sessions so one user's batch can't starve everyone else. 429 and 503
+responses are retried with exponential backoff and jitter, honouring any
+Retry-After header and pausing the whole bucket while upstream asks us to.
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+
+from imagegen.jobs import Cancelled
+from imagegen.metrics import metrics
+
+RETRYABLE_STATUS = (429, 503)
+# How often a cancellable request waiting for its turn checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.25
+
+
+class TokenBucket:
+    """Classic token bucket. Not thread-safe; RequestScheduler holds the lock."""
+
+    def __init__(self, rate_per_second, capacity, clock=time.monotonic):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.paused_until = 0.0
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def try_acquire(self):
+        """Take one token. Returns 0 on success, else seconds until one is available."""
+        now = self._refill()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds` (e.g. after a Retry-After)."""
+        self.paused_until = max(self.paused_until, self._clock() + seconds)
+        self.tokens = 0.0
+
+
+def error_status(exc):
+    """Best-effort HTTP status code of an exception raised by the client."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        return status
+    match = re.search(r"\b(429|503)\b", str(exc))
+    if match:
+        return int(match.group(1))
+    if "rate limit" in str(exc).lower():
+        return 429
+    return None
+
+
+def retry_after_seconds(exc):
+    """Parse the Retry-After header (seconds or HTTP date), if there is one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Lane:
+    """Bucket plus per-session FIFO queues for one (token, model) pair."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        # session_id -> deque of waiting tickets; dict order is the round-robin order
+        self.sessions = OrderedDict()
+
+
+class RequestScheduler:
+    """Rate-limited, retrying, fair front end for `client.text_to_image`."""
+
+    def __init__(self, client, token="", requests_per_minute=30, burst=5,
+                 max_retries=4, base_delay=1.0, max_delay=60.0, sleep=time.sleep):
+        self.client = client
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        # Never keep the raw token around in memory longer than needed
+        self._token_id = hashlib.sha256(token.encode("utf-8")).hexdigest()[:12] if token else "anonymous"
+        self._lanes = {}
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+            "last_wait": 0.0,
+        }
+
+    def _lane(self, model):
+        key = (self._token_id, model)
+        if key not in self._lanes:
+            self._lanes[key] = _Lane(TokenBucket(self.requests_per_minute / 60.0, self.burst))
+        return self._lanes[key]
+
+    def acquire(self, model, session_id=None, cancel=None):
+        """Block until this session's turn comes up and a token is free.
+
+        Raises Cancelled (giving up its place in the queue) once `cancel` is set.
+        """
+        ticket = object()
+        with self._cond:
+            lane = self._lane(model)
+            lane.sessions.setdefault(session_id, deque()).append(ticket)
+            self._waiting += 1
+            enqueued = time.monotonic()
+            poll = 1.0 if cancel is None else CANCEL_POLL_SECONDS
+
+            while True:
+                if cancel is not None and cancel.is_set():
+                    queue = lane.sessions[session_id]
+                    queue.remove(ticket)
+                    if not queue:
+                        del lane.sessions[session_id]
+                    self._waiting -= 1
+                    self._cond.notify_all()
+                    raise Cancelled()
+                head_session = next(iter(lane.sessions))
+                if head_session == session_id and lane.sessions[session_id][0] is ticket:
+                    delay = lane.bucket.try_acquire()
+                    if delay == 0:
+                        break
+                    self._cond.wait(timeout=min(delay, poll) if cancel is not None else delay)
+                else:
+                    self._cond.wait(timeout=poll)
+
+            # Served: move this session to the back of the round-robin order
+            queue = lane.sessions.pop(session_id)
+            queue.popleft()
+            if queue:
+                lane.sessions[session_id] = queue
+
+            waited = time.monotonic() - enqueued
+            self._waiting -= 1
+            self.stats["requests"] += 1
+            self.stats["total_wait"] += waited
+            self.stats["last_wait"] = waited
+            self.stats["max_wait"] = max(self.stats["max_wait"], waited)
+            self._cond.notify_all()
+        return waited
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, never shorter than Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def text_to_image(self, session_id=None, max_retries=None, cancel=None, **params):
+        """Rate-limited `client.text_to_image(**params)` with retries.
+
+        `max_retries` overrides the scheduler's default for this call. Setting
+        the `cancel` event stops the call while it waits for a slot or a
+        retry (raising Cancelled); a request already sent is not interrupted.
+        """
+        model = params.get("model")
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            with metrics.span("queue_wait"):
+                self.acquire(model, session_id, cancel)
+            if cancel is not None and cancel.is_set():
+                raise Cancelled()
+            try:
+                with metrics.span("network"):
+                    return self.client.text_to_image(**params)
+            except Exception as e:
+                status = error_status(e)
+                metrics.incr("upstream_errors_total", status=status or "other")
+                if status not in RETRYABLE_STATUS or attempt >= max_retries:
+                    with self._cond:
+                        self.stats["failures"] += 1
+                    raise
+
+                retry_after = retry_after_seconds(e)
+                delay = self.backoff_delay(attempt, retry_after)
+                with self._cond:
+                    self.stats["retries"] += 1
+                    if retry_after is not None:
+                        # Upstream told us to hold off - apply it to everyone on this lane
+                        self._lane(model).bucket.pause(retry_after)
+                if cancel is not None:
+                    if cancel.wait(delay):
+                        raise Cancelled()
+                else:
+                    self._sleep(delay)
+                attempt += 1
+
+    @property
+    def queue_depth(self):
+        with self._cond:
+            return self._waiting
+
+    @property
+    def average_wait(self):
+        with self._cond:
+            requests = self.stats["requests"]
+            return self.stats["total_wait"] / requests if requests else 0.0
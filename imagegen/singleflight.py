@@ -0,0 +1,67 @@
+"""Single-flight de-duplication of identical in-flight calls.
+
+When several sessions (or a double-click) submit the same generation at the
+same moment, only the first caller - the leader - actually calls upstream.
+Everyone else arriving while that call is in flight waits for it and gets
+the same result, or the same exception.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+
+    def do(self, key, fn, timeout=None):
+        """Return `fn()`, sharing one execution among concurrent callers with `key`.
+
+        Followers wait at most `timeout` seconds (None waits as long as the
+        leader takes) and raise TimeoutError after that; the leader's call
+        carries on for whoever is still waiting.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["calls"] += 1
+            else:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+                with self._lock:
+                    self.stats["errors"] += 1
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(timeout):
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise TimeoutError(f"Timed out after {timeout}s waiting for an identical request in flight")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,218 @@
+"""Tiled rendering of canvases larger than one model request allows.
+
+A TilePlan splits the target canvas into overlapping tiles no larger than
+`tile_size`. Tiles are generated concurrently, one model request each,
+and blended into the output as soon as each one finishes, in whatever
+order they finish. Upscaling a single image needs none of this: upscale()
+is one Lanczos resize, which tiling would only make slower.
+
+Blend weights are separable linear ramps across each overlap, normalised
+so that at every pixel they sum to one; seams fade instead of showing as
+edges. The canvas is cut into cells along every tile edge, and a cell is
+written to the uint8 output (and its float accumulator freed) the moment
+its last tile arrives. Peak memory is the output plus the tiles in flight
+plus accumulators for the overlap cells still waiting on a neighbour.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from imagegen.metrics import metrics
+
+TILE_SIZE = 1024
+OVERLAP = 128
+GENERATE = "generate"
+UPSCALE = "upscale"
+
+
+def _axis_starts(length, tile_size, overlap):
+    """Start offsets and size of the tiles along one axis, spread evenly so the last one ends on the edge."""
+    if length <= tile_size:
+        return [0], length
+    count = -(-(length - overlap) // (tile_size - overlap))
+    return [round(i * (length - tile_size) / (count - 1)) for i in range(count)], tile_size
+
+
+def _axis_weights(starts, size, length, overlap):
+    """Blend weight of each tile along one axis; at every coordinate they add up to 1."""
+    ramps = []
+    total = np.zeros(length, dtype=np.float32)
+    local = np.arange(size, dtype=np.float32) + 0.5
+    for start in starts:
+        # Fade in over the first `overlap` pixels and out over the last, except at the canvas edges
+        rise = local / overlap if start > 0 else np.ones(size, dtype=np.float32)
+        fall = (size - local) / overlap if start + size < length else np.ones(size, dtype=np.float32)
+        ramp = np.clip(np.minimum(rise, fall), 0.0, 1.0)
+        total[start:start + size] += ramp
+        ramps.append(ramp)
+    return [ramp / total[start:start + size] for start, ramp in zip(starts, ramps)]
+
+
+class Tile:
+    __slots__ = ("index", "row", "col", "x", "y", "width", "height")
+
+    def __init__(self, index, row, col, x, y, width, height):
+        self.index = index
+        self.row = row
+        self.col = col
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    @property
+    def box(self):
+        return self.x, self.y, self.x + self.width, self.y + self.height
+
+    def __repr__(self):
+        return f"Tile({self.index}, box={self.box})"
+
+
+class TilePlan:
+    """Overlapping tiles covering a `width` x `height` canvas, in row-major order."""
+
+    def __init__(self, width, height, tile_size=TILE_SIZE, overlap=OVERLAP):
+        if not 0 < overlap <= tile_size // 2:
+            raise ValueError("overlap must be between 1 and half the tile size")
+        self.width = width
+        self.height = height
+        self.overlap = overlap
+        xs, tile_width = _axis_starts(width, tile_size, overlap)
+        ys, tile_height = _axis_starts(height, tile_size, overlap)
+        self.weights_x = _axis_weights(xs, tile_width, width, overlap)
+        self.weights_y = _axis_weights(ys, tile_height, height, overlap)
+        self.tiles = [
+            Tile(row * len(xs) + col, row, col, x, y, tile_width, tile_height)
+            for row, y in enumerate(ys) for col, x in enumerate(xs)
+        ]
+
+    def __len__(self):
+        return len(self.tiles)
+
+
+class TiledCanvas:
+    """Output buffer that tiles of a TilePlan are blended into as they arrive, from any thread."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self._out = np.zeros((plan.height, plan.width, 3), dtype=np.uint8)
+        xs = sorted({t.x for t in plan.tiles} | {t.x + t.width for t in plan.tiles})
+        ys = sorted({t.y for t in plan.tiles} | {t.y + t.height for t in plan.tiles})
+        self._x_edges = list(zip(xs, xs[1:]))
+        self._y_edges = list(zip(ys, ys[1:]))
+        # Cells each tile covers, how many tiles cover each cell, and how many of those are still missing
+        self._cells = {
+            tile.index: [
+                (i, j) for i, (y0, y1) in enumerate(self._y_edges) if tile.y <= y0 and y1 <= tile.y + tile.height
+                for j, (x0, x1) in enumerate(self._x_edges) if tile.x <= x0 and x1 <= tile.x + tile.width
+            ]
+            for tile in plan.tiles
+        }
+        self._shared = {}
+        for cells in self._cells.values():
+            for cell in cells:
+                self._shared[cell] = self._shared.get(cell, 0) + 1
+        self._pending = dict(self._shared)
+        self._partial = {}  # cell -> float32 accumulator, only while some of its tiles are missing
+        self._added = set()
+        self._lock = threading.Lock()
+
+    def add(self, tile, image):
+        """Blend one rendered tile in. `image` is resized if the model returned a different size."""
+        if image.size != (tile.width, tile.height):
+            image = image.resize((tile.width, tile.height), Image.LANCZOS)
+        pixels = np.asarray(image.convert("RGB"))
+        weights_y, weights_x = self.plan.weights_y[tile.row], self.plan.weights_x[tile.col]
+
+        # Cells only this tile covers have weight 1 and are copied as is; overlaps are weighted in float
+        parts = []
+        for cell in self._cells[tile.index]:
+            (y0, y1), (x0, x1) = self._y_edges[cell[0]], self._x_edges[cell[1]]
+            rows, cols = slice(y0 - tile.y, y1 - tile.y), slice(x0 - tile.x, x1 - tile.x)
+            part = pixels[rows, cols]
+            if self._shared[cell] > 1:
+                part = part.astype(np.float32)
+                part *= weights_y[rows, None, None]
+                part *= weights_x[None, cols, None]
+            parts.append((cell, part))
+
+        with self._lock:
+            if tile.index in self._added:
+                raise ValueError(f"{tile!r} was already added")
+            self._added.add(tile.index)
+            for cell, part in parts:
+                (y0, y1), (x0, x1) = self._y_edges[cell[0]], self._x_edges[cell[1]]
+                self._pending[cell] -= 1
+                if self._shared[cell] == 1:
+                    self._out[y0:y1, x0:x1] = part
+                elif self._pending[cell] == 0:
+                    # Last contribution: finish the cell straight into the output
+                    acc = self._partial.pop(cell, None)
+                    if acc is not None:
+                        part = np.add(acc, part, out=acc)
+                    # Weights sum to 1, so this only rounds (and guards against float drift past 255)
+                    self._out[y0:y1, x0:x1] = np.clip(part + 0.5, 0, 255)
+                elif cell in self._partial:
+                    self._partial[cell] += part
+                else:
+                    self._partial[cell] = part
+
+    @property
+    def complete(self):
+        return len(self._added) == len(self.plan)
+
+    def image(self):
+        """The assembled RGB image. Shares memory with the canvas instead of copying it."""
+        if not self.complete:
+            raise RuntimeError(f"{len(self.plan) - len(self._added)} tile(s) missing")
+        return Image.frombuffer("RGB", (self.plan.width, self.plan.height), self._out, "raw", "RGB", 0, 1)
+
+
+def render_tiles(plan, render_tile, max_parallel=3):
+    """Render every tile with `render_tile(tile)` -> PIL image, up to `max_parallel` at a time.
+
+    Each tile is blended in by the worker that rendered it, so finished tiles
+    never queue up. The first error cancels the tiles not yet started and is
+    raised. Returns the assembled image.
+    """
+    canvas = TiledCanvas(plan)
+
+    def work(tile):
+        image = render_tile(tile)
+        with metrics.span("tile_blend"):
+            canvas.add(tile, image)
+
+    pool = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="imagegen-tile")
+    try:
+        for future in [pool.submit(work, tile) for tile in plan.tiles]:
+            future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    return canvas.image()
+
+
+def tile_params(generation_params, tile, base_seed=0):
+    """Request for one tile: the tile's size and its own seed, so tiles differ (and cache separately)."""
+    return dict(generation_params, width=tile.width, height=tile.height,
+                seed=generation_params.get("seed", base_seed) + tile.index)
+
+
+def generate_tiled(generation_params, width, height, generate, base_seed=0, tile_size=TILE_SIZE,
+                   overlap=OVERLAP, max_parallel=3):
+    """Generate a `width` x `height` image as separately generated, blended tiles.
+
+    `generate(params, tile)` returns the PIL image for one tile's request
+    (see tile_params). Every tile is a full generation of the same prompt,
+    so this suits textures, landscapes and patterns more than single subjects.
+    """
+    plan = TilePlan(width, height, tile_size, overlap)
+    return render_tiles(plan, lambda tile: generate(tile_params(generation_params, tile, base_seed), tile),
+                        max_parallel)
+
+
+def upscale(base, width, height):
+    """Upscale one generated image to `width` x `height` with Lanczos."""
+    with metrics.span("upscale"):
+        return base.convert("RGB").resize((width, height), Image.LANCZOS)
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.bench_admission import SimulatedUpstream
+from benchmarks.load_test import percentile
+from imagegen.admission import HEAVY, LIGHT, AdmissionController, Overloaded, request_cost
+
+HEAVY_PARAMS = {'width': 1024, 'height': 1024, 'num_inference_steps': 16}
+LIGHT_PARAMS = {'width': 512, 'height': 512, 'num_inference_steps': 4}
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def gate():
+    gate = threading.Event()
+    yield gate
+    gate.set()
+
+
+def test_full_heavy_lane_sheds_heavy_requests_but_admits_light_ones(gate):
+    def upstream(session_id=None, **params):
+        if params['num_inference_steps'] > 4:
+            gate.wait(5)  # Heavy requests hold their slot until released
+        return params['width']
+
+    controller = AdmissionController(upstream, max_in_flight=2, heavy_slots=1, per_session=10, max_queue=2)
+    results = []
+    heavy = [threading.Thread(target=lambda: results.append(controller.text_to_image(**HEAVY_PARAMS)))
+             for _ in range(3)]
+    for thread in heavy:
+        thread.start()
+    # One heavy request holds the only heavy slot, two more fill the heavy queue
+    wait_until(lambda: controller.in_flight == 1 and controller.queue_depth(HEAVY) == 2)
+
+    with pytest.raises(Overloaded, match="Server busy"):
+        controller.text_to_image(**HEAVY_PARAMS)
+    assert controller.stats[HEAVY]['shed'] == 1
+
+    # The light lane is unaffected: a light request goes straight through the free slot
+    assert controller.text_to_image(**LIGHT_PARAMS) == 512
+    assert controller.stats[LIGHT]['shed'] == 0
+
+    gate.set()
+    for thread in heavy:
+        thread.join(5)
+    assert results == [1024] * 3
+    assert controller.in_flight == 0 and controller.queue_depth() == 0
+
+
+def test_full_light_lane_sheds_light_requests(gate):
+    def upstream(session_id=None, **params):
+        gate.wait(5)
+
+    controller = AdmissionController(upstream, max_in_flight=1, heavy_slots=1, per_session=10, max_queue=1)
+    threads = [threading.Thread(target=controller.text_to_image, kwargs=LIGHT_PARAMS) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: controller.in_flight == 1 and controller.queue_depth(LIGHT) == 1)
+
+    with pytest.raises(Overloaded):
+        controller.text_to_image(**LIGHT_PARAMS)
+    assert controller.stats[LIGHT]['shed'] == 1
+
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+
+def light_latencies(text_to_image, heavy=6, light=20, gap=0.03):
+    """Send `heavy` heavy requests at once, then a steady stream of light ones; return sorted light latencies."""
+    latencies = []
+    lock = threading.Lock()
+
+    def send_light():
+        start = time.perf_counter()
+        text_to_image(session_id="light", **LIGHT_PARAMS)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=text_to_image, kwargs=dict(HEAVY_PARAMS, session_id=f"heavy-{i}"))
+               for i in range(heavy)]
+    for thread in threads:
+        thread.start()
+    for _ in range(light):
+        time.sleep(gap)
+        thread = threading.Thread(target=send_light)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join(30)
+    return sorted(latencies)
+
+
+def test_light_tail_latency_stays_bounded_while_heavy_requests_saturate():
+    unit = 0.02
+    heavy_seconds = request_cost(HEAVY_PARAMS) * unit  # 0.32s; a light request takes 0.02s
+    bound = heavy_seconds / 2
+
+    # Direct: heavy requests hold both upstream slots and light ones queue behind them
+    direct = light_latencies(SimulatedUpstream(capacity=2, unit=unit).text_to_image)
+    assert percentile(direct, 99) > bound
+
+    # Admission: heavy requests get one of the two slots, light ones always find the other
+    controller = AdmissionController(SimulatedUpstream(capacity=2, unit=unit).text_to_image, max_in_flight=2,
+                                     heavy_slots=1, per_session=2, max_queue=20)
+    admitted = light_latencies(controller.text_to_image)
+    assert len(admitted) == 20
+    assert percentile(admitted, 99) < bound
+    assert controller.stats[HEAVY]['admitted'] == 6
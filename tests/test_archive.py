@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from imagegen.archive import GenerationArchive
+
+
+def make_entry(**fields):
+    entry = {'prompt': "a lighthouse", 'enhanced_prompt': "a lighthouse, detailed", 'style': "None",
+             'realism_mode': False, 'generation_params': {'width': 1024, 'height': 1024},
+             'timestamp': datetime.now(), 'size': (1024, 1024)}
+    entry.update(fields)
+    return entry
+
+
+def test_tiled_settings_survive_the_archive(tmp_path):
+    archive = GenerationArchive(str(tmp_path / "archive.sqlite"), str(tmp_path / "images"))
+    tiled = {'mode': "upscale", 'width': 2048, 'height': 2048}
+    tiled_id = archive.record(make_entry(tiled=tiled), b"full", b"thumb")
+    plain_id = archive.record(make_entry(), b"full 2", b"thumb 2")
+
+    assert archive.get(tiled_id)['tiled'] == tiled
+    assert archive.get(plain_id)['tiled'] is None
+    rows, _ = archive.query()
+    assert {row['id']: row['tiled'] for row in rows} == {tiled_id: tiled, plain_id: None}
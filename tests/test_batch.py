@@ -0,0 +1,74 @@
+import threading
+import time
+from functools import partial
+
+from PIL import Image
+
+from imagegen.batch import DONE, FAILED, PENDING, Batch
+from imagegen.generation import run_generation
+
+
+class StubClient:
+    """Sleeping text_to_image stand-in that records how many calls overlap."""
+
+    def __init__(self, seconds=0.05):
+        self.seconds = seconds
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def text_to_image(self, prompt, width=64, height=64, **params):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.seconds)
+            if "fail" in prompt:
+                raise RuntimeError("429 Too Many Requests")
+            return Image.new("RGB", (width, height), (len(prompt), 0, 0))
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def make_batch(prompts, max_parallel):
+    return Batch.from_kwargs(
+        [{'generation_params': {'prompt': prompt, 'width': 64, 'height': 64}} for prompt in prompts],
+        labels=[f"Variant {i + 1}" for i in range(len(prompts))],
+        max_parallel=max_parallel
+    )
+
+
+def test_max_parallel_is_respected():
+    client = StubClient()
+    batch = make_batch([f"prompt {i}" for i in range(8)], max_parallel=3)
+    start = time.perf_counter()
+    batch.run(partial(run_generation, text_to_image=client.text_to_image))
+    assert client.max_running == 3
+    # 8 items, 3 at a time: at least 3 rounds of 0.05s, and far less than running them one by one
+    assert 0.15 <= time.perf_counter() - start < 8 * 0.05
+    assert batch.finished
+
+
+def test_results_keep_their_index_and_label():
+    prompts = ["a", "bb", "ccc", "dddd"]
+    batch = make_batch(prompts, max_parallel=4)
+    finished = list(batch.run_iter(partial(run_generation, text_to_image=StubClient().text_to_image)))
+    assert sorted(item.index for item in finished) == [0, 1, 2, 3]
+    for item in batch.items:
+        assert item.status == DONE
+        assert item.label == f"Variant {item.index + 1}"
+        image, from_cache = item.result
+        # Each result is the image for its own prompt
+        assert image.decode().getpixel((0, 0))[0] == len(prompts[item.index])
+        assert not from_cache and item.seconds > 0
+
+
+def test_one_failure_does_not_abort_the_others():
+    batch = make_batch(["first", "please fail", "third", "fourth"], max_parallel=2)
+    batch.run(partial(run_generation, text_to_image=StubClient().text_to_image))
+    assert [item.status for item in batch.items] == [DONE, FAILED, DONE, DONE]
+    failed = batch.items[1]
+    assert isinstance(failed.error, RuntimeError) and failed.result is None
+    assert len(batch.completed) == 4
+    assert PENDING not in {item.status for item in batch.items}
@@ -0,0 +1,36 @@
+import pytest
+
+from imagegen.cli import plan_requests, read_prompts
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_csv_rows_keep_their_source_line(tmp_path):
+    path = write(tmp_path, "prompts.csv", "prompt,style\n\na cat,None\n,None\n\na bird,Anime\n")
+    assert [line for line, _ in read_prompts(path)] == [3, 6]
+    assert [job_info['line'] for job_info in plan_requests(read_prompts(path))] == [3, 6]
+
+
+def test_csv_errors_report_the_source_line(tmp_path):
+    path = write(tmp_path, "prompts.csv", "prompt,style,width\n\na cat,None,512\n\na dog,Nope,512\n")
+    with pytest.raises(ValueError, match=r"^line 5: unknown style 'Nope'"):
+        plan_requests(read_prompts(path))
+
+    path = write(tmp_path, "sizes.csv", "prompt,width\na cat,512\n\n\na dog,wide\n")
+    with pytest.raises(ValueError, match=r"^line 5: "):
+        list(read_prompts(path))
+
+
+def test_jsonl_rows_keep_their_source_line(tmp_path):
+    path = write(tmp_path, "prompts.jsonl", '{"prompt": "a"}\n\n{"prompt": ""}\n{"prompt": "b"}\n')
+    assert [line for line, _ in read_prompts(path)] == [1, 4]
+
+
+def test_malformed_jsonl_reports_the_source_line(tmp_path):
+    path = write(tmp_path, "prompts.jsonl", '{"prompt": "a"}\n{prompt: "b"}\n')
+    with pytest.raises(ValueError, match=r"^line 2: Expecting property name enclosed in double quotes$"):
+        list(read_prompts(path))
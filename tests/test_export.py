@@ -0,0 +1,36 @@
+import json
+import zipfile
+from io import BytesIO
+
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from imagegen.export import MANIFEST_NAME, deferred_zip
+
+ENTRIES = [
+    {'prompt': "a red fox", 'style': "None", 'format': "png", 'image_key': "fox"},
+    {'prompt': "a blue whale", 'style': "Anime", 'format': "webp", 'image_key': "whale"},
+    {'prompt': "gone", 'style': "None", 'format': "png", 'image_key': "missing"},
+]
+IMAGES = {'fox': b"fox bytes", 'whale': b"whale bytes"}
+
+
+def test_deferred_zip_is_accepted_by_download_button():
+    export = deferred_zip(ENTRIES, lambda entry: IMAGES.get(entry['image_key']))
+    # What st.download_button does with deferred data when the button is clicked
+    data, _ = convert_data_to_bytes_and_infer_mime(export(), TypeError("unsupported download data"))
+
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        names = zf.namelist()
+        assert names == ["0001-a_red_fox.png", "0002-a_blue_whale.webp", MANIFEST_NAME]
+        assert zf.read(names[0]) == b"fox bytes"
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+    assert manifest['count'] == 3
+    assert [record['file'] for record in manifest['images']] == names[:2] + [None]
+
+
+def test_entries_are_captured_when_deferred():
+    entries = list(ENTRIES[:1])
+    export = deferred_zip(entries, lambda entry: IMAGES.get(entry['image_key']))
+    entries.clear()
+    with zipfile.ZipFile(BytesIO(export())) as zf:
+        assert len(zf.namelist()) == 2
@@ -0,0 +1,35 @@
+from PIL import Image
+
+from imagegen.encoding import OutputFormat
+from imagegen.generation_cache import GenerationCache, canonical_key
+
+PARAMS = {'prompt': "a red fox in snow", 'width': 1024, 'height': 768, 'num_inference_steps': 16}
+
+
+def test_float_parameters_hash_the_same_as_int_or_float():
+    assert canonical_key(dict(PARAMS, guidance_scale=7)) == canonical_key(dict(PARAMS, guidance_scale=7.0))
+    assert canonical_key(dict(PARAMS, guidance_scale=7)) != canonical_key(dict(PARAMS, guidance_scale=7.5))
+
+
+def test_key_order_and_missing_values_do_not_matter():
+    reordered = dict(reversed(list(PARAMS.items())))
+    assert canonical_key(reordered) == canonical_key(dict(PARAMS, seed=None))
+
+
+def test_memory_tier_keeps_bytes_not_pixels(tmp_path):
+    cache = GenerationCache(str(tmp_path))
+    encoded = OutputFormat().encoded(Image.new("RGB", (64, 64), "red"))
+    encoded.info['model'] = "fast"
+    cache.put(PARAMS, encoded)
+    cached = cache.get(PARAMS)
+    assert cache.stats['memory_hits'] == 1
+    assert cached._image is None and cached.data == encoded.data
+    assert cached.info == {'model': "fast"}
+    assert encoded._image is not None  # The caller's copy keeps its pixels
+
+    image = Image.new("RGB", (64, 64), "blue")
+    image.info['model'] = "quality"
+    cache.put(dict(PARAMS, seed=1), image)
+    cached = cache.get(dict(PARAMS, seed=1))
+    assert cached._image is None and cached.info['model'] == "quality"
+    assert cached.decode().getpixel((0, 0)) == (0, 0, 255)
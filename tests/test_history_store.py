@@ -0,0 +1,51 @@
+import sqlite3
+
+from imagegen.history_store import HistoryStore, SpillStore
+
+
+def test_stores_sharing_a_file_keep_each_others_rows(tmp_path):
+    path = str(tmp_path / "spill.sqlite")
+    first = SpillStore(path)
+    first.put("session", "a", b"first")
+
+    # Opening the file again (another process, or a restart of one) must not wipe live rows
+    second = SpillStore(path)
+    second.put("session", "a", b"second")
+    assert first.get("session", "a") == b"first"
+    assert second.get("session", "a") == b"second"
+
+    second.delete_session("session")
+    assert first.get("session", "a") == b"first"
+    assert first.nbytes() == len(b"first")
+
+    first.close()
+    assert first.get("session", "a") is None
+    second.put("session", "b", b"still here")
+    assert second.get("session", "b") == b"still here"
+
+
+def test_rows_of_dead_processes_are_cleared(tmp_path):
+    path = str(tmp_path / "spill.sqlite")
+    store = SpillStore(path)
+    host = store.owner.partition(":")[0]
+    # No process has this pid: pids are capped far below it
+    dead_owner = f"{host}:999999999:0"
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO spilled VALUES (?, 's', 'k', x'00')", (dead_owner,))
+    store.put("session", "a", b"live")
+
+    SpillStore(path)
+    with sqlite3.connect(path) as conn:
+        owners = {row[0] for row in conn.execute("SELECT owner FROM spilled")}
+    assert owners == {store.owner}
+
+
+def test_history_spills_into_its_own_namespace(tmp_path):
+    path = str(tmp_path / "spill.sqlite")
+    stores = [HistoryStore("same-session", spill=SpillStore(path), memory_budget=0) for _ in range(2)]
+    for index, store in enumerate(stores):
+        store.add({'prompt': str(index)}, f"image {index}".encode(), f"thumb {index}".encode())
+    for index, store in enumerate(stores):
+        entry = store[0]
+        assert store.spill.nbytes(store.session_id) > 0
+        assert store.get_bytes(entry['image_key']) == f"image {index}".encode()
@@ -0,0 +1,21 @@
+from imagegen.generation_cache import canonical_key
+from imagegen.preview import draft_params
+
+PARAMS = {'prompt': "a red fox in snow", 'width': 1024, 'height': 768, 'num_inference_steps': 16}
+
+
+def test_drafts_are_smaller_and_take_fewer_steps():
+    draft = draft_params(PARAMS)
+    assert draft['num_inference_steps'] < PARAMS['num_inference_steps']
+    assert max(draft['width'], draft['height']) <= 512
+    assert draft['width'] % 64 == 0 and draft['height'] % 64 == 0
+
+
+def test_drafts_do_not_add_a_seed_or_touch_the_request():
+    assert 'seed' not in draft_params(PARAMS)
+    assert PARAMS == {'prompt': "a red fox in snow", 'width': 1024, 'height': 768, 'num_inference_steps': 16}
+    assert canonical_key(draft_params(PARAMS)) != canonical_key(PARAMS)
+
+
+def test_explicit_seeds_are_kept():
+    assert draft_params(dict(PARAMS, seed=7))['seed'] == 7
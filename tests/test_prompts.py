@@ -0,0 +1,49 @@
+import pytest
+
+from imagegen.prompts import (HUMAN_ANATOMY_SUFFIX, HUMAN_BODY_FORMS, HUMAN_BODY_KEYWORDS, build_prompt,
+                              contains_human)
+
+
+def legacy_contains_human(prompt):
+    """The original substring check."""
+    return any(keyword in prompt.lower() for keyword in HUMAN_BODY_KEYWORDS)
+
+
+# Genuine mentions: the original check found these, and the pipeline must too
+GENUINE = [
+    "a woman reading", "Portrait of an old man", "two children playing", "fingertips on glass",
+    "long eyelashes", "raised eyebrows", "close-up of her eyelids", "a fisherman at dawn",
+    "a businessman in the rain", "barefoot on the beach", "her forearms", "a crowd of people",
+    "hands holding a cup", "Faces in the crowd", "a self-portrait", "the child's toy", "skin texture",
+    "a man's face", "FINGERS", "a bodybuilder posing",
+]
+# Keywords hidden inside unrelated words: the original check's false positives
+FALSE_POSITIVES = [
+    "a warm heart", "the legend of the earth", "a door handle", "alarm clock on a farm", "a pearl necklace",
+    "a charming harbour", "hearty soup", "a mango tree", "Manhattan skyline",
+]
+
+
+@pytest.mark.parametrize("prompt", GENUINE)
+def test_genuine_mentions_match_like_before(prompt):
+    assert legacy_contains_human(prompt)
+    assert contains_human(prompt)
+
+
+@pytest.mark.parametrize("prompt", GENUINE)
+def test_genuine_mentions_keep_the_anatomy_block(prompt):
+    assert build_prompt(prompt, "None", ultra_realism=True).endswith(HUMAN_ANATOMY_SUFFIX)
+
+
+@pytest.mark.parametrize("prompt", FALSE_POSITIVES)
+def test_false_positives_are_dropped(prompt):
+    assert legacy_contains_human(prompt)
+    assert not contains_human(prompt)
+    assert HUMAN_ANATOMY_SUFFIX not in build_prompt(prompt, "None", ultra_realism=True)
+
+
+def test_extra_forms_only_restore_original_matches():
+    # Each listed form contains an original keyword, so the pattern never matches where the original didn't
+    for form in HUMAN_BODY_FORMS:
+        assert legacy_contains_human(form)
+        assert contains_human(form)
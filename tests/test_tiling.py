@@ -0,0 +1,56 @@
+import numpy as np
+from PIL import Image
+
+from imagegen.demo_image import generate_demo_image
+from imagegen.tiling import TilePlan, generate_tiled, tile_params, upscale
+
+
+def demo_tile(params, tile):
+    return generate_demo_image(f"tile {tile.index}", "Fantasy", params["width"], params["height"])
+
+
+def solid_tile(params, tile):
+    # Tile i is a flat grey of level 40 * (i + 1), so blending shows up as in-between levels
+    return Image.new("RGB", (params["width"], params["height"]), (40 * (tile.index + 1),) * 3)
+
+
+def test_generate_tiled_with_the_demo_generator():
+    requests = []
+
+    def generate(params, tile):
+        requests.append(params)
+        return demo_tile(params, tile)
+
+    image = generate_tiled({'prompt': "a mountain range", 'seed': 10}, 2048, 1536, generate, max_parallel=2)
+    plan = TilePlan(2048, 1536)
+    assert image.size == (2048, 1536) and image.mode == "RGB"
+    assert len(requests) == len(plan) > 1
+    # Every tile is its own request at its own size and seed
+    assert sorted(params['seed'] for params in requests) == [10 + tile.index for tile in plan.tiles]
+    assert all(params['width'] <= 1024 and params['height'] <= 1024 for params in requests)
+    assert np.asarray(image).any()
+
+
+def test_overlaps_are_cross_faded():
+    image = np.asarray(generate_tiled({'prompt': "flat"}, 1800, 1024, solid_tile))
+    plan = TilePlan(1800, 1024)
+    assert [tile.x for tile in plan.tiles] == [0, 776]
+    row = image[512, :, 0]
+    assert row[0] == 40 and row[-1] == 80
+    # Inside the overlap the level climbs smoothly from the left tile's to the right tile's
+    overlap = row[776:1024].astype(int)
+    assert overlap[0] <= 41 and overlap[-1] >= 79
+    assert (np.diff(overlap) >= 0).all() and np.abs(np.diff(overlap)).max() <= 2
+
+
+def test_tile_params_sizes_and_seeds():
+    tile = TilePlan(2048, 2048).tiles[3]
+    params = tile_params({'prompt': "p", 'width': 1024, 'height': 1024}, tile, base_seed=100)
+    assert (params['width'], params['height'], params['seed']) == (tile.width, tile.height, 103)
+
+
+def test_upscale_is_one_lanczos_resize():
+    base = generate_demo_image("a lighthouse", "None", 512, 384)
+    image = upscale(base, 1536, 1152)
+    assert image.size == (1536, 1152)
+    assert image.tobytes() == base.resize((1536, 1152), Image.LANCZOS).tobytes()